@@ -10,63 +10,41 @@ import numpy
 from astropy import units as u
 
 from frigus.cooling_function.fits import fit_glover
+from frigus.cooling_function.grid import CoolingFunctionGrid
+from frigus.cooling_function.storage import open_grid_store
 from frigus.population import cooling_rate_at_steady_state
 from frigus.readers.dataset import DataLoader
 
-# density of the colliding species, in m^3
-nc_H = 1e2 * u.meter**-3
+species_data = DataLoader().load('H2_lique')
 
-# the kinetic temperature of the gas
-t_kin = 100.0 * u.Kelvin
 t_rad = 0.0 * u.Kelvin
 
-species_data = DataLoader().load('H2_lique')
-
 #####
-# t_rad   t_kin    lambda    fit_glover
+# compute the cooling function over the grid of the density of the colliding
+# species and the kinetic temperature. The cooling function, the population
+# densities and the solver diagnostics are written chunk by chunk to
+# cooling_rate.grid (use e.g. cooling_rate.h5 to write an HDF5 file).
 #####
-with open('cooling_rate.out', 'w') as fobj:
-
-    # the header of the file
-    fobj.write('#{:<12} {:<12} {:<12} {:<12}\n'.format(
-        'n(H)', 'T_rad', 'T_kin', 'rate'
-    ))
-
-    fobj.write('#{:<12} {:<12} {:<12} {:<12}\n'.format(
-        u.m**-3, u.Kelvin, u.Kelvin, u.Joule / u.second
-    ))
-
-    fig, axs = pylab.subplots(1)
-
-    # the data
-    for nc_H in numpy.logspace(6, 12, 7)*u.meter**-3:
-        for t_rad in numpy.array([0.0], 'f8') * u.Kelvin:
-            cooling_rate_vs_t_kin = []
-            for t_kin in species_data.raw_data.collision_rates_t_range:
-
-                cooling_rate = cooling_rate_at_steady_state(
-                    species_data,
-                    t_kin,
-                    t_rad,
-                    nc_H
-                )
-
-                fobj.write('{:e} {:e} {:e} {:e}\n'.format(
-                    nc_H.value,
-                    t_rad.value,
-                    t_kin.value,
-                    cooling_rate.to(u.Joule / u.second).value)
-                )
-
-                cooling_rate_vs_t_kin.append(
-                    cooling_rate.to(u.Joule / u.second).value
-                )
-
-            pylab.loglog(
-                species_data.raw_data.collision_rates_t_range.value,
-                cooling_rate_vs_t_kin, '-', label='{}'.format(nc_H)
-            )
-
+grid = CoolingFunctionGrid()
+grid.set_species(species_data)
+grid.set_density(numpy.logspace(6, 12, 7) * u.meter**-3)
+grid.set_t_kin(species_data.raw_data.collision_rates_t_range)
+grid.set_t_rad(t_rad)
+grid.compute(chunk_size=50, output='cooling_rate.grid', populations=True)
+
+# the store can be sliced without loading it
+store = open_grid_store('cooling_rate.grid')
+cooling_function = store.grid_array('cooling_function')
+
+fig, axs = pylab.subplots(1)
+
+for nc_index, nc_H in enumerate(grid.n):
+    pylab.loglog(
+        species_data.raw_data.collision_rates_t_range.value,
+        (cooling_function[:, nc_index] * u.erg / u.s).to(
+            u.Joule / u.second).value,
+        '-', label='{}'.format(nc_H)
+    )
 
 nc_H = 1e6 * u.meter**-3
 lambda_vs_T_kin = []
@@ -87,11 +65,8 @@ pylab.loglog(
     label='lambda compared with glover'
 )
 
-lambda_vs_T_kin_glover = u.Quantity(
-    [
-        fit_glover(T_kin) for T_kin in
-        species_data.raw_data.collision_rates_t_range.value
-    ]
+lambda_vs_T_kin_glover = fit_glover(
+    species_data.raw_data.collision_rates_t_range
 )*nc_H
 
 pylab.loglog(
@@ -88,10 +88,7 @@ for i, t_kin in enumerate(t_rng):
 
 
 lambda_vs_t_kin = u.Quantity(lambda_vs_t_kin)
-lambda_vs_t_kin_glover = u.Quantity(
-    [
-        fit_glover(T_kin) for T_kin in t_rng.value
-    ]) * nc_h
+lambda_vs_t_kin_glover = fit_glover(t_rng) * nc_h
 
 plt.ion()
 fig, axs = plt.subplots(2)
@@ -0,0 +1,395 @@
+# -*- coding: utf-8 -*-
+
+#    adaptive.py is part of Frigus.
+
+#    Frigus: software to compure the energy exchange in a multi-level system
+#    Copyright (C) 2016-2018 Mher V. Kazandjian and Carla Maria Coppola
+
+#    Frigus is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, version 3 of the License.
+#
+#    Frigus is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+
+#    You should have received a copy of the GNU General Public License
+#    along with Frigus.  If not, see <http://www.gnu.org/licenses/>.
+"""
+module that implements an adaptively refined cooling function table
+"""
+import numpy
+
+from astropy import units as u
+
+from frigus.population import cooling_rate_at_steady_state
+from frigus.utils import IndexMatcher
+
+
+class AdaptiveCoolingFunctionGrid(object):
+    """
+    Compute the cooling function on an adaptively refined (quadtree) table
+
+    The table is defined in the plane of log10(n) and log10(T_kin) at a
+    fixed radiation temperature. The computation starts with a coarse
+    uniform mesh. Each cell is refined into four children when the log10 of
+    the cooling function at the center or at the mid points of the edges of
+    the cell deviates from the bilinear interpolation of its corners by more
+    than the tolerance. Thus the solves are concentrated where the cooling
+    function curves (e.g. around the critical density).
+
+    All the points are on an integer lattice that corresponds to the finest
+    allowed level, so the values at the corners shared by neighbouring cells
+    are computed only once.
+
+    .. code-block:: python
+
+        grid = AdaptiveCoolingFunctionGrid()
+        grid.set_species(DataLoader().load('H2_lique'))
+        grid.set_density_range([1e6, 1e14] * u.m**-3)
+        grid.set_t_kin_range([100.0, 5000.0] * u.K)
+        grid.set_t_rad(0.0 * u.K)
+        grid.set_tolerance(0.01)
+        grid.compute()
+
+        grid.write('cooling_function_table.npz')
+        cooling_function = grid.evaluate(n, t_kin)
+    """
+    def __init__(self):
+        """
+        Constructor
+        """
+        self.species = None
+        """the species with the radiative and collisional data"""
+
+        self.density_range = None
+        """the min and max gas density of the table"""
+
+        self.t_kin_range = None
+        """the min and max kinetic temperature of the table"""
+
+        self.t_rad = None
+        """the radiation temperature of the table"""
+
+        self.tolerance = 0.01
+        """the maximum interpolation error (in dex) of the log10 of the
+        cooling function in a cell"""
+
+        self.initial_shape = (4, 4)
+        """the number of cells along the density and temperature axes of
+        the initial coarse mesh"""
+
+        self.max_level = 6
+        """the maximum number of refinements of the initial cells"""
+
+        self.points = {}
+        """the computed log10 of the cooling function (in erg / s) keyed by
+        the lattice indices (i, j) of the points"""
+
+        self.leaves = None
+        """the cells of the table that are not refined as an array of rows
+        (level, i, j) where i, j are the lattice indices of the lower left
+        corner of the cell"""
+
+    def set_species(self, species):
+        """setter for the species object"""
+        self.species = species
+
+    def set_density_range(self, density_range):
+        """setter for the min and max of the gas density"""
+        self.density_range = density_range
+
+    def set_t_kin_range(self, t_kin_range):
+        """setter for the min and max of the kinetic temperature"""
+        self.t_kin_range = t_kin_range
+
+    def set_t_rad(self, t_rad):
+        """setter for the radiation temperature"""
+        self.t_rad = t_rad
+
+    def set_tolerance(self, tolerance):
+        """setter for the interpolation tolerance in dex"""
+        self.tolerance = tolerance
+
+    @property
+    def lattice_shape(self):
+        """the number of lattice points along the density and the
+        temperature axes"""
+        return tuple(n * 2**self.max_level + 1 for n in self.initial_shape)
+
+    @property
+    def n_solves(self):
+        """the number of steady state solves done to compute the table"""
+        return len(self.points)
+
+    def _log_bounds(self):
+        """
+        :return: tuple: the log10 of the density (m^-3) and of the kinetic
+         temperature (K) ranges
+        """
+        return (
+            numpy.log10(self.density_range.to(u.m**-3).value),
+            numpy.log10(self.t_kin_range.to(u.K).value)
+        )
+
+    def _lattice_to_log(self, i, j):
+        """
+        Convert lattice indices to the log10 of the density and temperature
+
+        :param ndarray|int i: the lattice indices along the density axis
+        :param ndarray|int j: the lattice indices along the temperature axis
+        :return: tuple: log10(n / m^-3), log10(T / K)
+        """
+        (ln_min, ln_max), (lt_min, lt_max) = self._log_bounds()
+        n_i, n_j = self.lattice_shape
+        return (
+            ln_min + (ln_max - ln_min) * numpy.asarray(i) / (n_i - 1.0),
+            lt_min + (lt_max - lt_min) * numpy.asarray(j) / (n_j - 1.0)
+        )
+
+    def _value(self, i, j):
+        """
+        Return the log10 of the cooling function at a lattice point
+
+        The cooling function is computed only if it has not been computed
+        before.
+
+        :param int i: the lattice index along the density axis
+        :param int j: the lattice index along the temperature axis
+        :return: float: log10 of the cooling function in erg / s
+        """
+        key = (i, j)
+        if key not in self.points:
+            ln, lt_kin = self._lattice_to_log(i, j)
+            rate = cooling_rate_at_steady_state(
+                self.species,
+                10.0**lt_kin * u.K,
+                self.t_rad,
+                10.0**ln * u.m**-3
+            )
+            value = rate.cgs.value
+            if not numpy.isfinite(value) or value <= 0.0:
+                raise ValueError(
+                    'the adaptive table interpolates the log10 of the cooling '
+                    'function that is not positive ({} erg / s) at '
+                    'T_kin = {} K, n = {} m^-3 and T_rad = {}'.format(
+                        value, 10.0**lt_kin, 10.0**ln, self.t_rad)
+                )
+            self.points[key] = numpy.log10(value)
+
+        return self.points[key]
+
+    def _cell_error(self, i, j, size):
+        """
+        Estimate the interpolation error of a cell
+
+        :param int i: the lattice index of the lower left corner (density)
+        :param int j: the lattice index of the lower left corner (temperature)
+        :param int size: the size of the cell in lattice units
+        :return: float: The maximum deviation (in dex) of the cooling function
+         at the center and the mid points of the edges of the cell from the
+         bilinear interpolation of the corners. Non finite deviations are
+         reported as inf so that the cell is refined.
+        """
+        h = size // 2
+        f00 = self._value(i, j)
+        f10 = self._value(i + size, j)
+        f01 = self._value(i, j + size)
+        f11 = self._value(i + size, j + size)
+
+        interpolated = {
+            (i + h, j + h): 0.25 * (f00 + f10 + f01 + f11),
+            (i + h, j): 0.5 * (f00 + f10),
+            (i + h, j + size): 0.5 * (f01 + f11),
+            (i, j + h): 0.5 * (f00 + f01),
+            (i + size, j + h): 0.5 * (f10 + f11),
+        }
+
+        errors = numpy.array([
+            numpy.fabs(self._value(*key) - value)
+            for key, value in interpolated.items()
+        ])
+
+        if not numpy.isfinite(errors).all():
+            return numpy.inf
+        else:
+            return errors.max()
+
+    def compute(self):
+        """
+        Compute the adaptively refined table
+
+        :return: ndarray: The leaf cells (see self.leaves)
+        """
+        self.points = {}
+
+        size_0 = 2**self.max_level
+        cells = [
+            (0, i * size_0, j * size_0)
+            for i in range(self.initial_shape[0])
+            for j in range(self.initial_shape[1])
+        ]
+
+        leaves = []
+        while len(cells) > 0:
+            level, i, j = cells.pop()
+            size = 2**(self.max_level - level)
+
+            if (level < self.max_level and
+                    self._cell_error(i, j, size) > self.tolerance):
+                h = size // 2
+                cells.extend([
+                    (level + 1, i, j),
+                    (level + 1, i + h, j),
+                    (level + 1, i, j + h),
+                    (level + 1, i + h, j + h),
+                ])
+            else:
+                for di, dj in [(0, 0), (size, 0), (0, size), (size, size)]:
+                    self._value(i + di, j + dj)
+                leaves.append((level, i, j))
+
+        self.leaves = numpy.array(sorted(leaves), 'i8').reshape(-1, 3)
+
+        return self.leaves
+
+    def _find_leaves(self, i_float, j_float):
+        """
+        Find the leaf cells that contain points on the lattice
+
+        :param ndarray i_float: the (fractional) lattice coordinate along the
+         density axis.
+        :param ndarray j_float: the (fractional) lattice coordinate along the
+         temperature axis.
+        :return: tuple: the level, i and j of the containing leaf of each point
+        """
+        n_i, n_j = self.lattice_shape
+        level = numpy.full(i_float.shape, -1, 'i8')
+        cell_i = numpy.zeros(i_float.shape, 'i8')
+        cell_j = numpy.zeros(i_float.shape, 'i8')
+
+        # the leaves are looked up by the keys (i * n_j + j) * n_levels + level
+        n_levels = self.max_level + 1
+        leaves = IndexMatcher(
+            (self.leaves[:, 1] * n_j + self.leaves[:, 2]) * n_levels +
+            self.leaves[:, 0]
+        )
+
+        for current_level in range(self.max_level + 1):
+            size = 2**(self.max_level - current_level)
+            unresolved = level < 0
+
+            # the upper boundary points belong to the last cell
+            i_cell = numpy.minimum(
+                numpy.floor(i_float[unresolved] / size).astype('i8') * size,
+                n_i - 1 - size)
+            j_cell = numpy.minimum(
+                numpy.floor(j_float[unresolved] / size).astype('i8') * size,
+                n_j - 1 - size)
+
+            found = leaves.match(
+                (i_cell * n_j + j_cell) * n_levels + current_level) >= 0
+
+            inds = numpy.where(unresolved)[0][found]
+            level[inds] = current_level
+            cell_i[inds] = i_cell[found]
+            cell_j[inds] = j_cell[found]
+
+        return level, cell_i, cell_j
+
+    def evaluate(self, density, t_kin):
+        """
+        Interpolate the cooling function from the table
+
+        The log10 of the cooling function is bilinearly interpolated in
+        log10(n) and log10(T_kin) within the leaf cell containing the point.
+
+        :param Quantity density: the gas density (broadcast against t_kin)
+        :param Quantity t_kin: the kinetic temperature
+        :return: Quantity: the cooling function in erg / s
+        """
+        (ln_min, ln_max), (lt_min, lt_max) = self._log_bounds()
+        n_i, n_j = self.lattice_shape
+
+        ln, lt_kin = numpy.broadcast_arrays(
+            numpy.log10(density.to(u.m**-3).value),
+            numpy.log10(t_kin.to(u.K).value)
+        )
+        shape = ln.shape
+        ln, lt_kin = ln.flatten(), lt_kin.flatten()
+
+        if ((ln < ln_min) | (ln > ln_max) |
+                (lt_kin < lt_min) | (lt_kin > lt_max)).any():
+            raise ValueError('the input values are out of the table range')
+
+        i_float = (ln - ln_min) / (ln_max - ln_min) * (n_i - 1)
+        j_float = (lt_kin - lt_min) / (lt_max - lt_min) * (n_j - 1)
+
+        level, i, j = self._find_leaves(i_float, j_float)
+        size = 2**(self.max_level - level)
+
+        u_i = (i_float - i) / size
+        u_j = (j_float - j) / size
+
+        def values(di, dj):
+            return numpy.array([
+                self.points[key] for key in zip(i + di, j + dj)
+            ])
+
+        retval = ((1.0 - u_i) * (1.0 - u_j) * values(0, 0) +
+                  u_i * (1.0 - u_j) * values(size, 0) +
+                  (1.0 - u_i) * u_j * values(0, size) +
+                  u_i * u_j * values(size, size))
+
+        return (10.0**retval).reshape(shape) * u.erg / u.s
+
+    def write(self, fname):
+        """
+        Write the hierarchical table to a numpy .npz file
+
+        The file contains the leaf cells (level, i, j), the lattice indices
+        and the log10 of the cooling function of the computed points and the
+        parameters needed to map the lattice to densities and temperatures.
+
+        :param str fname: the path to the output file
+        """
+        keys = numpy.array(sorted(self.points), 'i8').reshape(-1, 2)
+        numpy.savez(
+            fname,
+            leaves=self.leaves,
+            points=keys,
+            log_cooling_function=numpy.array(
+                [self.points[tuple(key)] for key in keys]),
+            density_range=self.density_range.to(u.m**-3).value,
+            t_kin_range=self.t_kin_range.to(u.K).value,
+            t_rad=self.t_rad.to(u.K).value,
+            initial_shape=self.initial_shape,
+            max_level=self.max_level,
+            tolerance=self.tolerance
+        )
+
+    @classmethod
+    def read(cls, fname):
+        """
+        Read a table written by write
+
+        :param str fname: the path to the .npz file
+        :return: AdaptiveCoolingFunctionGrid: the table (without the species)
+        """
+        data = numpy.load(fname)
+
+        grid = cls()
+        grid.set_density_range(data['density_range'] * u.m**-3)
+        grid.set_t_kin_range(data['t_kin_range'] * u.K)
+        grid.set_t_rad(data['t_rad'] * u.K)
+        grid.set_tolerance(float(data['tolerance']))
+        grid.initial_shape = tuple(data['initial_shape'].tolist())
+        grid.max_level = int(data['max_level'])
+        grid.leaves = data['leaves']
+        grid.points = dict(
+            zip(map(tuple, data['points'].tolist()),
+                data['log_cooling_function'].tolist())
+        )
+
+        return grid
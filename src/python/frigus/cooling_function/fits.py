@@ -20,9 +20,23 @@
 module that implements cooling functions or fits of cooling functions
 """
 import numpy
+from numpy.polynomial.polynomial import polyval, polyval2d
 from astropy import units as u
 
 
+GLOVER_COEFFICIENTS_LOW_T = numpy.array(
+    [-24.311209, 3.5692468, -11.332860, -27.850082, -21.328264, -4.2519023]
+)
+"""the coefficients of the Glover fit for 100 K <= T <= 1000 K in increasing
+order of the power of log10(T / 1000 K)"""
+
+GLOVER_COEFFICIENTS_HIGH_T = numpy.array(
+    [-24.311209, 4.6450521, -3.7209846, 5.9369081, -5.5108047, 1.5538288]
+)
+"""the coefficients of the Glover fit for 1000 K < T <= 6000 K in increasing
+order of the power of log10(T / 1000 K)"""
+
+
 def fit_glover(t_kin):
     """
     Compute the cooling rate of the Glover Fit of the cooling rate of H2
@@ -31,28 +45,190 @@ def fit_glover(t_kin):
 
     reference: https://goo.gl/htEPuJ
 
-    :param ndarray|float t_kin: The input kinetic temperature (in K)
-    :return: ndarray|float the cooling rate
+    The branch of the piecewise fit is selected for each temperature with a
+    mask and the polynomials are evaluated using Horner's scheme, thus large
+    arrays of temperatures can be evaluated with a single call.
+
+    :param ndarray|float|Quantity t_kin: The input kinetic temperature(s)
+     (in K if not a Quantity)
+    :return: Quantity: the cooling rate with the same shape as t_kin
     """
-    if 100.0 <= t_kin <= 1000.0:
-        retval = 10**(-24.311209
-                      + 3.5692468*numpy.log10(t_kin/1000.)
-                      - 11.332860*(numpy.log10(t_kin/1000.))**2
-                      - 27.850082*(numpy.log10(t_kin/1000.))**3
-                      - 21.328264*(numpy.log10(t_kin/1000.))**4
-                      - 4.2519023*(numpy.log10(t_kin/1000.))**5)
-    elif 1000.0 < t_kin <= 6000.0:
-        retval = 10**(-24.311209
-                      + 4.6450521*numpy.log10(t_kin/1000.)
-                      - 3.7209846*numpy.log10((t_kin/1000.))**2
-                      + 5.9369081*numpy.log10((t_kin/1000.))**3
-                      - 5.5108047*numpy.log10((t_kin/1000.))**4
-                      + 1.5538288*numpy.log10((t_kin/1000.))**5)
-    else:
-        msg = "inpute kinetic temperature {} is out of bounds".format(t_kin)
+    if isinstance(t_kin, u.quantity.Quantity):
+        t_kin = t_kin.to(u.K).value
+
+    t_kin = numpy.asarray(t_kin, 'f8')
+
+    out_of_bounds = ~((t_kin >= 100.0) & (t_kin <= 6000.0))
+    if out_of_bounds.any():
+        msg = "inpute kinetic temperature {} is out of bounds".format(
+            t_kin[out_of_bounds])
         raise ValueError(msg)
 
-    return retval * u.erg * u.s**-1 * u.cm**3
+    lt_kin = numpy.log10(t_kin / 1000.)
+    low_t = t_kin <= 1000.0
+    high_t = ~low_t
+
+    log_rate = numpy.empty_like(lt_kin)
+    log_rate[low_t] = polyval(lt_kin[low_t], GLOVER_COEFFICIENTS_LOW_T)
+    log_rate[high_t] = polyval(lt_kin[high_t], GLOVER_COEFFICIENTS_HIGH_T)
+
+    return 10**log_rate * u.erg * u.s**-1 * u.cm**3
+
+
+class PolynomialFit2D(object):
+    """
+    A two dimensional polynomial fit of a cooling function in log-log space
+
+    The cooling function is evaluated as:
+
+    .. math::
+
+        \\log_{10} \\Lambda = \\sum_{ij} c_{ij} (\\log_{10} T)^i (\\log_{10} n)^j
+
+    where T is in K and n is in cm^-3. The polynomial is evaluated using
+    Horner's scheme (numpy.polynomial.polynomial.polyval2d) and the
+    temperature and the density are broadcast against each other, i.e. a
+    table can be evaluated by passing e.g. t_kin[:, None] and n[None, :].
+
+    .. code-block:: python
+
+        fit = PolynomialFit2D(
+            coefficients,
+            t_kin_range=[100.0, 2000.0] * u.K,
+            density_range=[1e6, 1e14] * u.m**-3,
+            unit=u.erg / u.s
+        )
+        cooling_function = fit(t_kin, n)
+    """
+    def __init__(self,
+                 coefficients,
+                 t_kin_range,
+                 density_range,
+                 unit,
+                 max_error=None,
+                 rms_error=None):
+        """
+        Constructor
+
+        :param array_like coefficients: The coefficients c_ij as a 2D array
+         where the row index is the power of log10(T) and the column index is
+         the power of log10(n).
+        :param Quantity t_kin_range: the min and max temperature of the
+         validity range of the fit
+        :param Quantity density_range: the min and max density of the
+         validity range of the fit
+        :param Unit unit: the unit of the cooling function
+        :param float max_error: the maximum absolute error of the fit in
+         log10 (dex), if known.
+        :param float rms_error: the root mean square error of the fit in
+         log10 (dex), if known.
+        """
+        self.coefficients = numpy.array(coefficients, 'f8')
+        """the coefficients c_ij of the polynomial"""
+
+        self.t_kin_range = t_kin_range.to(u.K)
+        """the validity range of the fit in temperature"""
+
+        self.density_range = density_range.to(u.cm**-3)
+        """the validity range of the fit in density"""
+
+        self.unit = unit
+        """the unit of the evaluated cooling function"""
+
+        self.max_error = max_error
+        """the maximum error of the fit in dex w.r.t the fitted data"""
+
+        self.rms_error = rms_error
+        """the root mean square error of the fit in dex w.r.t the fitted
+        data"""
+
+    def check_range(self, t_kin, density):
+        """
+        Check that the input values are within the validity range of the fit
+
+        :param Quantity t_kin: the kinetic temperature
+        :param Quantity density: the density
+        :raises TypeError: if any of the inputs is not a Quantity
+        :raises ValueError: if any of the values are out of the validity range
+        """
+        for name, value, valid_range in [
+                ('kinetic temperature', t_kin, self.t_kin_range),
+                ('density', density, self.density_range)]:
+
+            if not isinstance(value, u.quantity.Quantity):
+                raise TypeError('the {} should be a Quantity'.format(name))
+
+            value = value.to(valid_range.unit).value
+            out_of_bounds = ~((value >= valid_range[0].value) &
+                              (value <= valid_range[1].value))
+            if out_of_bounds.any():
+                msg = ('{} values of the {} are out of the validity range '
+                       '[{}, {}] of the fit').format(
+                    out_of_bounds.sum(), name, *valid_range)
+                raise ValueError(msg)
+
+    def evaluate_log10(self, lt_kin, ln):
+        """
+        Evaluate the log10 of the fit (unit-less)
+
+        :param ndarray lt_kin: log10 of the temperature in K
+        :param ndarray ln: log10 of the density in cm^-3
+        :return: ndarray: log10 of the cooling function in self.unit
+        """
+        lt_kin, ln = numpy.broadcast_arrays(lt_kin, ln)
+        return polyval2d(lt_kin, ln, self.coefficients)
+
+    def __call__(self, t_kin, density, check=True):
+        """
+        Evaluate the fit
+
+        :param Quantity t_kin: the kinetic temperature
+        :param Quantity density: the density
+        :param bool check: if True, the validity range is checked
+        :return: Quantity: The cooling function in self.unit
+        """
+        if check is True:
+            self.check_range(t_kin, density)
+
+        lt_kin = numpy.log10(t_kin.to(u.K).value)
+        ln = numpy.log10(density.to(u.cm**-3).value)
+
+        return 10.0**self.evaluate_log10(lt_kin, ln) * self.unit
+
+
+LIPOVKA_FIT = PolynomialFit2D(
+    [
+        [-42.57688, 0.92433, 0.54962, -0.07676, 0.00275],
+        [21.93385, 0.77952, -1.06447, 0.11864, -0.00366],
+        [-10.19097, -0.54263, 0.62343, -0.07366, 0.002514],
+        [2.19906, 0.11711, -0.13768, 0.01759, -0.000666317],
+        [-0.17334, -0.00835, 0.0106, -0.001482, 0.000061926],
+    ],
+    t_kin_range=[100.0, 2000.0] * u.K,
+    density_range=[1e6, 1e14] * u.m**-3,
+    unit=u.erg * u.s**-1
+)
+"""the fit of the HD cooling function by Lipovka, Nunez, Avila Reese 2005"""
+
+COPPOLA_FIT = PolynomialFit2D(
+    [
+        [-2.82483125e2, -1.34604375e2, 1.07432776e2, -2.04446787e1,
+         1.17030794e0],
+        [3.92355880e2, 2.15639291e2, -1.68827762e2, 3.18279345e1,
+         -1.80956442e0],
+        [-2.26543263e2, -1.26554822e2, 9.80765328e1, -1.83570655e1,
+         1.03763936e0],
+        [5.80077743e1, 3.25577420e1, -2.50129961e1, 4.65210999e0,
+         -2.61574544e-1],
+        [-5.50713938e0, -3.10446347e0, 2.36722261e0, -4.37732460e-1,
+         2.44900752e-2],
+    ],
+    t_kin_range=[100.0, 5000.0] * u.K,
+    density_range=[1e6, 1e14] * u.m**-3,
+    unit=u.erg * u.s**-1
+)
+"""the fit of the H2 cooling function by Coppola, Lique, Mazzia & Kazandjian
+2018"""
 
 
 def fit_lipovka(t_kin, n_hd):
@@ -67,56 +243,11 @@ def fit_lipovka(t_kin, n_hd):
      quantity (in K)
     :param u.quantity.Quantity n_hd: The density of HD as an astropy quantity
     :return: u.quantity.Quantity: The cooling function in erg / s for the
-     inpute T values
+     inpute T values (t_kin and n_hd are broadcast against each other)
 
     .. todo:: add an example script for plotting this cooling function
     """
-    #
-    # make sure the input temperatures and density values are within the
-    # validity range of the fit and are of the correct types
-    #
-    assert isinstance(t_kin, u.quantity.Quantity)
-    assert isinstance(n_hd, u.quantity.Quantity)
-
-    assert t_kin.min() >= 100.0 * u.K
-    assert t_kin.max() <= 2000.0 * u.K
-    assert n_hd.min() >= 1e6 * u.m**-3
-    assert n_hd.max() <= 1e14 * u.m**-3
-
-    lt_kin = numpy.log10(t_kin.value)
-    ln_hd = numpy.log10(n_hd.cgs.value)
-
-    retval = 10.**(- 42.57688 * lt_kin ** 0 * ln_hd ** 0
-                   + 0.92433 * lt_kin ** 0 * ln_hd ** 1
-                   + 0.54962 * lt_kin ** 0 * ln_hd ** 2
-                   - 0.07676 * lt_kin ** 0 * ln_hd ** 3
-                   + 0.00275 * lt_kin ** 0 * ln_hd ** 4
-
-                   + 21.93385 * lt_kin ** 1 * ln_hd ** 0
-                   + 0.77952 * lt_kin ** 1 * ln_hd ** 1
-                   - 1.06447 * lt_kin ** 1 * ln_hd ** 2
-                   + 0.11864 * lt_kin ** 1 * ln_hd ** 3
-                   - 0.00366 * lt_kin ** 1 * ln_hd ** 4
-
-                   - 10.19097 * lt_kin ** 2 * ln_hd ** 0
-                   - 0.54263 * lt_kin ** 2 * ln_hd ** 1
-                   + 0.62343 * lt_kin ** 2 * ln_hd ** 2
-                   - 0.07366 * lt_kin ** 2 * ln_hd ** 3
-                   + 0.002514 * lt_kin ** 2 * ln_hd ** 4
-
-                   + 2.19906 * lt_kin ** 3 * ln_hd ** 0
-                   + 0.11711 * lt_kin ** 3 * ln_hd ** 1
-                   - 0.13768 * lt_kin ** 3 * ln_hd ** 2
-                   + 0.01759 * lt_kin ** 3 * ln_hd ** 3
-                   - 0.000666317 * lt_kin ** 3 * ln_hd ** 4
-
-                   - 0.17334 * lt_kin ** 4 * ln_hd ** 0
-                   - 0.00835 * lt_kin ** 4 * ln_hd ** 1
-                   + 0.0106 * lt_kin ** 4 * ln_hd ** 2
-                   - 0.001482 * lt_kin ** 4 * ln_hd ** 3
-                   + 0.000061926 * lt_kin ** 4 * ln_hd ** 4)
-
-    return retval * u.erg * u.s**-1
+    return LIPOVKA_FIT(t_kin, n_hd)
 
 
 def fit_lipovka_low_density(t_kin):
@@ -132,18 +263,19 @@ def fit_lipovka_low_density(t_kin):
      function will be computedd in K
     :return: ndarray|float: the cooling function in units of erg / s
     """
-    assert isinstance(t_kin, u.quantity.Quantity)
+    if not isinstance(t_kin, u.quantity.Quantity):
+        raise TypeError('the kinetic temperature should be a Quantity')
 
-    assert t_kin.min() >= 100.0 * u.K
-    assert t_kin.max() <= 20000.0 * u.K
+    t_kin = t_kin.to(u.K).value
+    if (~((t_kin >= 100.0) & (t_kin <= 20000.0))).any():
+        raise ValueError('kinetic temperature out of the range of the fit')
 
-    lt_kin = numpy.log10(t_kin.value)
+    lt_kin = numpy.log10(t_kin)
 
-    retval = 10.0**(- 42.45906
-                    + 21.90083 * lt_kin
-                    - 10.1954 * lt_kin**2
-                    + 2.19788 * lt_kin**3
-                    - 0.17286 * lt_kin**4)
+    retval = 10.0**polyval(
+        lt_kin,
+        [-42.45906, 21.90083, -10.1954, 2.19788, -0.17286]
+    )
 
     return retval * u.erg * u.s**-1
 
@@ -162,55 +294,10 @@ def fit_coppola(t_kin, n_hd):
      quantity (in K)
     :param u.quantity.Quantity n_hd: The density of HD as an astropy quantity
     :return: u.quantity.Quantity: The cooling function in erg / s for the
-     input T values
+     input T values (t_kin and n_hd are broadcast against each other)
 
     """
-    #
-    # make sure the input temperatures and density values are within the
-    # validity range of the fit and are of the correct types
-    #
-    assert isinstance(t_kin, u.quantity.Quantity)
-    assert isinstance(n_hd, u.quantity.Quantity)
-
-    assert t_kin.min() >= 100.0 * u.K
-    assert t_kin.max() <= 5000.0 * u.K
-    assert n_hd.min() >= 1e6 * u.m**-3
-    assert n_hd.max() <= 1e14 * u.m**-3
-
-    lt_kin = numpy.log10(t_kin.value)
-    ln_hd = numpy.log10(n_hd.cgs.value)
-
-    retval = 10.**(- 2.82483125e2 * lt_kin ** 0 * ln_hd ** 0
-                   - 1.34604375e2 * lt_kin ** 0 * ln_hd ** 1
-                   + 1.07432776e2 * lt_kin ** 0 * ln_hd ** 2
-                   - 2.04446787e1 * lt_kin ** 0 * ln_hd ** 3
-                   + 1.17030794e0 * lt_kin ** 0 * ln_hd ** 4
-
-                   + 3.92355880e2 * lt_kin ** 1 * ln_hd ** 0
-                   + 2.15639291e2 * lt_kin ** 1 * ln_hd ** 1
-                   - 1.68827762e2 * lt_kin ** 1 * ln_hd ** 2
-                   + 3.18279345e1 * lt_kin ** 1 * ln_hd ** 3
-                   - 1.80956442e0 * lt_kin ** 1 * ln_hd ** 4
-
-                   - 2.26543263e2 * lt_kin ** 2 * ln_hd ** 0
-                   - 1.26554822e2 * lt_kin ** 2 * ln_hd ** 1
-                   + 9.80765328e1 * lt_kin ** 2 * ln_hd ** 2
-                   - 1.83570655e1 * lt_kin ** 2 * ln_hd ** 3
-                   + 1.03763936e0 * lt_kin ** 2 * ln_hd ** 4
-
-                   + 5.80077743e1 * lt_kin ** 3 * ln_hd ** 0
-                   + 3.25577420e1 * lt_kin ** 3 * ln_hd ** 1
-                   - 2.50129961e1 * lt_kin ** 3 * ln_hd ** 2
-                   + 4.65210999e0 * lt_kin ** 3 * ln_hd ** 3
-                   - 2.61574544e-1 * lt_kin ** 3 * ln_hd ** 4
-
-                   - 5.50713938e0 * lt_kin ** 4 * ln_hd ** 0
-                   - 3.10446347e0 * lt_kin ** 4 * ln_hd ** 1
-                   + 2.36722261e0 * lt_kin ** 4 * ln_hd ** 2
-                   - 4.37732460e-1 * lt_kin ** 4 * ln_hd ** 3
-                   + 2.44900752e-2 * lt_kin ** 4 * ln_hd ** 4)
-
-    return retval * u.erg * u.s**-1
+    return COPPOLA_FIT(t_kin, n_hd)
 
 
 def fit_flower(density, t_kin):
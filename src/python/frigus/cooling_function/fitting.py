@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+
+#    fitting.py is part of Frigus.
+
+#    Frigus: software to compure the energy exchange in a multi-level system
+#    Copyright (C) 2016-2018 Mher V. Kazandjian and Carla Maria Coppola
+
+#    Frigus is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, version 3 of the License.
+#
+#    Frigus is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+
+#    You should have received a copy of the GNU General Public License
+#    along with Frigus.  If not, see <http://www.gnu.org/licenses/>.
+"""
+module that implements the fitting of computed cooling functions
+"""
+import numpy
+from numpy.polynomial.polynomial import polyvander2d
+
+from astropy import units as u
+
+from frigus.cooling_function.fits import PolynomialFit2D
+
+
+def fit_polynomial_2d(t_kin, density, cooling_function, degree=4):
+    """
+    Least squares fit of a cooling function with a log-log 2D polynomial
+
+    The fitted polynomial is of the form used by PolynomialFit2D, i.e. the
+    log10 of the cooling function is a polynomial in log10(T / K) and
+    log10(n / cm^-3). Points with non-positive or non-finite values of the
+    cooling function are ignored.
+
+    :param Quantity t_kin: the kinetic temperatures of the data points
+    :param Quantity density: the densities of the data points (same shape as
+     t_kin).
+    :param Quantity cooling_function: the cooling function at the data points
+     (same shape as t_kin).
+    :param int|tuple degree: the degree of the polynomial. If a tuple is
+     passed, the first element is the degree in temperature and the second is
+     the degree in density.
+    :return: PolynomialFit2D: the fit with the max and rms errors (in dex)
+     w.r.t the data points set.
+    """
+    if numpy.isscalar(degree):
+        degree = (degree, degree)
+
+    t_kin, density, values = [
+        x.flatten() for x in numpy.broadcast_arrays(
+            t_kin.to(u.K).value,
+            density.to(u.cm**-3).value,
+            cooling_function.value
+        )
+    ]
+
+    mask = numpy.isfinite(values) & (values > 0.0)
+    if mask.sum() < (degree[0] + 1) * (degree[1] + 1):
+        raise ValueError('not enough valid data points for the fit')
+
+    t_kin, density = t_kin[mask], density[mask]
+    lt_kin, ln = numpy.log10(t_kin), numpy.log10(density)
+    log_values = numpy.log10(values[mask])
+
+    # the columns of the Vandermonde matrix are scaled to unity norm to
+    # improve the conditioning of the least squares problem
+    vander = polyvander2d(lt_kin, ln, degree)
+    scale = numpy.linalg.norm(vander, axis=0)
+    scale[scale == 0.0] = 1.0
+
+    coefficients, _, _, _ = numpy.linalg.lstsq(
+        vander / scale, log_values, rcond=None
+    )
+    coefficients = (coefficients / scale).reshape(
+        degree[0] + 1, degree[1] + 1
+    )
+
+    residuals = numpy.dot(vander, coefficients.flatten()) - log_values
+
+    return PolynomialFit2D(
+        coefficients,
+        t_kin_range=u.Quantity([t_kin.min(), t_kin.max()], u.K),
+        density_range=u.Quantity([density.min(), density.max()], u.cm**-3),
+        unit=cooling_function.unit,
+        max_error=numpy.fabs(residuals).max(),
+        rms_error=numpy.sqrt((residuals**2).mean())
+    )
+
+
+def fit_cooling_function_grid(grid, degree=4):
+    """
+    Fit a log-log 2D polynomial to the cooling function of a computed grid
+
+    The grid should be computed over a mesh of densities and kinetic
+    temperatures at a single radiation temperature. The returned fit can be
+    evaluated (e.g. in hydro codes) as fast as the fits in
+    frigus.cooling_function.fits.
+
+    .. code-block:: python
+
+        grid = CoolingFunctionGrid()
+        grid.set_species(DataLoader().load('H2_lique'))
+        grid.set_density(numpy.logspace(6, 14, 20) * u.m**-3)
+        grid.set_t_kin(numpy.logspace(2, 3.7, 20) * u.K)
+        grid.set_t_rad(0.0 * u.K)
+        grid.compute()
+
+        fit = fit_cooling_function_grid(grid, degree=4)
+        print(fit.max_error, fit.rms_error)
+        cooling_function = fit(t_kin, n)
+
+    :param CoolingFunctionGrid grid: the computed grid
+    :param int|tuple degree: the degree of the polynomial (see
+     fit_polynomial_2d)
+    :return: PolynomialFit2D: the fit
+    """
+    # the grid is (re)computed if it was not computed for the current axes
+    # and species (a cooling function that was set without computing the
+    # grid is only checked against the shape of the grid), the mesh is
+    # rebuilt from the current axes
+    if grid.cooling_function is None:
+        stale = True
+    elif grid._computed_manifest is not None:
+        stale = grid._computed_manifest != grid.manifest()
+    else:
+        stale = numpy.shape(grid.cooling_function) != grid.shape
+    if stale:
+        grid.compute()
+    grid._compute_mesh()
+
+    t_rad = grid.t_rad_grid.to(u.K).value
+    if t_rad.size > 0 and (t_rad != t_rad.flat[0]).any():
+        raise ValueError('the fit requires a grid at a single radiation '
+                         'temperature')
+
+    return fit_polynomial_2d(
+        grid.t_kin_grid,
+        grid.n_grid,
+        numpy.asarray(grid.cooling_function) * (u.erg / u.s),
+        degree=degree
+    )
@@ -2,16 +2,80 @@ import numpy
 from numpy import isscalar
 
 from astropy import units as u
-import matplotlib.pyplot as plt
-from mpl_toolkits.mplot3d import Axes3D
 
-from frigus.population import cooling_rate_at_steady_state
+from frigus.population import (population_density_at_steady_state,
+                               cooling_rate,
+                               cooling_rate_per_transition)
 from frigus.cooling_function.fits import fit_lipovka
+from frigus.solvers.diagnostics import SolverDiagnosticsGrid
+from frigus.solvers.linear import solver_warnings
+from frigus.cooling_function.storage import (create_grid_store,
+                                             open_grid_store,
+                                             grid_store_exists)
+from frigus.logs import get_logger
+from frigus.utils import import_pyplot
+
+logger = get_logger(__name__)
+
+DIAGNOSTICS_ARRAYS = {
+    'condition_number': 'f8',
+    'residual_norm': 'f8',
+    'population_sum_error': 'f8',
+    'n_negative': 'i4',
+    'backend': 'S16',
+}
+"""the dtypes of the solver diagnostics stored for each grid point"""
+
+
+def _allocate_arrays(arrays, n_points):
+    """
+    Allocate in memory the arrays of the results of grid points
+
+    :param dict arrays: the dtypes (see GridStore.create) keyed by name
+    :param int n_points: the number of points
+    :return: dict: the zero initialized arrays keyed by name
+    """
+    retval = {}
+    for name, dtype in arrays.items():
+        if isinstance(dtype, tuple):
+            dtype, point_shape = dtype
+        else:
+            point_shape = ()
+        retval[name] = numpy.zeros((n_points,) + point_shape, dtype)
+    return retval
+
+
+def _top_transitions(power, k):
+    """
+    Find the transitions with the largest contributions to the cooling
+
+    :param ndarray power: the matrix of the power emitted by each transition
+     (see frigus.population.cooling_rate_per_transition)
+    :param int k: the number of transitions
+    :return: tuple: the upper and lower level indices and the power of the
+     k transitions sorted by decreasing power. If there are fewer than k
+     radiative transitions, the remaining indices are -1 and the power is 0.
+    """
+    upper = numpy.full(k, -1, 'i4')
+    lower = numpy.full(k, -1, 'i4')
+    top_power = numpy.zeros(k, 'f8')
+
+    flat_power = power.ravel()
+    nnz = numpy.flatnonzero(flat_power)
+    if nnz.size > k:
+        nnz = nnz[numpy.argpartition(-flat_power[nnz], k - 1)[:k]]
+    nnz = nnz[numpy.argsort(-flat_power[nnz], kind='stable')]
+
+    upper[:nnz.size], lower[:nnz.size] = numpy.unravel_index(nnz, power.shape)
+    top_power[:nnz.size] = flat_power[nnz]
+
+    return upper, lower, top_power
 
 
 class CoolingFunctionGrid(object):
     """
-    Compute the cooling function over a grid of densities and temperatures
+    Compute the cooling function over a grid of densities, kinetic
+    temperatures and radiation temperatures
     """
     def __init__(self):
         """
@@ -42,6 +106,26 @@ class CoolingFunctionGrid(object):
         self.cooling_function = None
         """The cooling function grid"""
 
+        self.diagnostics = None
+        """The diagnostics of the steady state solutions of the grid points"""
+
+        self.populations = None
+        """The population densities of the levels at the grid points (only
+        if requested when computing the grid)"""
+
+        self.transitions = None
+        """The top transitions contributing to the cooling function at the
+        grid points as a dict of the 'upper' and 'lower' level indices and
+        the emitted 'power' (only if requested when computing the grid)"""
+
+        self.store = None
+        """The store of the results if the grid is computed to disk"""
+
+        self._computed_manifest = None
+        """The manifest (without the options) of the last computation, used
+        to detect a cooling function that is stale after the axes or the
+        species changed"""
+
     def set_species(self, species):
         """setter for the speicies object"""
         self.species = species
@@ -60,7 +144,8 @@ class CoolingFunctionGrid(object):
 
     def _compute_mesh(self):
         """
-        Compute the 3D grid where the cooling function will be computed
+        Compute the mesh of the quantities where the cooling function will be
+        computed. The dimensions of size 1 are squeezed.
         """
         n_grid, t_kin_grid, t_rad_grid = numpy.meshgrid(
             self.n,
@@ -68,11 +153,19 @@ class CoolingFunctionGrid(object):
             self.t_rad
         )
 
-        # check the shape, one of the three quantities should be a scalar
         self.n_grid = n_grid.squeeze()
         self.t_kin_grid = t_kin_grid.squeeze()
         self.t_rad_grid = t_rad_grid.squeeze()
 
+    def _check_2d_mesh(self):
+        """
+        Check that the mesh is 2D (e.g. for plotting)
+
+        The mesh is rebuilt from the current axes since they could have been
+        changed after it was computed.
+        """
+        self._compute_mesh()
+
         msg = (
             'one of the three quantities should have either a dimension 1 or\n'
             'should be a scalar. The provided shapes are:\n'
@@ -86,33 +179,320 @@ class CoolingFunctionGrid(object):
         )
 
         assert len(self.n_grid.shape) == 2, msg
-        assert len(self.t_kin_grid.shape) == 2, msg
-        assert len(self.t_rad_grid.shape) == 2, msg
 
-    def compute(self):
+    def _axes(self):
         """
-        Compute the cooling function for the specified grid
+        The values of the quantities along the axes of the (unsqueezed) grid
 
-        :return: ndarray
+        The axes are ordered as in the mesh computed by numpy.meshgrid, i.e
+        (t_kin, n, t_rad).
+
+        :return: tuple: the 1D arrays of t_kin [K], n [m^-3] and t_rad [K]
         """
+        return (
+            numpy.atleast_1d(self.t_kin.to(u.K).value).flatten(),
+            numpy.atleast_1d(self.n.to(u.m**-3).value).flatten(),
+            numpy.atleast_1d(self.t_rad.to(u.K).value).flatten()
+        )
 
-        self._compute_mesh()
+    @property
+    def shape(self):
+        """the shape of the grid (the dimensions of size 1 are squeezed)"""
+        return tuple(
+            axis.size for axis in self._axes() if axis.size != 1
+        )
 
-        cooling_rate = numpy.zeros_like(self.n_grid.value).flatten()
-        for i, (n, t_kin, t_rad) in enumerate(
-                zip(self.n_grid.flat,
-                    self.t_kin_grid.flat,
-                    self.t_rad_grid.flat)):
+    def iter_chunks(self, chunk_size):
+        """
+        Iterate over the points of the grid in chunks
 
-            cooling_rate[i] = cooling_rate_at_steady_state(
-                self.species,
-                t_kin,
-                t_rad,
-                n).cgs.value
+        The points are generated from the axes for each chunk, i.e the mesh
+        of the whole grid is never constructed. The flat index of the points
+        is the same as that of the cooling function grid.
 
-        cooling_rate_grid = cooling_rate.reshape(self.n_grid.shape)
-        self.cooling_function = cooling_rate_grid
-        return cooling_rate_grid
+        :param int chunk_size: the number of points in a chunk
+        :return: generator: tuples of (start, stop, n, t_kin, t_rad) where
+         start and stop are the flat indices of the first and after the last
+         point of the chunk and n [m^-3], t_kin [K] and t_rad [K] are arrays
+         of the values at the points of the chunk.
+        """
+        t_kin, n, t_rad = self._axes()
+        full_shape = (t_kin.size, n.size, t_rad.size)
+        n_points = int(numpy.prod(full_shape))
+
+        for start in range(0, n_points, chunk_size):
+            stop = min(start + chunk_size, n_points)
+            i_t_kin, i_n, i_t_rad = numpy.unravel_index(
+                numpy.arange(start, stop), full_shape)
+            yield start, stop, n[i_n], t_kin[i_t_kin], t_rad[i_t_rad]
+
+    def _result_arrays(self, options):
+        """
+        The dtypes of the arrays of the results of each grid point
+
+        :param dict options: the stored quantities (see self.compute)
+        :return: dict: the dtypes (see GridStore.create) keyed by name
+        """
+        arrays = {'cooling_function': 'f8'}
+        arrays.update(DIAGNOSTICS_ARRAYS)
+
+        if options['populations'] is True:
+            n_levels = self.species.a_matrix.shape[0]
+            arrays['populations'] = (options['populations_dtype'],
+                                     (n_levels,))
+
+        top_transitions = options['top_transitions']
+        if top_transitions > 0:
+            arrays['transitions_upper'] = ('i4', (top_transitions,))
+            arrays['transitions_lower'] = ('i4', (top_transitions,))
+            arrays['transitions_power'] = ('f4', (top_transitions,))
+
+        return arrays
+
+    def _compute_chunk(self, n, t_kin, t_rad, options):
+        """
+        Compute the cooling function at the points of a chunk
+
+        :param ndarray n: the densities in m^-3
+        :param ndarray t_kin: the kinetic temperatures in K
+        :param ndarray t_rad: the radiation temperatures in K
+        :param dict options: the stored quantities (see self.compute)
+        :return: dict: the results of the points of the chunk keyed by the
+         names in self._result_arrays, the cooling function is in cgs units.
+        """
+        results = _allocate_arrays(self._result_arrays(options), n.size)
+        top_transitions = options['top_transitions']
+
+        for i in range(n.size):
+
+            x_equilibrium, point_diagnostics = \
+                population_density_at_steady_state(
+                    self.species,
+                    t_kin[i] * u.K,
+                    t_rad[i] * u.K,
+                    n[i] * u.m**-3,
+                    return_diagnostics=True,
+                    method=options['method'])
+
+            results['cooling_function'][i] = cooling_rate(
+                x_equilibrium,
+                self.species.energy_levels,
+                self.species.a_matrix,
+                emitted_power=self.species.emitted_power
+            ).cgs.value
+            for name in DIAGNOSTICS_ARRAYS:
+                results[name][i] = getattr(point_diagnostics, name)
+            if options['populations'] is True:
+                results['populations'][i] = x_equilibrium.flatten()
+            if top_transitions > 0:
+                power = cooling_rate_per_transition(
+                    x_equilibrium,
+                    self.species.energy_levels,
+                    self.species.a_matrix
+                ).cgs.value
+                upper, lower, transitions_power = _top_transitions(
+                    power, top_transitions)
+                results['transitions_upper'][i] = upper
+                results['transitions_lower'][i] = lower
+                results['transitions_power'][i] = transitions_power
+
+        return results
+
+    def manifest(self, options=None):
+        """
+        The parameters of the grid that identify a computation
+
+        :param dict options: the stored quantities (see self.compute)
+        :return: dict: The values of the axes of the grid, the fingerprint
+         of the data of the species (see DataSetBase.fingerprint) and the
+         stored quantities.
+        """
+        t_kin, n, t_rad = self._axes()
+        return {
+            't_kin': t_kin.tolist(),
+            'n': n.tolist(),
+            't_rad': t_rad.tolist(),
+            'dataset': self.species.fingerprint(),
+            'options': options or {}
+        }
+
+    def _open_checkpoint(self, output, shape, options, resume):
+        """
+        Create the store of the results or open it to resume a computation
+
+        :param str output: the path to the store
+        :param tuple shape: the shape of the grid
+        :param dict options: the stored quantities (see self.compute)
+        :param bool resume: if True and the store exists, it is opened to
+         resume the computation.
+        :return: GridStore|HDF5GridStore: the store opened for writing
+        """
+        manifest = self.manifest(options)
+
+        if resume is True and grid_store_exists(output):
+            store = open_grid_store(output, mode='r+')
+            if store.metadata.get('manifest') != manifest:
+                raise ValueError(
+                    'can not resume the computation in {}, the grid or the '
+                    'species data do not match the manifest of the '
+                    'checkpoint'.format(output)
+                )
+            logger.info('resuming the computation in %s, %d of %d points '
+                        'are already computed', output,
+                        store.read('completed').sum(), store.n_points)
+        else:
+            arrays = self._result_arrays(options)
+            arrays['completed'] = 'u1'
+            store = create_grid_store(
+                output,
+                shape,
+                arrays=arrays,
+                metadata={'unit': 'erg / s', 'manifest': manifest}
+            )
+
+        return store
+
+    def compute(self,
+                chunk_size=None,
+                output=None,
+                resume=False,
+                populations=False,
+                populations_dtype='f4',
+                top_transitions=0,
+                method='linear'):
+        """
+        Compute the cooling function for the specified grid
+
+        Any of the density, the kinetic and the radiation temperatures can be
+        arrays, i.e 3D grids are supported. The grid is evaluated in chunks
+        of points. If an output path is specified, the results of each chunk
+        are written to disk as soon as they are computed and the full grid is
+        never held in memory. Paths ending with .h5 or .hdf5 are written to
+        HDF5 files, otherwise to a directory of memory mapped .npy files (see
+        frigus.cooling_function.storage). The store holds the cooling
+        function, the solver diagnostics and optionally the population
+        densities of each grid point and can be sliced without loading it.
+
+        To keep big grids compact, the populations are stored in single
+        precision by default and instead of the full matrix of the contributions of the transitions
+        to the cooling function (a_matrix * delta_e * x), only the top
+        transitions of each grid point can be kept. They are stored sorted
+        by decreasing power in the arrays transitions_upper,
+        transitions_lower (the indices of the levels) and transitions_power
+        (float32 in erg / s). The unused entries (if there are fewer
+        radiative transitions than requested) have indices -1.
+
+        The chunks written to disk are checkpoints, i.e. the points of each
+        chunk are flagged as completed once their values are flushed. The
+        store also holds a manifest of the grid and of the data of the
+        species. If resume is True, an interrupted computation is resumed
+        and only the chunks that are not completed are computed.
+
+        The diagnostics of the solutions of all the points are stored in
+        self.diagnostics and can be used to flag unreliable points.
+
+        .. code-block:: python
+
+            grid.compute(chunk_size=1000, output='run.h5', resume=True)
+            populations = grid.store.read('populations', 0, 1000)
+
+        :param int chunk_size: the number of points per chunk. By default all
+         the points are evaluated in a single chunk.
+        :param str output: the path to the store of the results.
+        :param bool resume: if True, resume the computation stored in output
+         if it exists. A ValueError is raised if the stored manifest does not
+         match the grid.
+        :param bool populations: if True, keep the population densities of
+         the levels at each grid point in self.populations (and the store).
+        :param str populations_dtype: the dtype of the stored populations.
+         By default they are stored in single precision, use 'f8' to keep
+         the full precision of the solutions.
+        :param int top_transitions: the number of the transitions with the
+         largest contributions to the cooling function kept for each grid
+         point in self.transitions (and the store).
+        :param str method: the method used to compute the steady states
+         (see population.population_density_at_steady_state), e.g. 'auto'
+         to use the LTE and low density limits at the points deep in these
+         limits. The path taken at each point is stored in the backend
+         diagnostics.
+        :return: ndarray: the cooling function in cgs units with the shape
+         self.shape. If output is specified, the results (and the
+         diagnostics) are not loaded, they are read only memory mapped
+         arrays (.npy backend) or lazy views of the datasets (HDF5 backend,
+         see storage.GridArrayView).
+        """
+        shape = self.shape
+        n_points = int(numpy.prod(shape))
+
+        options = {
+            'populations': populations,
+            'populations_dtype': numpy.dtype(populations_dtype).str,
+            'top_transitions': int(top_transitions),
+            'method': method
+        }
+        if chunk_size is None:
+            chunk_size = max(n_points, 1)
+
+        if output is None:
+            store = None
+            results = _allocate_arrays(
+                self._result_arrays(options), n_points)
+            completed = numpy.zeros(n_points, bool)
+        else:
+            store = self._open_checkpoint(output, shape, options, resume)
+            completed = store.read('completed')
+
+        solver_warnings.reset()
+
+        for start, stop, n, t_kin, t_rad in self.iter_chunks(chunk_size):
+
+            if completed[start:stop].all():
+                continue
+
+            chunk_results = self._compute_chunk(n, t_kin, t_rad, options)
+
+            if store is None:
+                for name, values in chunk_results.items():
+                    results[name][start:stop] = values
+            else:
+                # the chunk is flagged as completed only after its values
+                # are on disk
+                for name, values in chunk_results.items():
+                    store.write(name, start, stop, values)
+                store.flush()
+                store.write('completed', start, stop, 1)
+                store.flush()
+
+        # report the number of points for which the solver issued warnings
+        # instead of a message per point
+        solver_warnings.log_summary()
+
+        if store is None:
+            results = {
+                name: array.reshape(shape + array.shape[1:])
+                for name, array in results.items()
+            }
+        else:
+            store.close()
+            store = open_grid_store(output)
+            results = {
+                name: store.grid_array(name)
+                for name in self._result_arrays(options)
+            }
+
+        self.store = store
+        self.cooling_function = results['cooling_function']
+        self.populations = results.get('populations')
+        if top_transitions > 0:
+            self.transitions = {
+                name: results['transitions_' + name]
+                for name in ['upper', 'lower', 'power']
+            }
+        else:
+            self.transitions = None
+        self.diagnostics = SolverDiagnosticsGrid.from_arrays(results)
+        self._computed_manifest = self.manifest()
+        return self.cooling_function
 
     def _determine_x_y_quantities(self, x, y):
         """
@@ -138,11 +518,17 @@ class CoolingFunctionGrid(object):
         if self.cooling_function is None:
             self.compute()
 
+        self._check_2d_mesh()
+
         xval, yval = self._determine_x_y_quantities(x, y)
         assert xval.shape == yval.shape, 'requested quantities are not meshes'
 
         zval = self.cooling_function
 
+        plt = import_pyplot()
+        # register the 3d projection
+        from mpl_toolkits.mplot3d import Axes3D  # noqa: F401
+
         fig = plt.figure()
         ax = fig.gca(projection='3d')
 
@@ -173,8 +559,11 @@ class CoolingFunctionGrid(object):
         if self.cooling_function is None:
             self.compute()
 
+        self._check_2d_mesh()
+
         xval, yval = self._determine_x_y_quantities(x, y)
 
+        plt = import_pyplot()
         plt.ion()
         fig, axs = plt.subplots(figsize=(8, 8))
 
@@ -0,0 +1,547 @@
+# -*- coding: utf-8 -*-
+
+#    storage.py is part of Frigus.
+
+#    Frigus: software to compure the energy exchange in a multi-level system
+#    Copyright (C) 2016-2018 Mher V. Kazandjian and Carla Maria Coppola
+
+#    Frigus is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, version 3 of the License.
+#
+#    Frigus is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+
+#    You should have received a copy of the GNU General Public License
+#    along with Frigus.  If not, see <http://www.gnu.org/licenses/>.
+"""
+module that implements the on-disk storage of the results of grid runs
+
+Two backends with the same interface are provided:
+
+    - GridStore: a directory of memory mapped numpy .npy files
+    - HDF5GridStore: a chunked HDF5 file (requires h5py)
+
+In both backends the arrays are indexed by the flat index of the grid points,
+are written incrementally chunk by chunk and can be sliced without loading
+them. Use create_grid_store and open_grid_store to select the backend from
+the extension of the path.
+"""
+import os
+import json
+
+import numpy
+from numpy.lib.format import open_memmap
+
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
+HDF5_EXTENSIONS = ('.h5', '.hdf5')
+"""the extensions of the paths that are stored in HDF5 files"""
+
+
+def _array_info(arrays):
+    """
+    Parse the specification of the arrays of a store
+
+    :param dict arrays: the dtypes or (dtype, point_shape) keyed by name
+    :return: dict: the dtype string and the point shape keyed by name
+    """
+    array_info = {}
+    for name, dtype in arrays.items():
+        if isinstance(dtype, tuple):
+            dtype, point_shape = dtype
+        else:
+            point_shape = ()
+        point_shape = tuple(numpy.atleast_1d(point_shape).tolist())
+
+        array_info[name] = {
+            'dtype': numpy.dtype(dtype).str,
+            'point_shape': list(point_shape)
+        }
+    return array_info
+
+
+class GridArrayView(object):
+    """
+    A read only view of an array of a store with the shape of the grid
+
+    The array of the store (e.g. a h5py dataset) is indexed by the flat index
+    of the grid points and can not be reshaped without reading it. The view
+    translates the grid indices to a range of flat indices, i.e. only the
+    points between the first and the last requested ones are read.
+
+    .. code-block:: python
+
+        cooling_function = store.grid_array('cooling_function')
+        values = cooling_function[2, :, 0]
+        all_values = numpy.asarray(cooling_function)
+    """
+    def __init__(self, array, shape):
+        """
+        Constructor
+
+        :param array_like array: the array of the store indexed by the flat
+         grid index
+        :param tuple shape: the shape of the grid
+        """
+        self.array = array
+        """the array of the store"""
+
+        self.grid_shape = tuple(shape)
+        """the shape of the grid"""
+
+    @property
+    def shape(self):
+        """the shape of the grid followed by the shape of the point values"""
+        return self.grid_shape + tuple(self.array.shape[1:])
+
+    @property
+    def dtype(self):
+        """the dtype of the array"""
+        return self.array.dtype
+
+    @property
+    def ndim(self):
+        """the number of dimensions"""
+        return len(self.shape)
+
+    @property
+    def size(self):
+        """the number of elements"""
+        return int(numpy.prod(self.shape))
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __array__(self, dtype=None):
+        values = numpy.asarray(self.array[...]).reshape(self.shape)
+        if dtype is not None:
+            values = values.astype(dtype)
+        return values
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key,)
+        ellipsis = [i for i, index in enumerate(key) if index is Ellipsis]
+        if len(ellipsis) > 0:
+            i = ellipsis[0]
+            key = (key[:i] +
+                   (slice(None),) * (self.ndim - len(key) + 1) +
+                   key[i + 1:])
+        key = key + (slice(None),) * (self.ndim - len(key))
+
+        n_grid = len(self.grid_shape)
+        grid_key, point_key = key[:n_grid], key[n_grid:]
+
+        indices = [
+            numpy.arange(size)[index]
+            for size, index in zip(self.grid_shape, grid_key)
+        ]
+        flat = numpy.ravel_multi_index(
+            numpy.ix_(*[numpy.atleast_1d(index) for index in indices]),
+            self.grid_shape
+        )
+
+        if flat.size == 0:
+            values = numpy.zeros(flat.shape + self.shape[n_grid:], self.dtype)
+        else:
+            start, stop = flat.min(), flat.max() + 1
+            values = numpy.asarray(self.array[start:stop])[flat - start]
+
+        # drop the axes indexed by integers
+        values = values[tuple(
+            0 if numpy.ndim(index) == 0 else slice(None) for index in indices
+        )]
+
+        n_sliced = sum(numpy.ndim(index) for index in indices)
+        return values[(slice(None),) * n_sliced + point_key]
+
+
+class GridStore(object):
+    """
+    A directory of memory mapped numpy arrays holding the results of a grid
+
+    Each array is stored in a .npy file whose first dimension is the flat
+    index of the grid points, thus the results can be written chunk by chunk
+    as they are computed and can be sliced without loading the whole array.
+    The shape of the grid and other metadata are stored in metadata.json.
+
+    .. code-block:: python
+
+        store = GridStore.create('run.grid', shape=(100, 200, 10),
+                                 arrays={'cooling_function': 'f8'})
+        store.write('cooling_function', 0, 1000, values)
+        store.flush()
+
+        store = GridStore.open('run.grid')
+        cooling_function = store.array('cooling_function')[0:1000]
+    """
+    METADATA_FNAME = 'metadata.json'
+
+    def __init__(self, path, mode='r'):
+        """
+        Constructor. Use GridStore.create or GridStore.open instead.
+
+        :param str path: the path to the directory of the store
+        :param str mode: 'r' for read only or 'r+' for read and write
+        """
+        self.path = path
+        """the path to the directory of the store"""
+
+        self.mode = mode
+        """the mode in which the arrays are opened"""
+
+        with open(os.path.join(path, self.METADATA_FNAME)) as fobj:
+            self.metadata = json.load(fobj)
+            """the metadata of the store"""
+
+        self._arrays = {}
+
+    @property
+    def shape(self):
+        """the shape of the grid"""
+        return tuple(self.metadata['shape'])
+
+    @property
+    def n_points(self):
+        """the number of grid points"""
+        return int(numpy.prod(self.shape))
+
+    @classmethod
+    def create(cls, path, shape, arrays, metadata=None):
+        """
+        Create a new store and allocate its arrays on disk
+
+        :param str path: the path to the directory of the store
+        :param tuple shape: the shape of the grid
+        :param dict arrays: the dtypes of the arrays keyed by their names. A
+         dtype can also be a tuple (dtype, shape) where shape is the shape of
+         the per grid point values (e.g. the populations of the levels).
+        :param dict metadata: extra json serializable metadata
+        :return: GridStore
+        """
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+        n_points = int(numpy.prod(shape))
+
+        array_info = _array_info(arrays)
+        for name, info in array_info.items():
+            array = open_memmap(
+                os.path.join(path, name + '.npy'),
+                mode='w+',
+                dtype=info['dtype'],
+                shape=(n_points,) + tuple(info['point_shape'])
+            )
+            del array
+
+        _metadata = dict(metadata or {})
+        _metadata['shape'] = list(shape)
+        _metadata['arrays'] = array_info
+
+        with open(os.path.join(path, cls.METADATA_FNAME), 'w') as fobj:
+            json.dump(_metadata, fobj, indent=2, sort_keys=True)
+
+        return cls(path, mode='r+')
+
+    @classmethod
+    def exists(cls, path):
+        """
+        Check whether a store exists
+
+        :param str path: the path to the directory of the store
+        :return: bool: True if the metadata of the store is found
+        """
+        return os.path.isfile(os.path.join(path, cls.METADATA_FNAME))
+
+    @classmethod
+    def open(cls, path, mode='r'):
+        """
+        Open an existing store
+
+        :param str path: the path to the directory of the store
+        :param str mode: 'r' for read only or 'r+' for read and write
+        :return: GridStore
+        """
+        return cls(path, mode=mode)
+
+    @property
+    def names(self):
+        """the names of the arrays in the store"""
+        return sorted(self.metadata['arrays'])
+
+    def array(self, name):
+        """
+        Return a memory mapped array of the store
+
+        :param str name: the name of the array
+        :return: numpy.memmap: the array indexed by the flat grid index
+        """
+        if name not in self._arrays:
+            self._arrays[name] = open_memmap(
+                os.path.join(self.path, name + '.npy'),
+                mode=self.mode
+            )
+        return self._arrays[name]
+
+    def grid_array(self, name):
+        """
+        Return a memory mapped array of the store reshaped to the grid shape
+
+        :param str name: the name of the array
+        :return: numpy.memmap: the array of shape self.shape + point_shape
+        """
+        array = self.array(name)
+        return array.reshape(self.shape + array.shape[1:])
+
+    def read(self, name, start=None, stop=None):
+        """
+        Read the values of a range of grid points
+
+        :param str name: the name of the array
+        :param int start: the flat index of the first point
+        :param int stop: the flat index after the last point
+        :return: ndarray: a copy of the values of the points
+        """
+        return numpy.array(self.array(name)[start:stop])
+
+    def write(self, name, start, stop, values):
+        """
+        Write the values of a chunk of grid points
+
+        :param str name: the name of the array
+        :param int start: the flat index of the first point of the chunk
+        :param int stop: the flat index after the last point of the chunk
+        :param ndarray values: the values of the points of the chunk
+        """
+        self.array(name)[start:stop] = values
+
+    def flush(self):
+        """flush the written data to disk"""
+        for array in self._arrays.values():
+            array.flush()
+
+    def close(self):
+        """flush the data and release the memory maps"""
+        self.flush()
+        self._arrays = {}
+
+
+class HDF5GridStore(object):
+    """
+    A HDF5 file holding the results of a grid
+
+    The interface is the same as that of GridStore. Each array is a chunked
+    dataset whose first dimension is the flat index of the grid points. The
+    metadata is stored as a json string in the attributes of the file. h5py
+    datasets are sliced lazily, i.e. store.array(name)[start:stop] reads only
+    the requested points.
+
+    .. code-block:: python
+
+        store = HDF5GridStore.create('run.h5', shape=(100, 200, 10),
+                                     arrays={'cooling_function': 'f8'})
+        store.write('cooling_function', 0, 1000, values)
+        store.close()
+    """
+    METADATA_ATTR = 'metadata'
+
+    def __init__(self, path, mode='r'):
+        """
+        Constructor. Use HDF5GridStore.create or HDF5GridStore.open instead.
+
+        :param str path: the path to the HDF5 file
+        :param str mode: 'r' for read only or 'r+' for read and write
+        """
+        if h5py is None:
+            raise ImportError('h5py is required to use HDF5 grid stores')
+
+        self.path = path
+        """the path to the HDF5 file"""
+
+        self.mode = mode
+        """the mode in which the file is opened"""
+
+        self.fobj = h5py.File(path, mode)
+        """the h5py file object"""
+
+        self.metadata = json.loads(self.fobj.attrs[self.METADATA_ATTR])
+        """the metadata of the store"""
+
+    @property
+    def shape(self):
+        """the shape of the grid"""
+        return tuple(self.metadata['shape'])
+
+    @property
+    def n_points(self):
+        """the number of grid points"""
+        return int(numpy.prod(self.shape))
+
+    @property
+    def names(self):
+        """the names of the arrays in the store"""
+        return sorted(self.metadata['arrays'])
+
+    @classmethod
+    def create(cls, path, shape, arrays, metadata=None, chunk_size=None):
+        """
+        Create a new HDF5 store and allocate its datasets
+
+        :param str path: the path to the HDF5 file
+        :param tuple shape: the shape of the grid
+        :param dict arrays: the dtypes of the arrays (see GridStore.create)
+        :param dict metadata: extra json serializable metadata
+        :param int chunk_size: the number of grid points of the HDF5 chunks
+        :return: HDF5GridStore
+        """
+        if h5py is None:
+            raise ImportError('h5py is required to use HDF5 grid stores')
+
+        n_points = int(numpy.prod(shape))
+        chunk_size = max(min(chunk_size or 1024, n_points), 1)
+
+        array_info = _array_info(arrays)
+
+        _metadata = dict(metadata or {})
+        _metadata['shape'] = list(shape)
+        _metadata['arrays'] = array_info
+
+        with h5py.File(path, 'w') as fobj:
+            for name, info in array_info.items():
+                point_shape = tuple(info['point_shape'])
+                fobj.create_dataset(
+                    name,
+                    shape=(n_points,) + point_shape,
+                    dtype=info['dtype'],
+                    chunks=(chunk_size,) + point_shape
+                )
+            fobj.attrs[cls.METADATA_ATTR] = json.dumps(_metadata,
+                                                       sort_keys=True)
+
+        return cls(path, mode='r+')
+
+    @classmethod
+    def exists(cls, path):
+        """
+        Check whether a store exists
+
+        :param str path: the path to the HDF5 file
+        :return: bool: True if the file exists
+        """
+        return os.path.isfile(path)
+
+    @classmethod
+    def open(cls, path, mode='r'):
+        """
+        Open an existing store
+
+        :param str path: the path to the HDF5 file
+        :param str mode: 'r' for read only or 'r+' for read and write
+        :return: HDF5GridStore
+        """
+        return cls(path, mode=mode)
+
+    def array(self, name):
+        """
+        Return a dataset of the store
+
+        :param str name: the name of the array
+        :return: h5py.Dataset: the array indexed by the flat grid index
+        """
+        return self.fobj[name]
+
+    def grid_array(self, name):
+        """
+        Return a lazy view of an array of the store with the grid shape
+
+        :param str name: the name of the array
+        :return: GridArrayView: the array of shape self.shape + point_shape,
+         the values are read only when the view is indexed.
+        """
+        return GridArrayView(self.array(name), self.shape)
+
+    def read(self, name, start=None, stop=None):
+        """
+        Read the values of a range of grid points
+
+        :param str name: the name of the array
+        :param int start: the flat index of the first point
+        :param int stop: the flat index after the last point
+        :return: ndarray: the values of the points
+        """
+        return self.fobj[name][start:stop]
+
+    def write(self, name, start, stop, values):
+        """
+        Write the values of a chunk of grid points
+
+        :param str name: the name of the array
+        :param int start: the flat index of the first point of the chunk
+        :param int stop: the flat index after the last point of the chunk
+        :param ndarray values: the values of the points of the chunk
+        """
+        self.fobj[name][start:stop] = values
+
+    def flush(self):
+        """flush the written data to disk"""
+        self.fobj.flush()
+
+    def close(self):
+        """close the HDF5 file"""
+        self.fobj.close()
+
+
+def _store_class(path):
+    """
+    Select the store backend from the extension of the path
+
+    :param str path: the path to the store
+    :return: type: HDF5GridStore or GridStore
+    """
+    if os.path.splitext(path)[1].lower() in HDF5_EXTENSIONS:
+        return HDF5GridStore
+    else:
+        return GridStore
+
+
+def create_grid_store(path, shape, arrays, metadata=None):
+    """
+    Create a grid store, the backend is selected by the extension of the path
+
+    Paths ending with .h5 or .hdf5 are created as HDF5 files, otherwise a
+    directory of .npy files is created.
+
+    :param str path: the path to the store
+    :param tuple shape: the shape of the grid
+    :param dict arrays: the dtypes of the arrays (see GridStore.create)
+    :param dict metadata: extra json serializable metadata
+    :return: GridStore|HDF5GridStore
+    """
+    return _store_class(path).create(path, shape, arrays, metadata=metadata)
+
+
+def open_grid_store(path, mode='r'):
+    """
+    Open a grid store, the backend is selected by the extension of the path
+
+    :param str path: the path to the store
+    :param str mode: 'r' for read only or 'r+' for read and write
+    :return: GridStore|HDF5GridStore
+    """
+    return _store_class(path).open(path, mode=mode)
+
+
+def grid_store_exists(path):
+    """
+    Check whether a grid store exists
+
+    :param str path: the path to the store
+    :return: bool
+    """
+    return _store_class(path).exists(path)
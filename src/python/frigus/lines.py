@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+
+#    lines.py is part of Frigus.
+
+#    Frigus: software to compure the energy exchange in a multi-level system
+#    Copyright (C) 2016-2018 Mher V. Kazandjian and Carla Maria Coppola
+
+#    Frigus is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, version 3 of the License.
+#
+#    Frigus is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+
+#    You should have received a copy of the GNU General Public License
+#    along with Frigus.  If not, see <http://www.gnu.org/licenses/>.
+"""
+module that implements the computation of the line emissivities and of the
+spectra from the population densities of the levels
+"""
+import numpy
+from scipy.sparse import csc_matrix
+
+from astropy import units as u
+from astropy.constants import h as h_planck
+
+
+class LineList(object):
+    """
+    The radiative transitions (lines) of a species
+
+    Only the transitions with a non zero Einstein coefficient are kept, i.e.
+    the emissivities of the lines are computed from the populations of the
+    upper levels without forming dense n x n products. The populations can be
+    batches of population vectors (e.g. of the cells of a simulation).
+
+    .. code-block:: python
+
+        lines = LineList.from_dataset(DataLoader().load('H2_lique'))
+
+        # populations is an array of shape (n_cells, n_levels)
+        emissivities = lines.emissivity(populations)
+        spectrum = lines.spectrum(populations, frequency_bins)
+    """
+    def __init__(self, energy_levels, a_matrix):
+        """
+        Constructor
+
+        :param read_energy_levels.EnergyLevelsBase energy_levels: The energy
+         levels object that has the energies defined in levels.data['E'].
+        :param Quantity a_matrix: the matrix of the Einstein coefficients
+         (see frigus.population.cooling_rate)
+        """
+        upper, lower = numpy.nonzero(a_matrix.value)
+
+        # sort the lines by frequency
+        energies = u.Quantity(energy_levels.data['E'])
+        delta_e = numpy.fabs(energies[upper] - energies[lower])
+        inds = numpy.argsort(delta_e.value, kind='stable')
+
+        self.n_levels = a_matrix.shape[0]
+        """the number of levels of the species"""
+
+        self.upper = upper[inds]
+        """the indices of the upper levels of the lines"""
+
+        self.lower = lower[inds]
+        """the indices of the lower levels of the lines"""
+
+        self.a = a_matrix[self.upper, self.lower]
+        """the Einstein coefficients of the lines"""
+
+        self.delta_e = delta_e[inds]
+        """the energies of the emitted photons"""
+
+        self.frequency = (self.delta_e / h_planck).to(u.Hz)
+        """the frequencies of the lines (in increasing order)"""
+
+        self.power_per_particle = (self.a * self.delta_e).to(u.erg / u.s)
+        """the power emitted by the lines per particle in the upper level"""
+
+    @classmethod
+    def from_dataset(cls, data_set):
+        """
+        Construct the line list of a species
+
+        :param DataSetBase data_set: the data of the species
+        :return: LineList
+        """
+        return cls(data_set.energy_levels, data_set.a_matrix)
+
+    @property
+    def n_lines(self):
+        """the number of lines"""
+        return self.upper.size
+
+    @property
+    def wavelength(self):
+        """the wavelengths of the lines"""
+        return self.frequency.to(u.micron, equivalencies=u.spectral())
+
+    def _check_populations(self, populations):
+        """
+        Convert the populations to an array of population vectors
+
+        :param array_like populations: a population vector (e.g. the column
+         vector returned by population_density_at_steady_state) or an array
+         of population vectors of shape (..., n_levels).
+        :return: ndarray: the populations as an array of shape (n_levels,) or
+         (..., n_levels)
+        """
+        populations = numpy.asarray(populations)
+        if populations.shape == (self.n_levels, 1):
+            populations = populations[:, 0]
+
+        if populations.shape[-1] != self.n_levels:
+            raise ValueError(
+                'the last dimension of the populations should be the number '
+                'of levels {}, the shape of the populations is {}'.format(
+                    self.n_levels, populations.shape)
+            )
+        return populations
+
+    def emissivity(self, populations):
+        """
+        Compute the power emitted by each line
+
+        :param array_like populations: the fractional population densities,
+         a population vector or an array of shape (..., n_levels).
+        :return: Quantity: the power (per particle) emitted in each line in
+         erg / s as an array of shape (..., n_lines).
+        """
+        populations = self._check_populations(populations)
+
+        return (populations[..., self.upper] *
+                self.power_per_particle.value) * u.erg / u.s
+
+    def spectrum(self, populations, frequency_bins):
+        """
+        Compute the power emitted in frequency bins
+
+        The lines are assumed to be infinitely narrow, i.e. the power of each
+        line is added to the bin that contains its frequency. The lines
+        outside of the bins are ignored.
+
+        :param array_like populations: the fractional population densities,
+         a population vector or an array of shape (..., n_levels).
+        :param Quantity frequency_bins: the edges of the bins in increasing
+         order (or in any spectral unit that can be converted to frequency).
+        :return: Quantity: the power (per particle) emitted in each bin in
+         erg / s as an array of shape (..., n_bins - 1).
+        """
+        edges = frequency_bins.to(u.Hz, equivalencies=u.spectral()).value
+        if (numpy.diff(edges) <= 0.0).any():
+            raise ValueError('the frequency bins should be in increasing '
+                             'frequency order')
+
+        emissivity = self.emissivity(populations).value
+
+        # the bins of the lines, the lines outside the bins are flagged by -1
+        # or n_bins and are dropped
+        n_bins = edges.size - 1
+        line_bins = numpy.searchsorted(edges, self.frequency.value,
+                                       side='right') - 1
+        line_bins[self.frequency.value == edges[-1]] = n_bins - 1
+        in_bins = (line_bins >= 0) & (line_bins < n_bins)
+
+        binning = csc_matrix(
+            (
+                numpy.ones(in_bins.sum()),
+                (numpy.flatnonzero(in_bins), line_bins[in_bins])
+            ),
+            shape=(self.n_lines, n_bins)
+        )
+
+        spectrum = binning.T.dot(
+            emissivity.reshape(-1, self.n_lines).T).T
+
+        return spectrum.reshape(emissivity.shape[:-1] + (n_bins,)) * \
+            u.erg / u.s
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+
+#    logs.py is part of Frigus.
+
+#    Frigus: software to compure the energy exchange in a multi-level system
+#    Copyright (C) 2016-2018 Mher V. Kazandjian and Carla Maria Coppola
+
+#    Frigus is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, version 3 of the License.
+#
+#    Frigus is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+
+#    You should have received a copy of the GNU General Public License
+#    along with Frigus.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+module that implements the logging helpers of the package
+
+All the modules of frigus log through children of the "frigus" logger. No
+handler is configured by the package, i.e. the messages are handled by the
+application (e.g. through logging.basicConfig). The verbosity of the package
+can be set with set_log_level.
+"""
+import logging
+
+logging.getLogger('frigus').addHandler(logging.NullHandler())
+
+
+def get_logger(name):
+    """
+    Return the logger of a frigus module
+
+    :param str name: the name of the module (usually __name__)
+    :return: logging.Logger
+    """
+    return logging.getLogger(name)
+
+
+def set_log_level(level):
+    """
+    Set the level of the messages logged by frigus
+
+    :param int|str level: the logging level, e.g. logging.WARNING or 'ERROR'
+    """
+    logging.getLogger('frigus').setLevel(level)
+
+
+class WarningAggregator(object):
+    """
+    Rate limit repeated warnings and report them as aggregated counts
+
+    Only the first max_repeats occurrences of a certain kind of warning
+    are logged. The rest are counted and reported by log_summary, e.g.
+    "12000 points had negative population densities".
+
+    .. code-block:: python
+
+        aggregator = WarningAggregator(logger)
+        for point in points:
+            if bad(point):
+                aggregator.warn('negative population densities', 'msg %s', x)
+        aggregator.log_summary()
+    """
+    def __init__(self, logger, max_repeats=3):
+        """
+        Constructor
+
+        :param logging.Logger logger: the logger used to emit the warnings
+        :param int max_repeats: the number of occurrences of a warning that
+         are logged before the warning is only counted.
+        """
+        self.logger = logger
+        """the logger used to emit the messages"""
+
+        self.max_repeats = max_repeats
+        """the number of times a warning is logged before being suppressed"""
+
+        self.counts = {}
+        """the number of occurrences of each kind of warning"""
+
+    def warn(self, key, msg, *args):
+        """
+        Log a warning if it has not been logged more than self.max_repeats
+
+        :param str key: the kind of the warning, used in the summary
+        :param str msg: the message (formatted lazily by logging with args)
+        """
+        count = self.counts.get(key, 0) + 1
+        self.counts[key] = count
+
+        if count <= self.max_repeats:
+            self.logger.warning(msg, *args)
+        if count == self.max_repeats:
+            self.logger.warning(
+                'further warnings about %s are suppressed and will be '
+                'reported in a summary', key
+            )
+
+    def reset(self):
+        """discard all the counted warnings"""
+        self.counts = {}
+
+    def log_summary(self, reset=True):
+        """
+        Log the number of occurrences of each kind of warning
+
+        :param bool reset: if True, the counts are discarded after logging
+        :return: dict: the counts of the warnings
+        """
+        counts = self.counts
+        for key in sorted(counts):
+            self.logger.warning('%d points had %s', counts[key], key)
+
+        if reset is True:
+            self.reset()
+
+        return counts
@@ -21,20 +21,20 @@
 from __future__ import print_function
 
 import numpy
-from numpy import zeros, fabs, exp, where, in1d, pi
+from numpy import zeros, fabs, exp, where
 
 import scipy
 from scipy import interpolate
 
 
 from astropy import units as u
-from astropy.constants import c as c_light
-from astropy.constants import h as h_planck
 from astropy.constants import k_B as kb
-from astropy.modeling.blackbody import blackbody_nu as B_nu
 
-from frigus.utils import linear_2d_index, find_matching_indices, display_matrix
-from frigus.solvers.linear import solve_equilibrium
+from frigus.utils import linear_2d_index, display_matrix
+from frigus.solvers.linear import solve_equilibrium, solve_adjoint
+from frigus.solvers.analytic import (solve_equilibrium_analytic,
+                                     MAX_ANALYTIC_LEVELS)
+from frigus.solvers.diagnostics import closed_form_diagnostics
 
 
 def find_v_max_j_max_from_data(a_einstein_nnz,
@@ -173,28 +173,22 @@ def reduce_einstein_coefficients(a_mat, energy_levels):
      (energy_levels.size, energy_levels.size) with the nonzero values of A
      mapped to the indices of the levels in the array energy_levels.
     """
-    levels = energy_levels
     n_levels = len(energy_levels.data)
-    labels = energy_levels.data['label']
 
     # find the non zeros elements and their corresponding indices in A
     (v_nnz, j_nnz, vp_nnz, jp_nnz), a_nnz = where(a_mat > 0), a_mat[a_mat > 0]
 
-    # get the unique label for the (v,j) pairs
-    labels_ini = linear_2d_index(v_nnz, j_nnz, n_i=levels.v_max_allowed)
-    labels_fin = linear_2d_index(vp_nnz, jp_nnz, n_i=levels.v_max_allowed)
+    # get the indices of the initial and final levels of the transitions
+    # through the (v, j) lookup table of the levels (-1 if not a level)
+    inds_ini = energy_levels.find(v_nnz, j_nnz)
+    inds_fin = energy_levels.find(vp_nnz, jp_nnz)
 
     # keep transitions whose initial levels labels and the final label of the
     # transition are found in energy_levels
-    mask = in1d(labels_ini, labels)*in1d(labels_fin, labels)
-    labels_ini, labels_fin = labels_ini[mask], labels_fin[mask]
+    mask = (inds_ini >= 0) & (inds_fin >= 0)
+    inds_ini, inds_fin = inds_ini[mask], inds_fin[mask]
     a_nnz = a_nnz[mask]
 
-    # get the indices of the labels of the levels in the transitions (that are
-    # now all a subset of the energy_levels)
-    inds_ini = find_matching_indices(labels, labels_ini)
-    inds_fin = find_matching_indices(labels, labels_fin)
-
     # define the reduced A matrix and fill it up using inds_ini and inds_fin
     a_reduced = zeros((n_levels, n_levels), 'f8') * a_nnz.unit
 
@@ -219,17 +213,31 @@ def compute_delta_energy_matrix(levels):
     :return: square matrix of shape n x n where n is the number of energy
      levels
     """
-    n = len(levels.data)
-    energies_as_column = levels.data['E'].reshape(1, n)
+    energies = levels.data['E']
 
-    # the energy matrix with identical columns
-    E_matrix = numpy.repeat(energies_as_column, n, axis=0).T
-
-    delta_E = E_matrix - E_matrix.T
+    delta_E = energies[:, numpy.newaxis] - energies[numpy.newaxis, :]
 
     return delta_E
 
 
+def compute_boltzmann_factors(levels, t_kin):
+    """
+    Compute the matrix of the Boltzmann factors exp(-|E_i - E_j| / kb T)
+
+    The factors are computed from the cached energies in SI units of the
+    levels (see species.LevelsTable.energies_si) without unit conversions.
+
+    :param EnergyLevelsSpeciesBase levels: The energy levels object
+    :param Quantity t_kin: The kinetic temperature
+    :return: ndarray: square matrix of shape n x n
+    """
+    energies = levels.data.energies_si
+
+    delta_e = fabs(energies[:, numpy.newaxis] - energies[numpy.newaxis, :])
+
+    return exp(-delta_e / (kb.si.value * t_kin.to(u.K).value))
+
+
 def compute_degeneracy_matrix(levels):
     """
     Compute the degeneracy matrix using an energy levels object as input
@@ -241,18 +249,44 @@ def compute_degeneracy_matrix(levels):
     :param EnergyLevelsSpeciesBase levels: The energy levels object
     :return: square strictly upper triangular matrix of shape n x n.
     """
-    n = len(levels.data)
-    degeneracies_as_column = levels.data['g'].reshape(1, n)
+    degeneracies = numpy.asarray(levels.data['g'], 'f8')
 
-    G = numpy.array(numpy.repeat(degeneracies_as_column, n, axis=0).T)
+    # the R matrix (the ratios of the degeneracies g_j / g_i) in the strict
+    # upper triangular part
+    R = numpy.triu(
+        degeneracies[numpy.newaxis, :] / degeneracies[:, numpy.newaxis], 1)
 
-    # a strict upper triangular matrix
-    one_u_nn = numpy.tril(numpy.ones((n, n), 'f8'), -1).T
+    return R
 
-    # the R matrix (the ratios of the degeneracies)
-    R = (G * (1.0 / G.T)).T * one_u_nn
 
-    return R
+def photon_occupation_number(delta_e, t_rad):
+    """
+    Compute the photon occupation number of a black body 1 / (exp(x) - 1)
+
+    where x = delta_e / (kb * t_rad). This is a unit-free kernel, the
+    energies should be in J and the temperatures in K. It is evaluated as
+    exp(-x) / (1 - exp(-x)) (with expm1) that does not overflow for large x,
+    and it is exactly zero for t_rad = 0.
+
+    :param array_like delta_e: the (positive) energies of the photons in J
+    :param array_like t_rad: the radiation temperatures in K
+    :return: ndarray: the occupation numbers of shape
+     t_rad.shape + delta_e.shape
+    """
+    delta_e = numpy.asarray(delta_e, 'f8')
+    t_rad = numpy.asarray(t_rad, 'f8')
+
+    t_rad = t_rad.reshape(t_rad.shape + (1,) * delta_e.ndim)
+    retval = numpy.zeros(t_rad.shape[:t_rad.ndim - delta_e.ndim] +
+                         delta_e.shape)
+
+    hot = numpy.broadcast_to(t_rad > 0.0, retval.shape)
+    x = (delta_e / (kb.si.value * numpy.where(t_rad > 0.0, t_rad, 1.0)))
+    x = numpy.broadcast_to(x, retval.shape)[hot]
+
+    retval[hot] = numpy.exp(-x) / -numpy.expm1(-x)
+
+    return retval
 
 
 def compute_b_j_nu_matrix_from_a_matrix(energy_levels,
@@ -267,6 +301,15 @@ def compute_b_j_nu_matrix_from_a_matrix(energy_levels,
     https://en.wikipedia.org/wiki/Einstein_coefficients
     http://www.ifa.hawaii.edu/users/kud/teaching_12/3_Radiative_transfer.pdf
 
+    The product of the stimulated emission coefficient B_ij and of the energy
+    density of the black body radiation at the frequency of the transition
+    is A_ij * F_ij, where F_ij is the photon occupation number (see
+    photon_occupation_number). Hence the matrix is computed as
+
+        A * F + (A * F)^T * R
+
+    where F is evaluated only at the non-zero elements of A.
+
     .. todo:: replace the J_nu in the name of this function and in the body
     .. todo:: to something that represents energy density like u_nu
 
@@ -276,31 +319,30 @@ def compute_b_j_nu_matrix_from_a_matrix(energy_levels,
      compute_delta_energy_matrix).
     :param astropy.units.quantity.Quantity a_matrix: The spontaneous emission
      coefficients matrix (A in the ipython notebook).
-    :param Quantity t_rad: The radiation temperature.
-    :return: The B matrix defined in the notebook multiplied by J_nu
+    :param Quantity t_rad: The radiation temperature. An array of radiation
+     temperatures can be passed to compute the matrices of a sweep at once.
+    :return: The B matrix defined in the notebook multiplied by J_nu. The
+     shape of the returned array is t_rad.shape + a_matrix.shape.
     """
-    delta_e = compute_delta_energy_matrix(energy_levels)
-
-    nu_matrix = (fabs(delta_e) / h_planck).to(u.Hz)
+    a_values = numpy.asarray(a_matrix.value)
+    n_levels = a_values.shape[0]
 
-    b_e_matrix = a_matrix / (8.0 * pi * h_planck * nu_matrix**3 / c_light**3)
-    numpy.fill_diagonal(b_e_matrix, 0.0)
+    upper, lower = numpy.nonzero(a_values)
 
-    r_matrix = compute_degeneracy_matrix(energy_levels)
-
-    # B_nu is the planck function, when multiplied by 4pi/c we obtain the
-    # spectral energy density usually called u_i and that has dimensions
-    # of Energy / Length^3 / Hz
-    j_nu_matrix = (4.0*pi*u.sr/c_light)*B_nu(nu_matrix, t_rad)
-    numpy.fill_diagonal(j_nu_matrix, 0.0)
+    energies = energy_levels.data.energies_si
+    occupation = photon_occupation_number(
+        fabs(energies[upper] - energies[lower]),
+        t_rad.to(u.K).value
+    )
 
-    b_a_matrix = b_e_matrix.T * r_matrix
+    a_f = zeros(occupation.shape[:-1] + (n_levels, n_levels), 'f8')
+    a_f[..., upper, lower] = a_values[upper, lower] * occupation
 
-    b_matrix = b_e_matrix + b_a_matrix
+    r_matrix = compute_degeneracy_matrix(energy_levels)
 
-    b_j_nu_matrix = b_matrix * j_nu_matrix
+    b_j_nu_matrix = a_f + numpy.swapaxes(a_f, -1, -2) * r_matrix
 
-    return b_j_nu_matrix
+    return b_j_nu_matrix * a_matrix.unit
 
 
 def reduce_collisional_coefficients_slow(
@@ -423,14 +465,125 @@ def reduce_collisional_coefficients_slow(
     return k_dex_reduced
 
 
-def reduce_collisional_coefficients(cr, energy_levels):
-    """.. todo:: add doc
+def reduce_collisional_coefficients(
+        cr_info_nnz,
+        energy_levels,
+        set_inelastic_coefficient_to_zero=False,
+        set_excitation_coefficients_to_zero=False,
+        reduced_data_is_upper_to_lower_only=True):
+    """
+    Construct the K_matrix from the sparse nnz collisional coefficients data
+
+    This is the vectorized version of reduce_collisional_coefficients_slow
+    (see its documentation for the parameters). The indices of the levels of
+    all the transitions are resolved at once through the lookup table of the
+    levels (see EnergyLevelsMolecule.find) and the reduced matrix is filled
+    with a single assignment.
+
+    :return: The reduced matrices of the collisional coefficients. One matrix
+     for each temperature value. The shape of the matrix is
+      (n_levels, n_levels, n_temperature_values)
+    """
+    n_levels = len(energy_levels.data)
+
+    (v_nnz, j_nnz), (vp_nnz, jp_nnz), unique_nnz, cr_nnz = cr_info_nnz
+
+    # get the indices of the initial and final levels of the transitions
+    # through the (v, j) lookup table of the levels (-1 if not a level)
+    inds_ini = energy_levels.find(v_nnz, j_nnz)
+    inds_fin = energy_levels.find(vp_nnz, jp_nnz)
+
+    # keep the transitions whose initial and final levels are found in
+    # energy_levels
+    mask = (inds_ini >= 0) & (inds_fin >= 0)
+    inds_ini, inds_fin = inds_ini[mask], inds_fin[mask]
+
+    # number of temperature value for which collisional data is available
+    n_T = cr_nnz.shape[0]
+
+    k_dex_reduced = zeros((n_levels, n_levels, n_T), 'f8') * cr_nnz.unit
+
+    k_dex_reduced[inds_ini, inds_fin, :] = cr_nnz.T[mask, :]
+
+    #
+    # optionally zero out data above the diagonals
+    #
+    if set_inelastic_coefficient_to_zero:
+        i_diag, j_diag = numpy.diag_indices(n_levels)
+        k_dex_reduced[i_diag, j_diag, :] = 0.0
+    if set_excitation_coefficients_to_zero:
+        i_upper, j_upper = numpy.triu_indices(n_levels, 1)
+        k_dex_reduced[i_upper, j_upper, :] = 0.0
+
+    if reduced_data_is_upper_to_lower_only:
+        # check that the upper triangular matrices for all the temperatures
+        # including the diagonal are zero since this is the K_dex matrix
+        # (see doc)
+        assert numpy.triu(numpy.moveaxis(k_dex_reduced, -1, 0)).sum() == 0.0
+
+    return k_dex_reduced
+
+
+class KDexMatrixInterpolator(object):
+    """
+    Linear interpolator of the K de-excitation matrix in temperature
 
-    :param cr: .. todo:: add doc
-    :param energy_levels: .. todo:: add doc
-    :return: .. todo:: add doc
+    The interpolator is callable with a kinetic temperature and returns the
+    K_dex matrix at that temperature. The derivative of the interpolated
+    matrix w.r.t the temperature is provided by self.derivative.
     """
-    raise NotImplementedError("not implemented yet")
+    def __init__(self, k_dex_vs_tkin, t_range):
+        """
+        Constructor
+
+        :param ndarray k_dex_vs_tkin: The K dexcitation matrix as a function of
+         temperature (see compute_k_dex_matrix_interpolator).
+        :param ndarray t_range: The values of the temperatures corresponding to
+         the last dimension of k_dex_vs_tkin
+        """
+        # get the linear interpolator of the upper to lower collision rates as
+        # a function of temperature (the last axis). This function returns an
+        # array that is the same shape of K_dex[..., 0]
+        self.interpolator = scipy.interpolate.interp1d(t_range, k_dex_vs_tkin)
+        """the interpolator of the values of K_dex"""
+
+        self.unit = k_dex_vs_tkin.unit
+        """the unit of the K_dex matrix"""
+
+    def __call__(self, t_kin):
+        """
+        Interpolate the K_dex matrix
+
+        :param Quantity t_kin: the kinetic temperature
+        :return: Quantity: the K_dex matrix
+        """
+        return self.interpolator(t_kin) * self.unit
+
+    def derivative(self, t_kin):
+        """
+        The derivative of the K_dex matrix w.r.t the kinetic temperature
+
+        The derivative of the piecewise linear interpolation is the slope of
+        the interval that contains the temperature. At the tabulated
+        temperatures the slope of the interval on the right is used.
+
+        :param Quantity t_kin: the kinetic temperature
+        :return: Quantity: the derivative of K_dex in units of K_dex / K
+        """
+        t_values = self.interpolator.x
+        k_values = self.interpolator.y
+
+        t_kin = numpy.asarray(t_kin)
+        if t_kin < t_values[0] or t_kin > t_values[-1]:
+            raise ValueError('the temperature is out of the tabulated range')
+
+        i = numpy.clip(numpy.searchsorted(t_values, t_kin, side='right') - 1,
+                       0, t_values.size - 2)
+
+        slope = ((k_values[..., i + 1] - k_values[..., i]) /
+                 (t_values[i + 1] - t_values[i]))
+
+        return slope * self.unit / u.K
 
 
 def compute_k_dex_matrix_interpolator(k_dex_vs_tkin, t_range):
@@ -442,14 +595,29 @@ def compute_k_dex_matrix_interpolator(k_dex_vs_tkin, t_range):
     :param ndarray t_range: The values of the temperatures corresponding to the
      last dimension of k_dex_vs_tkin
     :return: callable: The interpolation function that returns a square matrix
-     of the collisional coefficient given a temperature.
+     of the collisional coefficient given a temperature
+     (KDexMatrixInterpolator).
+    """
+    return KDexMatrixInterpolator(k_dex_vs_tkin, t_range)
+
+
+def compute_k_dex_matrix_derivative(k_dex_matrix_interpolator, t_kin):
     """
-    # get the linear interpolator of the upper to lower collision rates as a
-    # function of temperature (the last axis). This function returns an array
-    # that is the same shape of K_dex[..., 0]
-    k_dex_interpolator = scipy.interpolate.interp1d(t_range, k_dex_vs_tkin)
+    Compute the derivative of the K_dex matrix w.r.t the kinetic temperature
 
-    return lambda t_kin: k_dex_interpolator(t_kin) * k_dex_vs_tkin.unit
+    If the interpolator does not provide a derivative method (e.g. a lambda
+    function) the derivative is computed by central finite differences.
+
+    :param callable k_dex_matrix_interpolator: the K_dex interpolator
+    :param Quantity t_kin: the kinetic temperature
+    :return: Quantity: the derivative of the K_dex matrix
+    """
+    if hasattr(k_dex_matrix_interpolator, 'derivative'):
+        return k_dex_matrix_interpolator.derivative(t_kin)
+    else:
+        dt = 1e-4 * t_kin
+        return (k_dex_matrix_interpolator(t_kin + dt) -
+                k_dex_matrix_interpolator(t_kin - dt)) / (2.0 * dt)
 
 
 def compute_k_matrix_from_k_dex_matrix(energy_levels,
@@ -469,19 +637,107 @@ def compute_k_matrix_from_k_dex_matrix(energy_levels,
     :param float t_kin: The kinetic temperature
     :return: ndarray: The K matrix
     """
-    delta_e_matrix = fabs(compute_delta_energy_matrix(energy_levels))
-
     r_matrix = compute_degeneracy_matrix(energy_levels)
 
     # R*K_{dex}^T(T) to be multiplied by the exp(-dE/kb*T) in the loop
     k_dex_t = k_dex_matrix_interpolator(t_kin)
-    k_ex_t = r_matrix * k_dex_t.T * exp(-delta_e_matrix / (kb * t_kin))
+    k_ex_t = r_matrix * k_dex_t.T * compute_boltzmann_factors(energy_levels,
+                                                              t_kin)
 
     k_matrix = k_dex_t + k_ex_t
 
     return k_matrix
 
 
+def compute_k_matrix_derivative(energy_levels,
+                                k_dex_matrix_interpolator,
+                                t_kin):
+    """
+    Compute the derivative of the K matrix w.r.t the kinetic temperature
+
+    The derivative of K = K_dex + R * K_dex^T * exp(-dE / kb T) (see
+    compute_k_matrix_from_k_dex_matrix).
+
+    :param EnergyLevelsSpeciesBase energy_levels: The energy levels
+    :param callable k_dex_matrix_interpolator: the K_dex interpolator
+    :param float t_kin: The kinetic temperature
+    :return: ndarray: The derivative of the K matrix
+    """
+    delta_e_matrix = fabs(compute_delta_energy_matrix(energy_levels))
+
+    r_matrix = compute_degeneracy_matrix(energy_levels)
+
+    k_dex_t = k_dex_matrix_interpolator(t_kin)
+    dk_dex_dt = compute_k_dex_matrix_derivative(k_dex_matrix_interpolator,
+                                                t_kin)
+
+    boltzmann_factors = compute_boltzmann_factors(energy_levels, t_kin)
+
+    dk_ex_dt = r_matrix * boltzmann_factors * (
+        dk_dex_dt.T + k_dex_t.T * delta_e_matrix / (kb * t_kin**2)
+    )
+
+    return dk_dex_dt + dk_ex_dt
+
+
+def compute_collisional_rate_matrix(energy_levels,
+                                    k_dex_matrix_interpolators,
+                                    t_kin,
+                                    collider_densities):
+    """
+    Compute the collisional transition rates due to several colliders
+
+    The de-excitation rates of the colliders are summed first, i.e.
+    C = sum_c n_c * K_dex_c and the excitation rates are computed from C
+    through the R matrix (see compute_k_matrix_from_k_dex_matrix). Hence the
+    Boltzmann factors exp(-dE/kb*T) are computed once for all the colliders.
+
+    :param EnergyLevelsSpeciesBase energy_levels: The energy levels
+    :param dict k_dex_matrix_interpolators: the K_dex interpolators keyed by
+     the name of the collider (see DataSetBase.k_dex_matrix_interpolators)
+    :param Quantity t_kin: The kinetic temperature
+    :param dict collider_densities: the densities of the colliders keyed by
+     the name of the collider. The colliders that are not in this dict do not
+     contribute to the rates.
+    :return: Quantity ndarray: The matrix of the collisional rates (in units
+     of K_dex * n)
+    """
+    unknown = set(collider_densities) - set(k_dex_matrix_interpolators)
+    if len(unknown) > 0:
+        raise ValueError(
+            'no collisional data for the collider(s) {}, the available '
+            'colliders are {}'.format(
+                sorted(unknown), sorted(k_dex_matrix_interpolators))
+        )
+
+    n_k_dex = sum(
+        k_dex_matrix_interpolators[collider](t_kin) * density
+        for collider, density in sorted(collider_densities.items())
+    )
+
+    r_matrix = compute_degeneracy_matrix(energy_levels)
+
+    boltzmann_factors = compute_boltzmann_factors(energy_levels, t_kin)
+
+    return n_k_dex + r_matrix * n_k_dex.T * boltzmann_factors
+
+
+def _collider_densities(data_set, collider_density):
+    """
+    Return the densities of the colliders as a dict keyed by the collider
+
+    :param DataSetBase data_set: The data of the species
+    :param Quantity|dict collider_density: the density of the collider of the
+     data set (data_set.collider) or a dict of the densities of several
+     colliders keyed by their names (e.g. {'H': n_H, 'He': n_He}).
+    :return: dict: the densities of the colliders
+    """
+    if isinstance(collider_density, dict):
+        return collider_density
+    else:
+        return {data_set.collider: collider_density}
+
+
 def compute_transition_rate_matrix(data_set,
                                    t_kin,
                                    t_rad,
@@ -496,13 +752,32 @@ def compute_transition_rate_matrix(data_set,
     :param Quantity t_kin: The kinetic temperature at which the steady state
      computation  will be done.
     :param Quantity t_rad: The radiation temperature at which the steady state
-     computation will be done.
-    :param Quantity collider_density: The density of the collider species.
-    :return: Quantity ndarray: The M matrix as a nxn ndarray
+     computation will be done. If an array of radiation temperatures is
+     passed, the M matrices of all the temperatures are computed at once (the
+     photon occupation numbers are evaluated in a single vectorized call).
+    :param Quantity|dict collider_density: The density of the collider
+     species. The densities of several colliders are passed as a dict keyed
+     by the names of the colliders (see DataSetBase.k_dex_matrix_interpolators)
+     e.g. {'H': n_H, 'He': n_He}, their rates are summed in a single M.
+    :return: Quantity ndarray: The M matrix as a nxn ndarray (or an array of
+     shape t_rad.shape + (n, n) for an array of radiation temperatures)
+    """
+    return _m_matrix(*_radiative_and_collisional_rates(
+        data_set, t_kin, t_rad, collider_density))
+
+
+def _radiative_and_collisional_rates(data_set,
+                                     t_kin,
+                                     t_rad,
+                                     collider_density):
+    """
+    Compute the matrices of the radiative and of the collisional rates
+
+    :return: tuple: the radiative rates A + B*J and the collisional rates C
+     (see compute_transition_rate_matrix) in the same units
     """
     energy_levels = data_set.energy_levels
     a_matrix = data_set.a_matrix
-    k_dex_matrix_interpolator = data_set.k_dex_matrix_interpolator
 
     # compute the stimulated emission and absorption coefficients matrix
     b_jnu_matrix = compute_b_j_nu_matrix_from_a_matrix(
@@ -511,28 +786,196 @@ def compute_transition_rate_matrix(data_set,
         t_rad
     )
 
-    # get the K matrix for a certain temperature in the tabulated range
-    k_matrix = compute_k_matrix_from_k_dex_matrix(
+    # get the collisional rates for a certain temperature in the tabulated
+    # range
+    c_matrix = compute_collisional_rate_matrix(
         energy_levels,
-        k_dex_matrix_interpolator,
-        t_kin
+        data_set.k_dex_matrix_interpolators,
+        t_kin,
+        _collider_densities(data_set, collider_density)
     )
 
+    radiative_rates = a_matrix + b_jnu_matrix
+
+    return radiative_rates, c_matrix.to(radiative_rates.unit)
+
+
+def _m_matrix(radiative_rates, collisional_rates):
+    """
+    Compute the M matrix from the matrices of the radiative and of the
+    collisional rates (see compute_transition_rate_matrix)
+    """
     # compute the M matrix that can be used to compute the equilibrium state of
     # the levels (see notebook)
-    o_matrix = (a_matrix + b_jnu_matrix + k_matrix * collider_density).T
+    o_matrix = numpy.swapaxes(radiative_rates + collisional_rates, -1, -2)
 
-    d_matrix = -numpy.eye(o_matrix.shape[0]) * o_matrix.sum(axis=0)
+    d_matrix = -numpy.eye(o_matrix.shape[-1]) * \
+        o_matrix.sum(axis=-2)[..., numpy.newaxis, :]
 
     m_matrix = o_matrix + d_matrix
 
     return m_matrix
 
 
+def critical_densities(data_set, t_kin, t_rad=0.0 * u.K, collider=None):
+    """
+    Compute the critical densities of the levels
+
+    The critical density of a level is the density of the collider at which
+    the rate of the collisional depopulation of the level (de-excitation and
+    excitation) is equal to the rate of its radiative depopulation
+    (spontaneous and stimulated emission and absorption), i.e.
+    n_crit_i = sum_j (A + B*J)_ij / sum_j K_ij. The populations approach
+    the Boltzmann distribution for densities well above the critical
+    densities of all the levels (LTE) and the cooling rate is linear in the
+    density well below them.
+
+    :param DataSetBase data_set: The data of the species
+    :param Quantity t_kin: The kinetic temperature
+    :param Quantity t_rad: The radiation temperature
+    :param str collider: The name of the collider, by default
+     data_set.collider.
+    :return: Quantity: the critical densities of the levels in m^-3. The
+     levels that do not depopulate radiatively have a critical density of 0
+     and the ones that are not depopulated by collisions have an infinite
+     critical density.
+    """
+    if collider is None:
+        collider = data_set.collider
+
+    radiative_rates, collisional_rates = _radiative_and_collisional_rates(
+        data_set, t_kin, t_rad, {collider: 1.0 * u.m**-3})
+
+    radiative = radiative_rates.value.sum(axis=1)
+    collisional = collisional_rates.value.sum(axis=1)
+
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        retval = where(radiative > 0.0, radiative / collisional, 0.0)
+
+    return retval * u.m**-3
+
+
+def population_density_lte(energy_levels, t_kin):
+    """
+    Compute the population densities in local thermodynamic equilibrium
+
+    :param EnergyLevelsSpeciesBase energy_levels: The energy levels
+    :param Quantity t_kin: The kinetic temperature
+    :return: ndarray: the fractional population densities of the Boltzmann
+     distribution as a column vector
+    """
+    boltzmann = numpy.asarray(energy_levels.data['g'], 'f8') * exp(
+        -energy_levels.excitation_energies() /
+        (kb.si.value * t_kin.to(u.K).value))
+
+    return (boltzmann / boltzmann.sum()).reshape(-1, 1)
+
+
+def population_density_low_density(radiative_rates, collisional_rates):
+    """
+    Compute the population densities in the low density limit
+
+    To first order in the density of the collider, the levels are excited
+    by collisions from the ground level only and they decay radiatively,
+    i.e. x_i sum_j A_ij - sum_k A_ki x_k = n_c K_0i for i > 0. Since A is
+    lower triangular the populations are computed by back substitution
+    (a cascade from the highest level) without solving a full linear
+    system. The cooling rate is then linear in the density.
+
+    The limit applies without a radiation field and when all the levels
+    other than the ground level decay radiatively.
+
+    :param Quantity radiative_rates: The spontaneous emission rates (A)
+    :param Quantity collisional_rates: The collisional rates (C) in the
+     units of the radiative rates
+    :return: ndarray: the fractional population densities as a column
+     vector
+    """
+    a_matrix = radiative_rates.value
+    c_matrix = collisional_rates.value
+
+    upper = numpy.transpose(-a_matrix[1:, 1:])
+    upper[numpy.diag_indices_from(upper)] = a_matrix[1:].sum(axis=1)
+
+    x = numpy.ones(a_matrix.shape[0], 'f8')
+    x[1:] = scipy.linalg.solve_triangular(upper, c_matrix[0, 1:],
+                                          lower=False)
+
+    return (x / x.sum()).reshape(-1, 1)
+
+
+STEADY_STATE_LIMIT_TOLERANCE = 1e-6
+"""the maximum ratio of the radiative to the collisional depopulation rates
+of the levels (LTE) or of the collisional to the radiative ones (low density
+limit) for which the closed form limits are used by the method 'auto' of
+population_density_at_steady_state. It is the order of magnitude of the
+relative errors of the populations in these limits."""
+
+
+def _steady_state_limit(radiative_rates, collisional_rates, t_rad):
+    """
+    Determine whether a point is deep in the LTE or the low density limit
+
+    :param Quantity radiative_rates: The radiative rates A + B*J
+    :param Quantity collisional_rates: The collisional rates in the units of
+     the radiative rates
+    :param Quantity t_rad: The radiation temperature
+    :return: str|None: 'lte', 'low_density' or None
+    """
+    radiative = radiative_rates.value.sum(axis=1)
+    collisional = collisional_rates.value.sum(axis=1)
+
+    decays = radiative > 0.0
+    if (collisional[decays] * STEADY_STATE_LIMIT_TOLERANCE >=
+            radiative[decays]).all():
+        return 'lte'
+
+    a_matrix = radiative_rates.value
+    if (t_rad.value == 0.0 and decays[1:].all() and
+            not numpy.triu(a_matrix).any() and
+            (collisional[1:] <= STEADY_STATE_LIMIT_TOLERANCE *
+             radiative[1:]).all()):
+        return 'low_density'
+
+    return None
+
+
+def _check_steady_state_method(data_set, method, t_rad=None):
+    """
+    Check the method used to compute the steady state of a data set
+
+    :param DataSetBase data_set: The data of the species
+    :param str method: 'linear', 'analytic' or 'auto'
+    :param Quantity t_rad: The radiation temperature(s). An array of radiation
+     temperatures is supported only by the closed forms.
+    """
+    n_levels = data_set.a_matrix.shape[0]
+
+    if method not in ['linear', 'analytic', 'auto']:
+        raise ValueError("the method should be 'linear', 'analytic' or "
+                         "'auto', got {}".format(method))
+
+    if method == 'analytic' and n_levels > MAX_ANALYTIC_LEVELS:
+        raise ValueError(
+            'the analytic solution is available for data sets with up '
+            'to {} levels, the data set has {} levels'.format(
+                MAX_ANALYTIC_LEVELS, n_levels))
+
+    if numpy.ndim(t_rad) > 0 and (method == 'linear' or
+                                  n_levels > MAX_ANALYTIC_LEVELS):
+        raise ValueError(
+            "arrays of radiation temperatures are supported only by the "
+            "closed forms, i.e. method 'analytic' or 'auto' for data sets "
+            "with up to {} levels (method '{}', {} levels)".format(
+                MAX_ANALYTIC_LEVELS, method, n_levels))
+
+
 def population_density_at_steady_state(data_set,
                                        t_kin=None,
                                        t_rad=None,
-                                       collider_density=None):
+                                       collider_density=None,
+                                       return_diagnostics=False,
+                                       method='linear'):
     """
     Compute the population density at steady state by solving the linear system
 
@@ -547,25 +990,165 @@ def population_density_at_steady_state(data_set,
     :param Quantity t_rad: The radiation temperature at which the steady state
      computation will be done.
     :param Quantity collider_density: The density of the collider species.
+    :param bool return_diagnostics: If True, return the diagnostics of the
+     solution too (see frigus.solvers.linear.solve_equilibrium).
+    :param str method: The method used to solve the steady state system,
+     'linear' (frigus.solvers.linear.solve_equilibrium), 'analytic' (the
+     closed forms of frigus.solvers.analytic for up to three levels) or
+     'auto'. The method 'auto' uses the LTE populations
+     (population_density_lte) or the low density limit
+     (population_density_low_density) for the points deep in these limits
+     (see critical_densities and STEADY_STATE_LIMIT_TOLERANCE), the
+     closed forms when the data set has few enough levels and the linear
+     solver otherwise. The backend of the diagnostics is the path that was
+     taken ('lte', 'low_density', 'analytic' or 'lapack'). The closed forms
+     solve the M matrices of an array of radiation temperatures at once, an
+     array of radiation temperatures with the linear solver is a ValueError.
     :return: ndarray: The equilibrium population density as a column vector
+     (or an array of shape t_rad.shape + (n,) for an array of radiation
+     temperatures solved in closed form). If return_diagnostics is True, a
+     tuple of the population density and the SolverDiagnostics object is
+     returned.
     """
+    _check_steady_state_method(data_set, method, t_rad)
 
-    m_matrix = compute_transition_rate_matrix(
+    radiative_rates, collisional_rates = _radiative_and_collisional_rates(
         data_set,
         t_kin,
         t_rad,
         collider_density
     )
 
-    x_equilibrium = solve_equilibrium(m_matrix.si.value)
+    limit = None
+    if method == 'auto' and numpy.ndim(t_rad) == 0:
+        limit = _steady_state_limit(radiative_rates, collisional_rates,
+                                    t_rad)
+
+    if limit == 'lte':
+        x = population_density_lte(data_set.energy_levels, t_kin)
+    elif limit == 'low_density':
+        x = population_density_low_density(radiative_rates,
+                                           collisional_rates)
+
+    if limit is not None and return_diagnostics is False:
+        return x
+
+    m_matrix = _m_matrix(radiative_rates, collisional_rates)
+
+    if limit is not None:
+        return x, closed_form_diagnostics(m_matrix.si.value, x, limit)
+
+    if method != 'linear' and \
+            data_set.a_matrix.shape[0] <= MAX_ANALYTIC_LEVELS:
+        return solve_equilibrium_analytic(
+            m_matrix.si.value,
+            return_diagnostics=return_diagnostics
+        )
+    else:
+        return solve_equilibrium(
+            m_matrix.si.value,
+            return_diagnostics=return_diagnostics
+        )
+
+
+def cooling_rate_derivatives_at_steady_state(data_set,
+                                             t_kin,
+                                             t_rad,
+                                             collider_density):
+    """
+    Compute the cooling rate and its derivatives at steady state
+
+    The derivatives w.r.t the kinetic temperature and the collider density are
+    computed with the adjoint method, i.e. by a back-substitution using the
+    LU factors of the steady state system (see
+    frigus.solvers.linear.solve_adjoint) instead of extra steady state
+    solutions.
 
-    # assert bool((x_equilibrium < 0.0).any()) is False
-    # assert numpy.fabs(1.0 - numpy.fabs(x_equilibrium.sum())) <= 1e-3
+    :param DatasetBase data_set: The species dataset
+    :param astropy.units.quantity.Quantity t_kin: the kinetic temperature
+    :param astropy.units.quantity.Quantity t_rad: the radiation temperature
+    :param astropy.units.quantity.Quantity|dict collider_density: The density
+     of the collider species or a dict of the densities of several colliders
+     (see compute_transition_rate_matrix).
+    :return: tuple: the cooling rate, its derivative w.r.t the kinetic
+     temperature and its derivative w.r.t the collider density (as SI
+     quantities). If the densities of several colliders are passed, the
+     derivatives w.r.t the density of each collider are returned as a dict
+     keyed by the names of the colliders.
+    """
+    m_matrix = compute_transition_rate_matrix(
+        data_set,
+        t_kin,
+        t_rad,
+        collider_density
+    )
 
-    return x_equilibrium
+    x_equilibrium, factors = solve_equilibrium(
+        m_matrix.si.value,
+        return_factors=True
+    )
+    x_equilibrium = x_equilibrium[:, 0]
+
+    emitted_power = getattr(data_set, 'emitted_power', None)
+    if emitted_power is None:
+        emitted_power = compute_emitted_power(data_set.energy_levels,
+                                              data_set.a_matrix)
+    emitted_power = emitted_power.si
+
+    rate = numpy.dot(x_equilibrium, emitted_power.value)
+
+    # the adjoint populations
+    y = solve_adjoint(factors, emitted_power.value)
+
+    def sensitivity(dk_matrix):
+        """
+        d(rate)/dp = -y^T.(dM/dp).x given dK/dp (where dM/dp is the
+        derivative of the M matrix w/o the conservation equation row)
+        """
+        dm_x = numpy.dot(dk_matrix.T, x_equilibrium) - \
+            dk_matrix.sum(axis=1) * x_equilibrium
+        dm_x[0] = 0.0
+        return -numpy.dot(y, dm_x)
+
+    collider_densities = _collider_densities(data_set, collider_density)
+    k_dex_matrix_interpolators = data_set.k_dex_matrix_interpolators
+
+    dk_dt_matrix = 0.0
+    dk_dn_matrices = {}
+    for collider, density in collider_densities.items():
+        dk_dn_matrices[collider] = compute_k_matrix_from_k_dex_matrix(
+            data_set.energy_levels,
+            k_dex_matrix_interpolators[collider],
+            t_kin
+        ).si.value
+
+        dk_dt_matrix = dk_dt_matrix + density.si.value * \
+            compute_k_matrix_derivative(
+                data_set.energy_levels,
+                k_dex_matrix_interpolators[collider],
+                t_kin
+            ).si.value
+
+    drate_dn = {
+        collider: sensitivity(dk_dn_matrix) * emitted_power.unit * u.m**3
+        for collider, dk_dn_matrix in dk_dn_matrices.items()
+    }
+    if not isinstance(collider_density, dict):
+        drate_dn = drate_dn[data_set.collider]
+
+    return (
+        rate * emitted_power.unit,
+        sensitivity(dk_dt_matrix) * emitted_power.unit / u.K,
+        drate_dn
+    )
 
 
-def cooling_rate_at_steady_state(data_set, t_kin, t_rad, collider_density):
+def cooling_rate_at_steady_state(data_set,
+                                 t_kin,
+                                 t_rad,
+                                 collider_density,
+                                 return_diagnostics=False,
+                                 method='linear'):
     """
     Compute the cooling rate at steady state
 
@@ -580,31 +1163,77 @@ def cooling_rate_at_steady_state(data_set, t_kin, t_rad, collider_density):
     :param astropy.units.quantity.Quantity t_rad: the radiation temperature
     :param astropy.units.quantity.Quantity collider_density: The density of the
      collider species
-    :return: the cooling rate
+    :param bool return_diagnostics: If True, return the diagnostics of the
+     steady state solution too.
+    :param str method: The method used to solve the steady state system (see
+     population_density_at_steady_state).
+    :return: the cooling rate. If return_diagnostics is True, a tuple of the
+     cooling rate and the SolverDiagnostics object is returned.
     """
 
     x_equilibrium = population_density_at_steady_state(
         data_set,
         t_kin,
         t_rad,
-        collider_density
+        collider_density,
+        return_diagnostics=return_diagnostics,
+        method=method
     )
 
+    if return_diagnostics is True:
+        x_equilibrium, diagnostics = x_equilibrium
+
     # compute the cooling rate (per particle)
-    return cooling_rate(
+    retval = cooling_rate(
         x_equilibrium,
         data_set.energy_levels,
-        data_set.a_matrix
+        data_set.a_matrix,
+        emitted_power=getattr(data_set, 'emitted_power', None)
     )
 
+    if return_diagnostics is True:
+        return retval, diagnostics
+    else:
+        return retval
+
 
-def cooling_rate(population_densities, energy_levels, a_matrix):
+def compute_emitted_power(energy_levels, a_matrix):
+    """
+    Compute the power emitted by the spontaneous transitions of each level
+
+    The element i of the returned vector is sum_j A[i, j] * |E_i - E_j|, i.e.
+    the power emitted per particle in the level i. The cooling rate is the
+    dot product of this vector with the population densities.
+
+    :param read_energy_levels.EnergyLevelsBase energy_levels: The energy levels
+     object or a subclass of it that has the energies defined in the attribute
+     record levels.data['E'].
+    :param array_like a_matrix: The matrix of the spontaneous transition rates
+     (see cooling_rate).
+    :return: astropy.units.quantity.Quantity: A vector of length n in units of
+     A_matrix.unit * energy_levels['E'].units.
+    """
+    energy_levels_unit = energy_levels.data['E'].unit
+    a_matrix_unit = a_matrix.unit
+
+    delta_e_matrix = fabs(compute_delta_energy_matrix(energy_levels)).value
+
+    retval = (a_matrix.value * delta_e_matrix).sum(axis=1)
+
+    return retval * energy_levels_unit * a_matrix_unit
+
+
+def cooling_rate(population_densities,
+                 energy_levels,
+                 a_matrix,
+                 emitted_power=None):
     """
     Compute the cooling rate due to the spontaneous transitions.
 
     :param array_like population_densities: A column vector of the population
      densities. This is a dimensionless vector of shape nx1, where n is the 
-     number of energy levels.
+     number of energy levels. A batch of population vectors can be passed as
+     an array of shape (..., n).
     :param read_energy_levels.EnergyLevelsBase energy_levels: The energy levels
      object or a subclass of it that has the energies defined in the attribute
      record levels.data['E'].
@@ -615,8 +1244,39 @@ def cooling_rate(population_densities, energy_levels, a_matrix):
      per unit time from the level "upper" to the level "lower". A_matrix is
      assumed to be a strictly lower triangular matrix (this is not checked,
      thus it is the responsibility of the called to assure that).
+    :param astropy.units.quantity.Quantity emitted_power: The precomputed
+     power emitted per particle in each level (see compute_emitted_power and
+     DataSetBase.emitted_power). If not specified it is computed from
+     energy_levels and a_matrix.
     :return: scalar astropy.units.quantity.Quantity: The cooling rate due to
      all the transitions in units of A_matrix.unit * energy_levels['E'].units. 
+     For a batch of population vectors an array of shape (...) is returned.
+    """
+    if emitted_power is None:
+        emitted_power = compute_emitted_power(energy_levels, a_matrix)
+
+    population_densities = numpy.asarray(population_densities)
+    n = emitted_power.size
+    if population_densities.shape == (n, 1):
+        population_densities = population_densities[:, 0]
+
+    retval = numpy.dot(population_densities, emitted_power.value)
+
+    return retval * emitted_power.unit
+
+
+def cooling_rate_per_transition(population_densities,
+                                energy_levels,
+                                a_matrix):
+    """
+    Compute the contribution of each transition to the cooling rate
+
+    See cooling_rate for the documentation of the parameters.
+
+    :return: astropy.units.quantity.Quantity: A matrix of the same shape as
+     a_matrix whose element [upper, lower] is the power emitted (per particle)
+     by the spontaneous transitions from "upper" to "lower" in units of
+     A_matrix.unit * energy_levels['E'].units.
     """
     energy_levels_unit = energy_levels.data['E'].unit
     a_matrix_unit = a_matrix.unit
@@ -624,6 +1284,6 @@ def cooling_rate(population_densities, energy_levels, a_matrix):
     delta_e_matrix = fabs(compute_delta_energy_matrix(energy_levels)).value
     a_matrix = a_matrix.value
 
-    retval = (a_matrix * delta_e_matrix * population_densities).sum()
+    retval = a_matrix * delta_e_matrix * population_densities
 
     return retval * energy_levels_unit * a_matrix_unit
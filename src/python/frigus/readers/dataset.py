@@ -25,22 +25,27 @@ that implement the specific readers and parsers for e.g. einstien coefficient,
 energy levels and collision reaction rates.
 """
 import os
+import hashlib
 import numpy
 from astropy import units as u
 
 from frigus import utils, population
+from frigus.logs import get_logger
 
 from frigus.readers import read_energy_levels, read_einstein_coefficient
 
 from frigus.readers.read_collision_coefficients import (
     read_collision_coefficients_lique_and_wrathmall,
     read_collision_coefficients_lipovka,
-    read_collision_coefficients_esposito_h2_he
+    read_collision_coefficients_esposito_h2_he,
+    read_collision_coefficients_roueff_hd_he
 )
 
 
 DATADIR = utils.datadir_path()
 
+logger = get_logger(__name__)
+
 
 class DataSetRawBase(object):
     """
@@ -69,6 +74,12 @@ class DataSetRawBase(object):
         self.collision_rates_info_nnz = None
         """The non zero info of the collision rates"""
 
+        self.additional_collision_rates = {}
+        """The raw collisional data of the colliders other than the main one
+        keyed by the name of the collider. The values are tuples of the
+        (collision_rates, collision_rates_t_range, collision_rates_info_nnz)
+        of each collider"""
+
     def read_energy_levels(self):
         """Energy levels reader of the raw data"""
         raise NotImplementedError('to be implemented by subclass')
@@ -88,6 +99,10 @@ class DataSetBase(object):
     This data set is the one that would be used to do actual computations of
     e.g. time evolution on equilibrium solutions...etc..
     """
+    collider = 'H'
+    """the name of the collider whose rates are self.k_dex_matrix_interpolator
+    (e.g. 'H', 'He', 'H2', 'e')"""
+
     def __init__(self):
         """
         Constructor
@@ -102,9 +117,48 @@ class DataSetBase(object):
         """An interpolation function that takes T_kin as an argument and
         returns an array of the same shape as self.A_matrix"""
 
+        self.additional_k_dex_matrix_interpolators = {}
+        """The K_dex interpolators of the colliders other than self.collider
+        keyed by the name of the collider"""
+
         self.raw_data = DataSetRawBase()
         """the raw data from which the 2D matrices are computed"""
 
+        self._emitted_power = None
+
+    @property
+    def emitted_power(self):
+        """
+        The power emitted per particle in each level, sum_j A_ij * dE_ij
+
+        The vector is computed from self.energy_levels and self.a_matrix once
+        and cached, i.e. the cooling rate is computed as a dot product with
+        the population densities (see population.cooling_rate). Sub-classes
+        whose emitted power is not derived from self.a_matrix can set it.
+        """
+        if self._emitted_power is None:
+            self._emitted_power = population.compute_emitted_power(
+                self.energy_levels, self.a_matrix)
+        return self._emitted_power
+
+    @emitted_power.setter
+    def emitted_power(self, value):
+        """setter for the emitted power vector"""
+        self._emitted_power = value
+
+    @property
+    def k_dex_matrix_interpolators(self):
+        """
+        The K_dex interpolators of all the colliders keyed by their names
+
+        The collisional rates of the colliders are combined in a single M
+        matrix by passing the densities of the colliders as a dict to
+        population.compute_transition_rate_matrix.
+        """
+        retval = {self.collider: self.k_dex_matrix_interpolator}
+        retval.update(self.additional_k_dex_matrix_interpolators)
+        return retval
+
     def read_raw_data(self):
         """
         Populate the self.raw_data object
@@ -117,182 +171,152 @@ class DataSetBase(object):
         raise NotImplementedError("this method should be implemented by "
                                   "the subclass")
 
+    def fingerprint(self):
+        """
+        Compute a hash of the data used in the computations
 
-class DataSetH2Lique(DataSetBase):
-    """
-    Data of H2 colliding with H using collisional data by F. Lique.
-
-      - energy levels of H2 (vibrational and rotational)
-      - collisional coefficients of H2 with H (K_ij)
-      - radiative coefficients (A_ij, B_ij, B_ji)
+        The hash is computed from the energies and the degeneracies of the
+        levels, the Einstein coefficients and the de-excitation rate
+        coefficients at the temperatures over which the collisional data are
+        provided. It is used to check that a stored computation (e.g. a
+        checkpointed grid) was done with the same data.
 
-    Limitations
-
-      - The smallest data set of (A, B, K) determines the number of states to
-       be inserted in the model.
-    """
-    def __init__(self):
+        :return: str: the hex digest of the hash
         """
-        Constructor
-        """
-        super(DataSetH2Lique, self).__init__()
-        self.read_raw_data()
-        self.reduce_raw_data()
+        digest = hashlib.sha1()
+        digest.update(self.__class__.__name__.encode('utf-8'))
 
-    def read_raw_data(self):
-        """Read the raw H2 data"""
-        #
-        # read the energy levels (v, j, energy). Keep levels up to 55 only
-        # since these levels would be the ones among which both collisional and
-        # radiative data are available
-        energy_levels = read_energy_levels.read_levels_stancil(
-            os.path.join(DATADIR, 'H2Xvjlevels.cs'),
-            upto=55
-        )
+        arrays = [
+            u.Quantity(self.energy_levels.data['E']).si.value,
+            numpy.asarray(self.energy_levels.data['g'], 'f8'),
+            self.a_matrix.si.value,
+        ]
 
-        self.raw_data.energy_levels = energy_levels
+        t_kin_values = u.Quantity(self.raw_data.collision_rates_t_range)
+        for t_kin in numpy.atleast_1d(t_kin_values):
+            arrays.append(self.k_dex_matrix_interpolator(t_kin).si.value)
 
-        #
-        # read the einstein coefficients for the H2 transitions
-        #
-        a, a_info_nnz = read_einstein_coefficient.read_einstein_simbotin()
-        self.raw_data.a = a
-        self.raw_data.a_info_nnz = a_info_nnz
+        for collider in sorted(self.additional_k_dex_matrix_interpolators):
+            digest.update(collider.encode('utf-8'))
+            interpolator = self.additional_k_dex_matrix_interpolators[collider]
+            t_kin_values = u.Quantity(
+                self.raw_data.additional_collision_rates[collider][1])
+            for t_kin in numpy.atleast_1d(t_kin_values):
+                arrays.append(interpolator(t_kin).si.value)
 
-        #
-        # read the collisional rates for H2 with H
-        #
-        collision_rates, t_rng, collision_rates_info_nnz = \
-            read_collision_coefficients_lique_and_wrathmall(
-                os.path.join(DATADIR, "Rates_H_H2.dat")
-            )
-        self.raw_data.collision_rates = collision_rates
-        self.raw_data.collision_rates_t_range = t_rng
-        self.raw_data.collision_rates_info_nnz = collision_rates_info_nnz
+        for array in arrays:
+            digest.update(numpy.ascontiguousarray(array, 'f8').tobytes())
 
-    def reduce_raw_data(self):
-        """
-        Use the raw data in self.raw_data to populate the A and K_dex matrices
-        """
-        self.energy_levels = self.raw_data.energy_levels
+        return digest.hexdigest()
 
-        # find the maximum v and j from the Einstein and collisional rates
-        # datasets and adjust the labels of the energy levels accordingly
-        v_max_data, j_max_data = population.find_v_max_j_max_from_data(
-            self.raw_data.a_info_nnz,
-            self.raw_data.collision_rates_info_nnz,
-            self.energy_levels
-        )
 
-        self.energy_levels.set_labels(v_max=v_max_data + 1)
+class DataSetSpec(DataSetBase):
+    """
+    A data set declared by the sources of its data
+
+    The data of most species are read and reduced in the same way, only the
+    files and the readers differ. A sub-class declares them as class
+    attributes and the generic pipeline of this class reads the raw data and
+    reduces it to the A and K_dex matrices (using the vectorized reduce
+    functions of frigus.population).
+
+    .. code-block:: python
+
+        @register_dataset('H2_my_rates')
+        class DataSetH2MyRates(DataSetSpec):
+            \"\"\"H2 colliding with H using my rates\"\"\"
+            levels_file = 'H2Xvjlevels.cs'
+            levels_reader = staticmethod(
+                read_energy_levels.read_levels_stancil)
+            levels_reader_kwargs = {'upto': 55}
+            einstein_reader = staticmethod(
+                read_einstein_coefficient.read_einstein_simbotin)
+            collisions_file = os.path.join('my_rates', 'rates.dat')
+            collisions_reader = staticmethod(
+                read_collision_coefficients_lique_and_wrathmall)
+
+    The readers are wrapped with staticmethod since they are plain functions
+    assigned as class attributes.
+    """
+    levels_file = None
+    """the path of the energy levels file relative to DATADIR"""
 
-        # reduce the Einstein coefficients to a 2D matrix (construct the A
-        # matrix) [n_levels, n_levels]
-        # A_reduced_slow = population.reduce_einstein_coefficients_slow(
-        #                                 self.raw_data.A_info_nnz,
-        #                                 self.energy_levels)
-        a_matrix = population.reduce_einstein_coefficients(
-                          self.raw_data.a,
-                          self.energy_levels
-        )
+    levels_reader = None
+    """the function that reads the energy levels file"""
 
-        # check that the upper triangular elements are zero. If not, issue a
-        # warning and set them to zero. This check has been introduced because
-        # for H2 the data by Simbotin has non-zero values in the uppter tri
-        # part that are identified with the - sign in the paper
-        if (a_matrix[numpy.triu_indices(a_matrix.shape[0])] != 0.0).any():
-            print('warning: non-zero elements found in the reduced upper ')
-            print('warning: triangular part of the A matrix, set them to zero.')
-            a_matrix[numpy.triu_indices(a_matrix.shape[0])] = 0.0
+    levels_reader_kwargs = {}
+    """extra keyword arguments of levels_reader, e.g. the truncation of the
+    levels {'upto': 55}"""
 
-        self.a_matrix = a_matrix
+    einstein_reader = None
+    """the function that returns the Einstein coefficients (a, a_info_nnz)"""
 
-        # DEBUG
-        # utils.display_matrix(a_matrix.value, None)
+    collisions_file = None
+    """the path of the collisional coefficients file relative to DATADIR"""
 
-        # get the collisional de-excitation matrix (K_dex) (for all
-        # tabulated values)  [n_level, n_level, n_T_kin_values]
-        k_dex_matrix = population.reduce_collisional_coefficients_slow(
-            self.raw_data.collision_rates_info_nnz,
-            self.energy_levels,
-            reduced_data_is_upper_to_lower_only=True
-        )
+    collisions_reader = None
+    """the function that reads the collisional coefficients file"""
 
-        # compute the interpolator that produces K_dex at a certain temperature
-        k_dex_matrix_interpolator = population.compute_k_dex_matrix_interpolator(
-            k_dex_matrix, self.raw_data.collision_rates_t_range)
-        self.k_dex_matrix_interpolator = k_dex_matrix_interpolator
-        # DEBUG
-        # utils.display_matrix(k_dex_matrix[:, :, 0].value, None)
-        # a = a_matrix.value
-        # b = k_dex_matrix[:, :, 0].value
-        # check overlap of available data
-        # c = numpy.zeros_like(a)
-        # c[a > 0.0] = 1
-        # c[b > 0.0] = 2
-        # c[(a > 0.0)*(b > 0.0)] = 3
-        # utils.display_matrix(c, None, log=False)
-
-class DataSetH2Wrathmall(DataSetBase):
-    """
-    Data of H2 colliding with H using collisional data by Wrathmall and Flower
+    collisions_reduce_kwargs = {'reduced_data_is_upper_to_lower_only': True}
+    """the keyword arguments of population.reduce_collisional_coefficients"""
 
-      - energy levels of H2 (vibrational and rotational)
-      - collisional coefficients of H2 with H (K_ij)
-      - radiative coefficients (A_ij, B_ij, B_ji)
+    zero_upper_triangular_a = False
+    """if True, the non-zero elements of the upper triangular part of the
+    reduced A matrix are set to zero"""
 
-    Limitations
+    additional_colliders = {}
+    """the collisional data of the colliders other than self.collider keyed
+    by the name of the collider. The values are tuples of the
+    (collisions_file, collisions_reader, collisions_reduce_kwargs) of each
+    collider"""
 
-      - The smallest data set of (A, B, K) determines the number of states to
-       be inserted in the model.
-    """
     def __init__(self):
         """
         Constructor
         """
-        super(DataSetH2Wrathmall, self).__init__()
+        super(DataSetSpec, self).__init__()
         self.read_raw_data()
         self.reduce_raw_data()
 
     def read_raw_data(self):
-        """Read the raw H2 data"""
+        """Read the raw data from the declared sources"""
 
         #
         # read the energy levels (v, j, energy)
         #
-        energy_levels = read_energy_levels.read_levels_wrathmall_and_flower(
-            os.path.join(DATADIR, 'H2Xvjlevels_flower.cs')
+        self.raw_data.energy_levels = self.levels_reader(
+            os.path.join(DATADIR, self.levels_file),
+            **self.levels_reader_kwargs
         )
 
-        self.raw_data.energy_levels = energy_levels
-
         #
-        # read the einstein coefficients for the H2 transitions
+        # read the einstein coefficients
         #
-        A, a_info_nnz = read_einstein_coefficient.read_einstein_simbotin()
-        self.raw_data.a = A
+        a, a_info_nnz = self.einstein_reader()
+        self.raw_data.a = a
         self.raw_data.a_info_nnz = a_info_nnz
 
         #
-        # read the collisional rates for H2 with H
+        # read the collisional rates
         #
         collision_rates, t_rng, collision_rates_info_nnz = \
-            read_collision_coefficients_lique_and_wrathmall(
-                os.path.join(
-                    DATADIR,
-                    'wrathmall', 'Rates_H_H2_flower_frigus_downwards.dat'
-                )
+            self.collisions_reader(
+                os.path.join(DATADIR, self.collisions_file)
             )
 
         self.raw_data.collision_rates = collision_rates
         self.raw_data.collision_rates_t_range = t_rng
         self.raw_data.collision_rates_info_nnz = collision_rates_info_nnz
 
+        for collider, (fname, reader, _) in self.additional_colliders.items():
+            self.raw_data.additional_collision_rates[collider] = reader(
+                os.path.join(DATADIR, fname)
+            )
+
     def reduce_raw_data(self):
         """
         Use the raw data in self.raw_data to populate the A and K_dex matrices
         """
-
         self.energy_levels = self.raw_data.energy_levels
 
         # find the maximum v and j from the Einstein and collisional rates data
@@ -308,33 +332,59 @@ class DataSetH2Wrathmall(DataSetBase):
         #
         # reduce the Einstein coefficients to a 2D matrix (construct the A
         # matrix) [n_levels, n_levels]
-        # A_reduced_slow = population.reduce_einstein_coefficients_slow(
-        #                                 self.raw_data.A_info_nnz,
-        #                                 self.energy_levels)
         a_matrix = population.reduce_einstein_coefficients(
-                          self.raw_data.a,
-                          self.energy_levels)
+            self.raw_data.a,
+            self.energy_levels
+        )
+
+        if self.zero_upper_triangular_a:
+            # check that the upper triangular elements are zero. If not, issue
+            # a warning and set them to zero. This check has been introduced
+            # because for H2 the data by Simbotin has non-zero values in the
+            # upper tri part that are identified with the - sign in the paper
+            upper = numpy.triu_indices(a_matrix.shape[0])
+            if (a_matrix[upper] != 0.0).any():
+                logger.warning(
+                    'non-zero elements found in the reduced upper triangular '
+                    'part of the A matrix, set them to zero.'
+                )
+                a_matrix[upper] = 0.0
+
         self.a_matrix = a_matrix
 
-        # getting the collisional de-excitation matrix (K_dex) (for all
+        # get the collisional de-excitation matrix (K_dex) (for all
         # tabulated values)  [n_level, n_level, n_T_kin_values]
-        k_dex_matrix = population.reduce_collisional_coefficients_slow(
+        k_dex_matrix = population.reduce_collisional_coefficients(
             self.raw_data.collision_rates_info_nnz,
             self.energy_levels,
-            reduced_data_is_upper_to_lower_only=True
+            **self.collisions_reduce_kwargs
         )
 
         # compute the interpolator that produces K_dex at a certain temperature
-        k_dex_matrix_interpolator = population.compute_k_dex_matrix_interpolator(
-            k_dex_matrix, self.raw_data.collision_rates_t_range)
-        self.k_dex_matrix_interpolator = k_dex_matrix_interpolator
+        self.k_dex_matrix_interpolator = \
+            population.compute_k_dex_matrix_interpolator(
+                k_dex_matrix, self.raw_data.collision_rates_t_range)
+
+        # the same for the other colliders
+        for collider, (_, _, reduce_kwargs) in \
+                self.additional_colliders.items():
+            _, t_rng, collision_rates_info_nnz = \
+                self.raw_data.additional_collision_rates[collider]
+
+            k_dex_matrix = population.reduce_collisional_coefficients(
+                collision_rates_info_nnz,
+                self.energy_levels,
+                **reduce_kwargs
+            )
+
+            self.additional_k_dex_matrix_interpolators[collider] = \
+                population.compute_k_dex_matrix_interpolator(
+                    k_dex_matrix, t_rng)
 
 
-class DataSetH2Glover(DataSetBase):
+class DataSetH2Lique(DataSetSpec):
     """
-    Data of H2 colliding with H using collisional data by Wrathmall and Flower,
-    including only the low energy levels of H2 (to compare with the fit by
-    Glover)
+    Data of H2 colliding with H using collisional data by F. Lique.
 
       - energy levels of H2 (vibrational and rotational)
       - collisional coefficients of H2 with H (K_ij)
@@ -345,86 +395,74 @@ class DataSetH2Glover(DataSetBase):
       - The smallest data set of (A, B, K) determines the number of states to
        be inserted in the model.
     """
-    def __init__(self):
-        """
-        Constructor
-        """
-        super(DataSetH2Glover, self).__init__()
-        self.read_raw_data()
-        self.reduce_raw_data()
+    # Keep levels up to 55 only since these levels would be the ones among
+    # which both collisional and radiative data are available
+    levels_file = 'H2Xvjlevels.cs'
+    levels_reader = staticmethod(read_energy_levels.read_levels_stancil)
+    levels_reader_kwargs = {'upto': 55}
 
-    def read_raw_data(self):
-        """Read the raw H2 data"""
+    einstein_reader = staticmethod(
+        read_einstein_coefficient.read_einstein_simbotin)
 
-        #
-        # read the energy levels (v, j, energy)
-        #
-        energy_levels = read_energy_levels.read_levels_wrathmall_and_flower(
-            os.path.join(DATADIR, 'H2Xvjlevels_low_energies.dat')
-        )
+    collisions_file = 'Rates_H_H2.dat'
+    collisions_reader = staticmethod(
+        read_collision_coefficients_lique_and_wrathmall)
 
-        self.raw_data.energy_levels = energy_levels
+    zero_upper_triangular_a = True
 
-        #
-        # read the einstein coefficients for the H2 transitions
-        #
-        a, a_info_nnz = read_einstein_coefficient.read_einstein_simbotin()
-        self.raw_data.a = a
-        self.raw_data.a_info_nnz = a_info_nnz
 
-        #
-        # read the collisional rates for H2 with H
-        #
-        collision_rates, t_rng, collision_rates_info_nnz = \
-            read_collision_coefficients_lique_and_wrathmall(
-                os.path.join(
-                    DATADIR,
-                    "wrathmall",
-                    "Rates_H_H2_flower_low_energy_frigus_downwards.dat"
-                )
-            )
+class DataSetH2Wrathmall(DataSetSpec):
+    """
+    Data of H2 colliding with H using collisional data by Wrathmall and Flower
 
-        self.raw_data.collision_rates = collision_rates
-        self.raw_data.collision_rates_t_range = t_rng
-        self.raw_data.collision_rates_info_nnz = collision_rates_info_nnz
+      - energy levels of H2 (vibrational and rotational)
+      - collisional coefficients of H2 with H (K_ij)
+      - radiative coefficients (A_ij, B_ij, B_ji)
 
-    def reduce_raw_data(self):
-        """
-        Use the raw data in self.raw_data to populate the A and K_dex matrices
-        """
+    Limitations
 
-        # find the maximum v and j from the Einstein and collisional rates data
-        # sets and adjust the labels of the energy levels according to that
-        v_max_data, j_max_data = population.find_v_max_j_max_from_data(
-            self.raw_data.a_info_nnz,
-            self.raw_data.collision_rates_info_nnz)
+      - The smallest data set of (A, B, K) determines the number of states to
+       be inserted in the model.
+    """
+    levels_file = 'H2Xvjlevels_flower.cs'
+    levels_reader = staticmethod(
+        read_energy_levels.read_levels_wrathmall_and_flower)
 
-        self.energy_levels = self.raw_data.energy_levels
-        self.energy_levels.set_labels(v_max=v_max_data + 1)
+    einstein_reader = staticmethod(
+        read_einstein_coefficient.read_einstein_simbotin)
 
-        #
-        # reduce the Einstein coefficients to a 2D matrix (construct the A
-        # matrix) [n_levels, n_levels]
-        # A_reduced_slow = population.reduce_einstein_coefficients_slow(
-        #                                 self.raw_data.A_info_nnz,
-        #                                 self.energy_levels)
-        a_matrix = population.reduce_einstein_coefficients(
-                          self.raw_data.a,
-                          self.energy_levels)
-        self.a_matrix = a_matrix
+    collisions_file = os.path.join(
+        'wrathmall', 'Rates_H_H2_flower_frigus_downwards.dat')
+    collisions_reader = staticmethod(
+        read_collision_coefficients_lique_and_wrathmall)
 
-        # getting the collisional de-excitation matrix (K_dex) (for all
-        # tabulated values)  [n_level, n_level, n_T_kin_values]
-        k_dex_matrix = population.reduce_collisional_coefficients_slow(
-            self.raw_data.collision_rates_info_nnz,
-            self.energy_levels,
-            reduced_data_is_upper_to_lower_only=True
-        )
 
-        # compute the interpolator that produces K_dex at a certain temperature
-        k_dex_matrix_interpolator = population.compute_k_dex_matrix_interpolator(
-            k_dex_matrix, self.raw_data.collision_rates_t_range)
-        self.k_dex_matrix_interpolator = k_dex_matrix_interpolator
+class DataSetH2Glover(DataSetSpec):
+    """
+    Data of H2 colliding with H using collisional data by Wrathmall and Flower,
+    including only the low energy levels of H2 (to compare with the fit by
+    Glover)
+
+      - energy levels of H2 (vibrational and rotational)
+      - collisional coefficients of H2 with H (K_ij)
+      - radiative coefficients (A_ij, B_ij, B_ji)
+
+    Limitations
+
+      - The smallest data set of (A, B, K) determines the number of states to
+       be inserted in the model.
+    """
+    levels_file = 'H2Xvjlevels_low_energies.dat'
+    levels_reader = staticmethod(
+        read_energy_levels.read_levels_wrathmall_and_flower)
+
+    einstein_reader = staticmethod(
+        read_einstein_coefficient.read_einstein_simbotin)
+
+    collisions_file = os.path.join(
+        'wrathmall', 'Rates_H_H2_flower_low_energy_frigus_downwards.dat')
+    collisions_reader = staticmethod(
+        read_collision_coefficients_lique_and_wrathmall)
 
 
 class DataSetTwoLevel_1(DataSetBase):
@@ -535,7 +573,7 @@ class DataSetThreeLevel_1(DataSetBase):
         self.raw_data.collision_rates_t_range = t_rng
 
 
-class DataSetHDLipovka(DataSetBase):
+class DataSetHDLipovka(DataSetSpec):
     """
     Data of H2 colliding with H using collisional data use by Lipovka.
 
@@ -548,91 +586,40 @@ class DataSetHDLipovka(DataSetBase):
       - The smallest data set of (A, B, K) determines the number of states to
        be inserted in the model.
     """
-    def __init__(self):
-        """
-        Constructor
-        """
-        super(DataSetHDLipovka, self).__init__()
-        self.read_raw_data()
-        self.reduce_raw_data()
-
-    def read_raw_data(self):
-        """Read the raw HD data"""
+    levels_file = os.path.join('lipovka', 'flower_roueff_data.dat')
+    levels_reader = staticmethod(read_energy_levels.read_levels_lipovka)
 
-        #
-        # read the energy levels (v, j, energy)
-        #
-        energy_levels = read_energy_levels.read_levels_lipovka(
-            os.path.join(DATADIR, 'lipovka', 'flower_roueff_data.dat')
-        )
+    einstein_reader = staticmethod(
+        read_einstein_coefficient.read_einstein_coppola)
 
-        self.raw_data.energy_levels = energy_levels
+    collisions_file = os.path.join('lipovka', 'flower_roueff_data.dat')
+    collisions_reader = staticmethod(read_collision_coefficients_lipovka)
+    collisions_reduce_kwargs = {
+        'set_inelastic_coefficient_to_zero': True,
+        'set_excitation_coefficients_to_zero': True,
+        'reduced_data_is_upper_to_lower_only': False
+    }
 
-        #
-        # read the einstein coefficients for the HD transitions
-        #
-        a, a_info_nnz = read_einstein_coefficient.read_einstein_coppola()
-        self.raw_data.a = a
-        self.raw_data.a_info_nnz = a_info_nnz
 
-        #
-        # read the collisional rates for HD with H
-        #
-        collision_rates, t_rng, collision_rates_info_nnz = \
-            read_collision_coefficients_lipovka(
-                os.path.join(
-                    DATADIR, 'lipovka', 'flower_roueff_data.dat'
-                )
-            )
-
-        self.raw_data.collision_rates = collision_rates
-        self.raw_data.collision_rates_t_range = t_rng
-        self.raw_data.collision_rates_info_nnz = collision_rates_info_nnz
-
-    def reduce_raw_data(self):
-        """
-        Use the raw data in self.raw_data to populate the A and K_dex matrices
-        """
-
-        self.energy_levels = self.raw_data.energy_levels
-
-        # find the maximum v and j from the Einstein and collisional rates data
-        # sets and adjust the labels of the energy levels according to that
-        v_max_data, j_max_data = population.find_v_max_j_max_from_data(
-            self.raw_data.a_info_nnz,
-            self.raw_data.collision_rates_info_nnz,
-            self.energy_levels
-        )
+class DataSetHDLipovkaHe(DataSetHDLipovka):
+    """
+    Data of HD colliding with H and He.
 
-        self.energy_levels.set_labels(v_max=v_max_data + 1)
-        #
-        # reduce the Einstein coefficients to a 2D matrix (construct the A
-        # matrix) [n_levels, n_levels]
-        # A_reduced_slow = population.reduce_einstein_coefficients_slow(
-        #                                 self.raw_data.A_info_nnz,
-        #                                 self.energy_levels)
-        a_matrix = population.reduce_einstein_coefficients(
-                          self.raw_data.a,
-                          self.energy_levels)
-        self.a_matrix = a_matrix
+      - the data of DataSetHDLipovka for the collisions with H
+      - collisional coefficients of HD with He by Roueff and Zeippen (K_ij)
 
-        # getting the collisional de-excitation matrix (K_dex) (for all
-        # tabulated values)  [n_level, n_level, n_T_kin_values]
-        k_dex_matrix = population.reduce_collisional_coefficients_slow(
-            self.raw_data.collision_rates_info_nnz,
-            self.energy_levels,
-            set_inelastic_coefficient_to_zero=True,
-            set_excitation_coefficients_to_zero=True,
-            reduced_data_is_upper_to_lower_only=False,
+    The collisional rates with He are provided between 80 K and 2000 K.
+    """
+    additional_colliders = {
+        'He': (
+            os.path.join('lipovka', 'roueff_hd_he.dat'),
+            read_collision_coefficients_roueff_hd_he,
+            DataSetHDLipovka.collisions_reduce_kwargs
         )
-
-        # compute the interpolator that produces K_dex at a certain temperature
-        k_dex_matrix_interpolator = population.compute_k_dex_matrix_interpolator(
-            k_dex_matrix, self.raw_data.collision_rates_t_range)
-        self.k_dex_matrix_interpolator = k_dex_matrix_interpolator
+    }
 
 
-class DataSetHDGalileoProject(DataSetBase):
+class DataSetHDGalileoProject(DataSetSpec):
     """
     Data of HD colliding with H using collisional data use by Lipovka.
 
@@ -645,199 +632,156 @@ class DataSetHDGalileoProject(DataSetBase):
       - The smallest data set of (A, B, K) determines the number of states to
        be inserted in the model.
     """
-    def __init__(self):
-        """
-        Constructor
-        """
-        super(DataSetHDGalileoProject, self).__init__()
-        self.read_raw_data()
-        self.reduce_raw_data()
+    levels_file = os.path.join('lipovka', 'flower_roueff_data.dat')
+    levels_reader = staticmethod(read_energy_levels.read_levels_lipovka)
 
-    def read_raw_data(self):
-        """Read the raw HD data"""
+    einstein_reader = staticmethod(
+        read_einstein_coefficient.read_einstein_coppola)
 
-        #
-        # read the energy levels (v, j, energy)
-        #
-        energy_levels = read_energy_levels.read_levels_lipovka(
-            os.path.join(DATADIR, 'lipovka', 'flower_roueff_data.dat')
-        )
+    collisions_file = os.path.join(
+        'lipovka', 'rates_hd_h_abc_galileo_project.out')
+    collisions_reader = staticmethod(
+        read_collision_coefficients_lique_and_wrathmall)
+    collisions_reduce_kwargs = {
+        'set_inelastic_coefficient_to_zero': True,
+        'set_excitation_coefficients_to_zero': True,
+        'reduced_data_is_upper_to_lower_only': False
+    }
 
-        self.raw_data.energy_levels = energy_levels
 
-        #
-        # read the einstein coefficients for the HD transitions
-        #
-        a, a_info_nnz = read_einstein_coefficient.read_einstein_coppola()
-        self.raw_data.a = a
-        self.raw_data.a_info_nnz = a_info_nnz
-
-        #
-        # read the collisional rates for HD with H
-        #
-        collision_rates, t_rng, collision_rates_info_nnz = \
-            read_collision_coefficients_lique_and_wrathmall(
-                os.path.join(
-                    DATADIR, 'lipovka', 'rates_hd_h_abc_galileo_project.out'
-                )
-            )
+class DataSetHeH2(DataSetSpec):
+    """
+    Data of H2 colliding with He using collisional data use by Esposito.
 
-        self.raw_data.collision_rates = collision_rates
-        self.raw_data.collision_rates_t_range = t_rng
-        self.raw_data.collision_rates_info_nnz = collision_rates_info_nnz
+      - energy levels of H2 by Stancil
+      - collisional coefficients of H2 with He (K_ij)
+      - radiative coefficients (A_ij, B_ij, B_ji) by Wolniewicz, Simbotin and
+        Dalgarno.
+    """
+    levels_file = 'H2Xvjlevels.cs'
+    levels_reader = staticmethod(read_energy_levels.read_levels_stancil)
 
-    def reduce_raw_data(self):
-        """
-        Use the raw data in self.raw_data to populate the A and K_dex matrices
-        """
+    einstein_reader = staticmethod(
+        read_einstein_coefficient.read_einstein_simbotin)
 
-        # find the maximum v and j from the Einstein and collisional rates data
-        # sets and adjust the labels of the energy levels according to that
-        v_max_data, j_max_data = population.find_v_max_j_max_from_data(
-            self.raw_data.a_info_nnz,
-            self.raw_data.collision_rates_info_nnz)
+    collider = 'He'
 
-        self.energy_levels = self.raw_data.energy_levels
-        self.energy_levels.set_labels(v_max=v_max_data + 1)
+    collisions_file = 'HeH2_tvjwk.res'
+    collisions_reader = staticmethod(
+        read_collision_coefficients_esposito_h2_he)
+    collisions_reduce_kwargs = {
+        'set_inelastic_coefficient_to_zero': True,
+        'set_excitation_coefficients_to_zero': True,
+        'reduced_data_is_upper_to_lower_only': False
+    }
 
-        #
-        # reduce the Einstein coefficients to a 2D matrix (construct the A
-        # matrix) [n_levels, n_levels]
-        # A_reduced_slow = population.reduce_einstein_coefficients_slow(
-        #                                 self.raw_data.A_info_nnz,
-        #                                 self.energy_levels)
-        a_matrix = population.reduce_einstein_coefficients(
-                          self.raw_data.a,
-                          self.energy_levels)
-        self.a_matrix = a_matrix
 
-        # getting the collisional de-excitation matrix (K_dex) (for all
-        # tabulated values)  [n_level, n_level, n_T_kin_values]
-        k_dex_matrix = population.reduce_collisional_coefficients_slow(
-            self.raw_data.collision_rates_info_nnz,
-            self.energy_levels,
-            set_inelastic_coefficient_to_zero=True,
-            set_excitation_coefficients_to_zero=True,
-            reduced_data_is_upper_to_lower_only=False,
-        )
+DATASETS_ENTRY_POINT_GROUP = 'frigus.datasets'
+"""the entry point group through which other packages can register data sets
+(the entry points should refer to DataSetBase sub-classes or factories)"""
 
-        # compute the interpolator that produces K_dex at a certain temperature
-        k_dex_matrix_interpolator = population.compute_k_dex_matrix_interpolator(
-            k_dex_matrix, self.raw_data.collision_rates_t_range)
-        self.k_dex_matrix_interpolator = k_dex_matrix_interpolator
+_registry = {}
+_entry_points_loaded = False
 
 
-class DataSetHeH2(DataSetBase):
+def register_dataset(name, factory=None):
     """
-    Data of H2 colliding with He using collisional data use by Esposito.
+    Register a data set under a name so that it can be loaded by DataLoader
 
-      - energy levels of H2 by Stancil
-      - collisional coefficients of H2 with He (K_ij)
-      - radiative coefficients (A_ij, B_ij, B_ji) by Wolniewicz, Simbotin and
-        Dalgarno.
-    """
-    def __init__(self):
-        """
-        Constructor
-        """
-        super(DataSetHeH2, self).__init__()
-        self.read_raw_data()
-        self.reduce_raw_data()
+    Can be used as a class decorator:
 
-    def read_raw_data(self):
-        """Read the raw H2 data"""
+    .. code-block:: python
 
-        #
-        # read the energy levels (v, j, energy)
-        #
-        energy_levels = read_energy_levels.read_levels_stancil(
-            os.path.join(DATADIR, 'H2Xvjlevels.cs')
-        )
+        @register_dataset('H2_my_rates')
+        class DataSetH2MyRates(DataSetSpec):
+            ...
 
-        self.raw_data.energy_levels = energy_levels
+    :param str name: the name of the data set
+    :param callable factory: a callable that returns the data set (usually
+     the DataSetBase sub-class). If not specified, a decorator is returned.
+    :return: the factory (or the decorator)
+    """
+    if factory is None:
+        return lambda _factory: register_dataset(name, _factory)
 
-        #
-        # read the einstein coefficients for the H2 transitions
-        #
-        a, a_info_nnz = read_einstein_coefficient.read_einstein_simbotin()
-        self.raw_data.a = a
-        self.raw_data.a_info_nnz = a_info_nnz
+    _registry[name] = factory
+    return factory
 
-        #
-        # read the collisional rates for H2 with He
-        #
-        collision_rates, t_rng, collision_rates_info_nnz = \
-            read_collision_coefficients_esposito_h2_he(
-                os.path.join(
-                    DATADIR, 'HeH2_tvjwk.res'
-                )
-            )
 
-        self.raw_data.collision_rates = collision_rates
-        self.raw_data.collision_rates_t_range = t_rng
-        self.raw_data.collision_rates_info_nnz = collision_rates_info_nnz
+def _iter_entry_points(group):
+    """
+    Return the installed entry points of a group
 
-    def reduce_raw_data(self):
-        """
-        Use the raw data in self.raw_data to populate the A and K_dex matrices
-        """
+    :param str group: the entry point group
+    :return: list: the entry points
+    """
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:
+        import pkg_resources
+        return list(pkg_resources.iter_entry_points(group))
 
-        # find the maximum v and j from the Einstein and collisional rates data
-        # sets and adjust the labels of the energy levels according to that
-        v_max_data, j_max_data = population.find_v_max_j_max_from_data(
-            self.raw_data.a_info_nnz,
-            self.raw_data.collision_rates_info_nnz
-        )
+    eps = entry_points()
+    if hasattr(eps, 'select'):
+        return list(eps.select(group=group))
+    else:
+        return list(eps.get(group, []))
 
-        self.energy_levels = self.raw_data.energy_levels
-        self.energy_levels.set_labels(v_max=v_max_data + 1)
 
-        #
-        # reduce the Einstein coefficients to a 2D matrix (construct the A
-        # matrix) [n_levels, n_levels]
-        # A_reduced_slow = population.reduce_einstein_coefficients_slow(
-        #                                 self.raw_data.A_info_nnz,
-        #                                 self.energy_levels)
-        a_matrix = population.reduce_einstein_coefficients(
-            self.raw_data.a,
-            self.energy_levels
-        )
-        self.a_matrix = a_matrix
+def _load_entry_points():
+    """
+    Register the data sets of the plugins declared in the entry points group
+    DATASETS_ENTRY_POINT_GROUP (only once)
+    """
+    global _entry_points_loaded
+    if _entry_points_loaded:
+        return
+    _entry_points_loaded = True
+
+    for entry_point in _iter_entry_points(DATASETS_ENTRY_POINT_GROUP):
+        try:
+            factory = entry_point.load()
+        except Exception as exc:
+            logger.warning('failed to load the data set plugin %s: %s',
+                           entry_point.name, exc)
+            continue
+        _registry.setdefault(entry_point.name, factory)
+
+
+def available_datasets():
+    """
+    Return the registered data sets (including the ones of the plugins)
 
-        # getting the collisional de-excitation matrix (K_dex) (for all
-        # tabulated values)  [n_level, n_level, n_T_kin_values]
-        k_dex_matrix = population.reduce_collisional_coefficients_slow(
-            self.raw_data.collision_rates_info_nnz,
-            self.energy_levels,
-            set_inelastic_coefficient_to_zero=True,
-            set_excitation_coefficients_to_zero=True,
-            reduced_data_is_upper_to_lower_only=False,
-        )
+    :return: dict: the factories of the data sets keyed by name
+    """
+    _load_entry_points()
+    return dict(_registry)
 
-        # compute the interpolator that produces K_dex at a certain temperature
-        k_dex_matrix_interpolator = population.compute_k_dex_matrix_interpolator(
-            k_dex_matrix, self.raw_data.collision_rates_t_range)
-        self.k_dex_matrix_interpolator = k_dex_matrix_interpolator
+
+register_dataset('H2_lique', DataSetH2Lique)
+register_dataset('HD_lipovka', DataSetHDLipovka)
+register_dataset('HD_lipovka_He', DataSetHDLipovkaHe)
+register_dataset('H2_wrathmall', DataSetH2Wrathmall)
+register_dataset('H2_low_energy_levels', DataSetH2Glover)
+register_dataset('two_level_1', DataSetTwoLevel_1)
+register_dataset('three_level_1', DataSetThreeLevel_1)
+register_dataset('HD_galileo_project', DataSetHDGalileoProject)
+register_dataset('HeH2', DataSetHeH2)
 
 
 class DataLoader(object):
     """
     Load various data sets.
+
+    The available data sets are the ones registered with register_dataset
+    and the ones provided by plugins through the "frigus.datasets" entry
+    points.
     """
     def __init__(self):
         """
         Constructor
         """
-        self.availabe_datasets = {
-            'H2_lique': DataSetH2Lique,
-            'HD_lipovka': DataSetHDLipovka,
-            'H2_wrathmall': DataSetH2Wrathmall,
-            'H2_low_energy_levels': DataSetH2Glover,
-            'two_level_1': DataSetTwoLevel_1,
-            'three_level_1': DataSetThreeLevel_1,
-            'HD_galileo_project': DataSetHDGalileoProject,
-            'HeH2': DataSetHeH2
-        }
+        self.availabe_datasets = available_datasets()
 
     def load(self, name):
         """
@@ -846,10 +790,9 @@ class DataLoader(object):
         :param str name: The name of the data set to be loaded
         :return: DatasetBase
         """
-        retval = self.availabe_datasets.get(name)()
-        if retval is None:
+        factory = self.availabe_datasets.get(name)
+        if factory is None:
             msg = 'not data loader defined for {}'.format(name)
             raise ValueError(msg)
         else:
-            return retval
-
+            return factory()
@@ -587,3 +587,73 @@ def read_collision_coefficients_esposito_h2_he(fname):
     cr_with_units = cr_with_units.to(u.m**3 / u.second)
 
     return data_with_units, t_values, (ini, fin, unique_levels, cr_with_units)
+
+
+def read_collision_coefficients_roueff_hd_he(fname):
+    """
+    Parse the HD-He collisional data by Roueff and Zeippen (1999).
+
+    These are the excitation and de-excitation coefficient rates between the
+    rotational levels of HD in the ground vibrational state (v = 0). The data
+    are stored in blocks for each temperature (80 K to 2000 K). The columns
+    of a block are the initial rotational levels ji and the rows are the final
+    ones jf, e.g.
+
+       temperature cinetique=    80.000 degres kelvin
+
+       jf / ji  0.0       1.0       2.0  ...
+       0.0    0.000D+00 1.306D-11 1.393D-12  ...
+       1.0    7.875D-12 0.000D+00 1.354D-11  ...
+
+    http://massey.dur.ac.uk/drf/HD_He/
+
+    :param string fname: The path to the ascii data.
+    :return: a tuple of 3 elements in the same format returned by
+     read_collision_coefficients_lipovka, i.e. the 5D array of the rate
+     coefficients K[T_index, v, j, v', j'] (in m3/s), the temperatures and the
+     tuple (ini, fin, unique_levels, cr) of the transitions.
+    """
+    t_values, blocks = [], []
+    j_values = None
+
+    with open(fname) as fobj:
+        for line in fobj:
+            if 'temperature cinetique' in line:
+                t_values.append(float(line.split('=')[1].split()[0]))
+                blocks.append([])
+            elif line.strip().startswith('jf / ji'):
+                j_values = numpy.int32(
+                    numpy.float64(line.split('ji')[1].split()))
+            elif len(blocks) > 0 and len(line.strip()) > 0:
+                blocks[-1].append(
+                    numpy.float64(line.replace('D', 'E').split()[1:])
+                )
+
+    t_values = numpy.array(t_values)
+    n_j = j_values.size
+
+    # the rows of the blocks are the final levels and the columns are the
+    # initial ones, i.e. block[jf, ji]
+    cr_vs_t = numpy.array(blocks).reshape(t_values.size, n_j, n_j)
+
+    v = numpy.zeros(n_j, 'i4')
+    ini = numpy.repeat(numpy.vstack((v, j_values)), n_j, axis=1)
+    fin = numpy.tile([v, j_values], n_j)
+
+    j_ini, j_fin = ini[1], fin[1]
+    cr = cr_vs_t[:, j_fin, j_ini]
+
+    nj_max = j_values.max() + 1
+    data = zeros((t_values.size, 1, nj_max, 1, nj_max), 'f8')
+    data[:, 0, j_ini, 0, j_fin] = cr
+
+    # find the unique levels from from the transitions
+    unique_levels = unique_level_pairs(hstack((unique_level_pairs(ini),
+                                               unique_level_pairs(fin))))
+
+    # set the units of the data to be returned and convert them to m^3/s
+    data_with_units = (data * (u.cm**3 / u.second)).to(u.m**3 / u.second)
+    cr_with_units = (cr * (u.cm**3 / u.second)).to(u.m**3 / u.second)
+    t_values = t_values * u.K
+
+    return data_with_units, t_values, (ini, fin, unique_levels, cr_with_units)
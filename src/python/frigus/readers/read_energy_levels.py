@@ -29,7 +29,6 @@ from astropy import constants
 from astropy.constants import c, h
 
 from frigus.species import EnergyLevelsMolecule, EnergyLevelsOnDegreeOfFreedom
-from frigus.utils import linear_2d_index
 
 
 def read_levels_stancil(fname, upto=None):
@@ -92,7 +91,7 @@ def read_levels_stancil(fname, upto=None):
     energy_levels.data['j'] = j
     energy_levels.data['g'] = 2*j + 1
     energy_levels.data['E'] = (conversion_factor * energies)
-    energy_levels.data['label'] = linear_2d_index(v, j)
+    energy_levels.set_labels()
 
     return energy_levels
 
@@ -135,7 +134,7 @@ def read_levels_lique(fname):
     energy_levels.data['j'] = j
     energy_levels.data['g'] = 2*j + 1
     energy_levels.data['E'] = energies * u.eV
-    energy_levels.data['label'] = linear_2d_index(v, j)
+    energy_levels.set_labels()
 
     return energy_levels
 
@@ -178,7 +177,7 @@ def read_levels_lique_abc(fname):
     energy_levels.data['j'] = j
     energy_levels.data['g'] = 2*j + 1
     energy_levels.data['E'] = energies * u.eV
-    energy_levels.data['label'] = linear_2d_index(v, j)
+    energy_levels.set_labels()
 
     return energy_levels
 
@@ -224,7 +223,7 @@ def read_levels_wrathmall_and_flower(fname):
         u.eV,
         equivalencies=u.temperature_energy()
     )
-    energy_levels.data['label'] = linear_2d_index(v, j)
+    energy_levels.set_labels()
 
     return energy_levels
 
@@ -263,7 +262,7 @@ def read_levels_lipovka(fname):
     energy_levels.data['j'] = j
     energy_levels.data['g'] = 2*j + 1
     energy_levels.data['E'] = (energies * u.K * constants.k_B).to(u.eV)
-    energy_levels.data['label'] = linear_2d_index(v, j)
+    energy_levels.set_labels()
 
     return energy_levels
 
@@ -292,6 +291,6 @@ def read_levels_two_levels_test_1(fname):
     energy_levels.data['j'] = j
     energy_levels.data['g'] = g
     energy_levels.data['E'] = energies*u.eV
-    energy_levels.data['label'] = j
+    energy_levels.set_labels()
 
     return energy_levels
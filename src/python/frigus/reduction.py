@@ -0,0 +1,548 @@
+# -*- coding: utf-8 -*-
+
+#    reduction.py is part of Frigus.
+
+#    Frigus: software to compure the energy exchange in a multi-level system
+#    Copyright (C) 2016-2018 Mher V. Kazandjian and Carla Maria Coppola
+
+#    Frigus is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, version 3 of the License.
+#
+#    Frigus is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+
+#    You should have received a copy of the GNU General Public License
+#    along with Frigus.  If not, see <http://www.gnu.org/licenses/>.
+"""
+module that implements the reduction of the number of levels of a species,
+i.e. data sets with fewer levels whose steady state solutions (that scale
+as n^3) are cheaper and whose cooling functions match the ones of the full
+data set within a tolerance. The levels are either truncated (the highly
+excited levels are dropped) or lumped into thermalized superlevels.
+"""
+import numpy
+
+from astropy import units as u
+from astropy.constants import k_B as kb
+
+from frigus.population import (cooling_rate_at_steady_state,
+                               compute_k_dex_matrix_derivative,
+                               compute_k_matrix_from_k_dex_matrix,
+                               compute_k_matrix_derivative)
+from frigus.readers.dataset import DataSetBase
+from frigus.species import EnergyLevelsSpeciesBase, LevelsTable
+from frigus.logs import get_logger
+
+logger = get_logger(__name__)
+
+
+class SubsetKDexMatrixInterpolator(object):
+    """
+    The K_dex interpolator of a subset of the levels of a data set
+    """
+    def __init__(self, interpolator, indices):
+        """
+        Constructor
+
+        :param callable interpolator: the K_dex interpolator of the full set
+         of levels.
+        :param array_like indices: the indices of the kept levels
+        """
+        self.interpolator = interpolator
+        """the K_dex interpolator of the full set of levels"""
+
+        self.indices = numpy.ix_(indices, indices)
+        """the indices of the elements of the kept levels in K_dex"""
+
+    def __call__(self, t_kin):
+        """
+        :param Quantity t_kin: the kinetic temperature
+        :return: Quantity: the K_dex matrix of the kept levels
+        """
+        return self.interpolator(t_kin)[self.indices]
+
+    def derivative(self, t_kin):
+        """
+        :param Quantity t_kin: the kinetic temperature
+        :return: Quantity: the derivative of the K_dex matrix of the kept
+         levels (see population.compute_k_dex_matrix_derivative)
+        """
+        return compute_k_dex_matrix_derivative(
+            self.interpolator, t_kin)[self.indices]
+
+
+class TruncatedDataSet(DataSetBase):
+    """
+    A data set that keeps only the lowest levels of another data set
+
+    The levels of the data sets are sorted in increasing excitation energy
+    (i.e. the A matrix is lower triangular), so the first n levels are kept.
+    The A matrix and the K_dex matrices (of all the colliders) are the
+    sub-matrices of the kept levels. Hence all the radiative transitions from
+    the kept levels are retained.
+
+    .. code-block:: python
+
+        full = DataLoader().load('H2_lique')
+        reduced = TruncatedDataSet(full, 20)
+    """
+    def __init__(self, data_set, n_levels):
+        """
+        Constructor
+
+        :param DataSetBase data_set: the full data set
+        :param int n_levels: the number of the levels to be kept
+        """
+        super(TruncatedDataSet, self).__init__()
+
+        n_levels_full = data_set.a_matrix.shape[0]
+        if not 1 <= n_levels <= n_levels_full:
+            raise ValueError('the number of levels should be between 1 and '
+                             '{}'.format(n_levels_full))
+
+        indices = numpy.arange(n_levels)
+
+        self.parent = data_set
+        """the full data set"""
+
+        self.level_indices = indices
+        """the indices of the kept levels in the full data set"""
+
+        self.max_error = None
+        """the maximum relative error of the cooling function w.r.t the full
+        data set (set by truncate_levels)"""
+
+        self.collider = data_set.collider
+        self.raw_data = data_set.raw_data
+        self.energy_levels = data_set.energy_levels.subset(indices)
+        self.a_matrix = data_set.a_matrix[numpy.ix_(indices, indices)]
+
+        self.k_dex_matrix_interpolator = SubsetKDexMatrixInterpolator(
+            data_set.k_dex_matrix_interpolator, indices)
+
+        self.additional_k_dex_matrix_interpolators = {
+            collider: SubsetKDexMatrixInterpolator(interpolator, indices)
+            for collider, interpolator in
+            data_set.additional_k_dex_matrix_interpolators.items()
+        }
+
+    @property
+    def n_levels(self):
+        """the number of kept levels"""
+        return self.level_indices.size
+
+
+class LumpedKDexMatrixInterpolator(object):
+    """
+    The K_dex interpolator of the superlevels of a lumped data set
+
+    The K matrix (de-excitation and excitation) of the full set of levels is
+    lumped (see LumpedDataSet.lump) and the strictly lower triangular part,
+    i.e. the de-excitation between the superlevels, is returned.
+    """
+    def __init__(self, interpolator, energy_levels, weights, membership):
+        """
+        Constructor
+
+        :param callable interpolator: the K_dex interpolator of the full set
+         of levels.
+        :param EnergyLevelsSpeciesBase energy_levels: the full set of levels
+        :param ndarray weights: the (n_superlevels, n_levels) matrix of the
+         fractional populations of the levels within the superlevels
+        :param ndarray membership: the (n_levels, n_superlevels) matrix whose
+         element [i, I] is 1 if the level i is in the superlevel I
+        """
+        self.interpolator = interpolator
+        """the K_dex interpolator of the full set of levels"""
+
+        self.energy_levels = energy_levels
+        """the full set of levels"""
+
+        self.weights = weights
+        """the fractional populations of the levels within the superlevels"""
+
+        self.membership = membership
+        """the membership matrix of the levels in the superlevels"""
+
+    def _lump(self, k_matrix):
+        """
+        :param Quantity k_matrix: a matrix of the full set of levels
+        :return: Quantity: the strictly lower triangular part of the lumped
+         matrix
+        """
+        lumped = self.weights.dot(k_matrix.value).dot(self.membership)
+        return numpy.tril(lumped, -1) * k_matrix.unit
+
+    def __call__(self, t_kin):
+        """
+        :param Quantity t_kin: the kinetic temperature
+        :return: Quantity: the K_dex matrix of the superlevels
+        """
+        return self._lump(compute_k_matrix_from_k_dex_matrix(
+            self.energy_levels, self.interpolator, t_kin))
+
+    def derivative(self, t_kin):
+        """
+        :param Quantity t_kin: the kinetic temperature
+        :return: Quantity: the derivative of the K_dex matrix of the
+         superlevels
+        """
+        return self._lump(compute_k_matrix_derivative(
+            self.energy_levels, self.interpolator, t_kin))
+
+
+class LumpedDataSet(DataSetBase):
+    """
+    A data set whose levels are lumped into thermalized superlevels
+
+    The populations of the levels within a superlevel are assumed to follow
+    a Boltzmann distribution at the lumping temperature t_lump, i.e. the
+    population of the level i of the superlevel I is w_i * x_I with
+    w_i = g_i exp(-E_i / kb t_lump) / Z_I. The rates between the superlevels
+    are the weighted sums of the rates between their levels, i.e.
+    X' = W.X.P where W holds the weights w_i and P is the membership matrix,
+    and the transitions within the superlevels are dropped.
+
+    The A matrix and the emitted power vector (that includes the power of
+    the lines within the superlevels) are lumped once. The K matrices of the
+    colliders are lumped at each kinetic temperature. The energies and the
+    (non integer) degeneracies of the superlevels are set such that
+    g_I exp(-E_I / kb T) = Z_I(T) at t_lump, with E_I the mean energy of the
+    superlevel. Hence the excitation rates computed from the lumped K_dex
+    matrices through the detailed balance are exact at t_lump and accurate
+    to first order around it.
+
+    .. code-block:: python
+
+        full = DataLoader().load('H2_lique')
+        groups = full.energy_levels.group_by_v(n_resolved=20)
+        reduced = LumpedDataSet(full, groups, t_lump=1000.0 * u.K)
+    """
+    def __init__(self, data_set, groups, t_lump):
+        """
+        Constructor
+
+        :param DataSetBase data_set: the full data set
+        :param array_like groups: the index of the superlevel of each level
+         (e.g. as returned by EnergyLevelsMolecule.group_by_v). The indices
+         should be consecutive starting from 0.
+        :param Quantity t_lump: the temperature of the Boltzmann distribution
+         of the levels within the superlevels
+        """
+        super(LumpedDataSet, self).__init__()
+
+        energy_levels = data_set.energy_levels
+        n_levels_full = data_set.a_matrix.shape[0]
+
+        groups = numpy.asarray(groups, 'i8')
+        if groups.shape != (n_levels_full,):
+            raise ValueError('the group of each of the {} levels should be '
+                             'specified'.format(n_levels_full))
+        n_groups = groups.max() + 1
+        if groups.min() < 0 or numpy.bincount(groups).min() == 0:
+            raise ValueError('the group indices should be consecutive '
+                             'starting from 0')
+
+        kb_t = kb.si.value * t_lump.to(u.K).value
+        energies = energy_levels.excitation_energies()
+        degeneracies = numpy.asarray(energy_levels.data['g'], 'f8')
+
+        # the boltzmann weights of the levels w.r.t the lowest level of each
+        # group and the mean excitation energies of the groups
+        e_min = numpy.full(n_groups, numpy.inf)
+        numpy.minimum.at(e_min, groups, energies)
+        boltzmann = degeneracies * numpy.exp(-(energies - e_min[groups]) /
+                                             kb_t)
+        partition = numpy.bincount(groups, boltzmann, n_groups)
+        weights = boltzmann / partition[groups]
+        e_mean = numpy.bincount(groups, weights * energies, n_groups)
+
+        # the superlevels are sorted in increasing excitation energy
+        order = numpy.argsort(e_mean, kind='stable')
+        rank = numpy.empty_like(order)
+        rank[order] = numpy.arange(n_groups)
+        groups = rank[groups]
+
+        self.parent = data_set
+        """the full data set"""
+
+        self.groups = groups
+        """the index of the superlevel of each level of the full data set"""
+
+        self.t_lump = t_lump
+        """the temperature of the Boltzmann distribution within the
+        superlevels"""
+
+        self.level_weights = weights
+        """the fractional populations of the levels within their
+        superlevels"""
+
+        self.max_error = None
+        """the maximum relative error of the cooling function w.r.t the full
+        data set (set by lump_levels)"""
+
+        membership = numpy.zeros((n_levels_full, n_groups), 'f8')
+        membership[numpy.arange(n_levels_full), groups] = 1.0
+        weights_matrix = membership.T * weights
+
+        self.collider = data_set.collider
+        self.raw_data = data_set.raw_data
+
+        self.energy_levels = EnergyLevelsSpeciesBase()
+        self.energy_levels.data = LevelsTable(
+            [('superlevel', 'i4'), ('g', 'f8'), ('label', 'i4'), ('E', 'f8')],
+            n_groups,
+            units={'E': energy_levels.data['E'].unit}
+        )
+        self.energy_levels.data['superlevel'] = numpy.arange(n_groups)
+        self.energy_levels.data['label'] = numpy.arange(n_groups)
+        self.energy_levels.data['g'] = (partition * numpy.exp(
+            (e_mean - e_min) / kb_t))[order]
+        self.energy_levels.data['E'] = weights_matrix.dot(
+            u.Quantity(energy_levels.data['E']))
+        self.energy_levels.set_labels()
+
+        self.a_matrix = self._lump(data_set.a_matrix, weights_matrix,
+                                   membership)
+        self.emitted_power = weights_matrix.dot(data_set.emitted_power)
+
+        self.k_dex_matrix_interpolator = LumpedKDexMatrixInterpolator(
+            data_set.k_dex_matrix_interpolator, energy_levels,
+            weights_matrix, membership)
+
+        self.additional_k_dex_matrix_interpolators = {
+            collider: LumpedKDexMatrixInterpolator(
+                interpolator, energy_levels, weights_matrix, membership)
+            for collider, interpolator in
+            data_set.additional_k_dex_matrix_interpolators.items()
+        }
+
+    @staticmethod
+    def _lump(matrix, weights_matrix, membership):
+        """
+        :return: Quantity: the matrix of the superlevels W.X.P without the
+         transitions within the superlevels
+        """
+        lumped = weights_matrix.dot(matrix.value).dot(membership)
+        numpy.fill_diagonal(lumped, 0.0)
+        return lumped * matrix.unit
+
+    @property
+    def n_levels(self):
+        """the number of superlevels"""
+        return self.a_matrix.shape[0]
+
+    def expand_populations(self, populations):
+        """
+        Compute the populations of the levels of the full data set
+
+        :param array_like populations: the population densities of the
+         superlevels (as returned e.g. by population_density_at_steady_state)
+        :return: ndarray: the population densities of the levels assuming
+         the Boltzmann distribution within the superlevels at self.t_lump
+        """
+        populations = numpy.asarray(populations)
+        if populations.ndim == 2 and populations.shape[1] == 1:
+            populations = populations[:, 0]
+        return self.level_weights * populations[..., self.groups]
+
+
+def _cooling_rates(data_set, t_kin, collider_density, t_rad):
+    """
+    Compute the cooling rates on the mesh of the sample points
+
+    :param DataSetBase data_set: the data set
+    :param Quantity t_kin: the kinetic temperatures (1D)
+    :param Quantity collider_density: the collider densities (1D)
+    :param Quantity t_rad: the radiation temperature
+    :return: ndarray: the cooling rates in erg / s of shape
+     (t_kin.size, collider_density.size)
+    """
+    retval = numpy.zeros((t_kin.size, collider_density.size), 'f8')
+    for i, t_kin_i in enumerate(t_kin):
+        for j, density in enumerate(collider_density):
+            retval[i, j] = cooling_rate_at_steady_state(
+                data_set, t_kin_i, t_rad, density).to(u.erg / u.s).value
+    return retval
+
+
+def _sample_points(t_kin, collider_density):
+    """
+    :return: tuple: the 1D arrays of the sample temperatures and densities
+    """
+    return (numpy.atleast_1d(t_kin.to(u.K)),
+            numpy.atleast_1d(collider_density.to(u.m**-3)))
+
+
+def reduction_errors(data_set,
+                     reduced,
+                     t_kin,
+                     collider_density,
+                     t_rad=0.0 * u.K):
+    """
+    Compute the relative errors of the cooling function of a reduced data
+    set w.r.t the full one
+
+    :param DataSetBase data_set: the full data set
+    :param DataSetBase reduced: the reduced data set (e.g. TruncatedDataSet
+     or LumpedDataSet)
+    :param Quantity t_kin: the sample kinetic temperatures
+    :param Quantity collider_density: the sample collider densities
+    :param Quantity t_rad: the radiation temperature
+    :return: ndarray: the relative errors on the mesh of the sample points as
+     an array of shape (t_kin.size, collider_density.size)
+    """
+    t_kin, collider_density = _sample_points(t_kin, collider_density)
+
+    full = _cooling_rates(data_set, t_kin, collider_density, t_rad)
+    approximate = _cooling_rates(reduced, t_kin, collider_density, t_rad)
+
+    return numpy.fabs(approximate - full) / numpy.fabs(full)
+
+
+def truncation_errors(data_set,
+                      n_levels,
+                      t_kin,
+                      collider_density,
+                      t_rad=0.0 * u.K):
+    """
+    Compute the relative errors of the cooling function of a truncated data
+    set w.r.t the full one
+
+    :param DataSetBase data_set: the full data set
+    :param int n_levels: the number of the kept levels
+    :param Quantity t_kin: the sample kinetic temperatures
+    :param Quantity collider_density: the sample collider densities
+    :param Quantity t_rad: the radiation temperature
+    :return: ndarray: the relative errors on the mesh of the sample points as
+     an array of shape (t_kin.size, collider_density.size)
+    """
+    return reduction_errors(data_set, TruncatedDataSet(data_set, n_levels),
+                            t_kin, collider_density, t_rad)
+
+
+def truncate_levels(data_set,
+                    t_kin,
+                    collider_density,
+                    t_rad=0.0 * u.K,
+                    tolerance=1e-2,
+                    n_min=2):
+    """
+    Find the smallest number of levels that reproduce the cooling function
+    within a tolerance and return the truncated data set
+
+    The cooling function of the full data set is computed once on the mesh of
+    the sample points. The number of levels is then found by a bisection on
+    the number of kept levels (the lowest levels). The
+    error is assumed to decrease with the number of kept levels, which is
+    the case when the populations of the high levels decrease with energy.
+    The returned data set is checked to be within the tolerance.
+
+    .. code-block:: python
+
+        full = DataLoader().load('H2_lique')
+        reduced = truncate_levels(
+            full,
+            t_kin=numpy.logspace(2, 3, 5) * u.K,
+            collider_density=numpy.logspace(6, 12, 5) * u.m**-3,
+            tolerance=1e-3)
+        print(reduced.n_levels, reduced.max_error)
+
+    :param DataSetBase data_set: the full data set
+    :param Quantity t_kin: the sample kinetic temperatures that cover the
+     range of interest.
+    :param Quantity collider_density: the sample collider densities that
+     cover the range of interest.
+    :param Quantity t_rad: the radiation temperature
+    :param float tolerance: the maximum relative error of the cooling
+     function at the sample points.
+    :param int n_min: the minimum number of levels to be kept
+    :return: TruncatedDataSet: the truncated data set with the maximum
+     relative error set in the attribute max_error.
+    """
+    t_kin, collider_density = _sample_points(t_kin, collider_density)
+
+    full = _cooling_rates(data_set, t_kin, collider_density, t_rad)
+
+    def max_error(n_levels):
+        reduced = TruncatedDataSet(data_set, n_levels)
+        truncated = _cooling_rates(reduced, t_kin, collider_density, t_rad)
+        reduced.max_error = (numpy.fabs(truncated - full) /
+                             numpy.fabs(full)).max()
+        logger.debug('{} levels, max relative error = {:e}'.format(
+            n_levels, reduced.max_error))
+        return reduced
+
+    n_levels_full = data_set.a_matrix.shape[0]
+
+    # bisection in the number of levels, the upper bound (all the levels)
+    # is exact
+    best = TruncatedDataSet(data_set, n_levels_full)
+    best.max_error = 0.0
+    low, high = max(n_min, 1) - 1, n_levels_full
+    while high - low > 1:
+        middle = (low + high) // 2
+        reduced = max_error(middle)
+        if reduced.max_error <= tolerance:
+            high, best = middle, reduced
+        else:
+            low = middle
+
+    logger.info('the data set is truncated from {} to {} levels (max '
+                'relative error = {:e})'.format(
+                    n_levels_full, best.n_levels, best.max_error))
+
+    return best
+
+
+def lump_levels(data_set,
+                groups,
+                t_kin,
+                collider_density,
+                t_rad=0.0 * u.K,
+                t_lump=None):
+    """
+    Lump the levels of a data set into superlevels and report the error
+
+    .. code-block:: python
+
+        full = DataLoader().load('H2_lique')
+        reduced = lump_levels(
+            full,
+            full.energy_levels.group_by_v(n_resolved=20),
+            t_kin=numpy.logspace(2.5, 3.5, 5) * u.K,
+            collider_density=numpy.logspace(6, 12, 5) * u.m**-3)
+        print(reduced.n_levels, reduced.max_error)
+
+    :param DataSetBase data_set: the full data set
+    :param array_like groups: the index of the superlevel of each level (see
+     LumpedDataSet)
+    :param Quantity t_kin: the sample kinetic temperatures at which the
+     error is computed.
+    :param Quantity collider_density: the sample collider densities at which
+     the error is computed.
+    :param Quantity t_rad: the radiation temperature
+    :param Quantity t_lump: the temperature of the Boltzmann distribution
+     within the superlevels. By default the geometric mean of the extreme
+     sample temperatures is used.
+    :return: LumpedDataSet: the lumped data set with the maximum relative
+     error set in the attribute max_error.
+    """
+    t_kin, collider_density = _sample_points(t_kin, collider_density)
+
+    if t_lump is None:
+        t_lump = numpy.sqrt(t_kin.min() * t_kin.max())
+
+    reduced = LumpedDataSet(data_set, groups, t_lump)
+    reduced.max_error = reduction_errors(
+        data_set, reduced, t_kin, collider_density, t_rad).max()
+
+    logger.info('the data set is lumped from {} levels to {} superlevels '
+                '(max relative error = {:e})'.format(
+                    data_set.a_matrix.shape[0], reduced.n_levels,
+                    reduced.max_error))
+
+    return reduced
@@ -17,9 +17,37 @@
 #    You should have received a copy of the GNU General Public License
 #    along with Frigus.  If not, see <http://www.gnu.org/licenses/>.
 
-from numpy import exp, abs
+"""
+module that implements the closed form steady state solutions of the two and
+three level systems.
+
+The closed forms broadcast over arrays of the temperatures and of the
+collider densities. solve_equilibrium_analytic solves stacks of the M
+matrices of systems with up to three levels and it is used as a fast path
+by population.population_density_at_steady_state (see the method argument).
+"""
+import numpy
+from numpy import exp, expm1, abs, fabs
 from astropy.constants import k_B as kb
 
+from frigus.solvers.diagnostics import closed_form_diagnostics
+
+MAX_ANALYTIC_LEVELS = 3
+"""the maximum number of levels of the systems solved in closed form"""
+
+
+def _occupation_number(delta_e, t_rad):
+    """
+    The photon occupation number 1 / (exp(dE / kb T_rad) - 1)
+
+    :param Quantity delta_e: the energies of the photons
+    :param Quantity t_rad: the radiation temperatures. The occupation number
+     is zero for t_rad = 0.
+    :return: Quantity: the dimensionless occupation numbers
+    """
+    with numpy.errstate(divide='ignore', over='ignore'):
+        return 1.0 / expm1(delta_e / (kb * t_rad))
+
 
 def population_density_ratio_two_level(g,
                                        energy_levels,
@@ -32,7 +60,8 @@ def population_density_ratio_two_level(g,
     Calculate the equilibrium population density ratio of a two level system
 
     The provided parameters should all the compatible dimensions wise. i.e
-    no checks are done if the input arguments
+    no checks are done if the input arguments. The rates, the temperatures
+    and the collider density can be arrays that broadcast together.
 
     At equilibrium, the ratio :math:`n_1 / n_0`:
 
@@ -57,7 +86,7 @@ def population_density_ratio_two_level(g,
 
     k_01 = (g_1 / g_0) * k_10 * exp(-delta_e / (kb * t_kin))
 
-    f_10 = 1.0 / (exp(delta_e / (kb * t_rad)) - 1.0)
+    f_10 = _occupation_number(delta_e, t_rad)
 
     b_10 = f_10 * a_10
     b_01 = (g_1 / g_0) * f_10 * a_10
@@ -82,7 +111,8 @@ def population_density_ratio_three_level(g,
     Calculate the equilibrium population density ratio of a three level system
 
     The provided parameters should all the compatible dimensions wise. i.e
-    no checks are done if the input arguments
+    no checks are done if the input arguments. The rates, the temperatures
+    and the collider density can be arrays that broadcast together.
 
     At equilibrium, the ratio :math:`n_1 / n_0`:
 
@@ -116,9 +146,9 @@ def population_density_ratio_three_level(g,
     k_02 = (g_2 / g_0) * k_20 * exp(- abs(energy_levels[2] - energy_levels[0]) / (kb * t_kin))
     k_12 = (g_2 / g_1) * k_21 * exp(- abs(energy_levels[2] - energy_levels[1]) / (kb * t_kin))
 
-    f_10 = 1.0 / (exp(abs(energy_levels[1] - energy_levels[0]) / (kb * t_rad)) - 1.0)
-    f_20 = 1.0 / (exp(abs(energy_levels[2] - energy_levels[0]) / (kb * t_rad)) - 1.0)
-    f_21 = 1.0 / (exp(abs(energy_levels[2] - energy_levels[1]) / (kb * t_rad)) - 1.0)
+    f_10 = _occupation_number(abs(energy_levels[1] - energy_levels[0]), t_rad)
+    f_20 = _occupation_number(abs(energy_levels[2] - energy_levels[0]), t_rad)
+    f_21 = _occupation_number(abs(energy_levels[2] - energy_levels[1]), t_rad)
 
     b_10 = f_10 * a_10
     b_20 = f_20 * a_20
@@ -153,7 +183,8 @@ def population_denisty_ratio_two_level_no_radiation(
 
     :param DataSetBase species_data: The dataset of a two level system
     :param t_kin: The kinetic temperature
-    :param n_collider: The density of the colliding species
+    :param n_collider: The density of the colliding species (an array of
+     densities that broadcasts with t_kin can be passed)
     :return: fractional population densities of the levels
     """
     a_10 = species_data.a_matrix[1, 0]
@@ -169,3 +200,94 @@ def population_denisty_ratio_two_level_no_radiation(
     x_1 = r / (1.0 + r)
 
     return x_0, x_1
+
+
+def steady_state_two_level(m_matrix):
+    """
+    Compute the steady state of stacks of two level systems
+
+    :param ndarray m_matrix: the M matrices (see
+     population.compute_transition_rate_matrix) as an array of shape
+     (..., 2, 2) in consistent units.
+    :return: ndarray: the fractional population densities of shape (..., 2)
+    """
+    # r_ij is the rate from i to j, i.e. M[j, i]
+    r_01, r_10 = m_matrix[..., 1, 0], m_matrix[..., 0, 1]
+
+    retval = numpy.stack([r_10, r_01], axis=-1)
+
+    return retval / retval.sum(axis=-1)[..., numpy.newaxis]
+
+
+def steady_state_three_level(m_matrix):
+    """
+    Compute the steady state of stacks of three level systems
+
+    The populations are the sums over the spanning trees of the graph of the
+    transitions that are directed towards each level (the same expressions
+    as population_density_ratio_three_level).
+
+    :param ndarray m_matrix: the M matrices (see
+     population.compute_transition_rate_matrix) as an array of shape
+     (..., 3, 3) in consistent units.
+    :return: ndarray: the fractional population densities of shape (..., 3)
+    """
+    def r(i, j):
+        """the rate from the level i to the level j"""
+        return m_matrix[..., j, i]
+
+    retval = numpy.stack(
+        [
+            r(1, 0) * r(2, 0) + r(1, 0) * r(2, 1) + r(1, 2) * r(2, 0),
+            r(0, 1) * r(2, 0) + r(0, 1) * r(2, 1) + r(2, 1) * r(0, 2),
+            r(0, 2) * r(1, 0) + r(0, 2) * r(1, 2) + r(1, 2) * r(0, 1),
+        ],
+        axis=-1
+    )
+
+    return retval / retval.sum(axis=-1)[..., numpy.newaxis]
+
+
+def solve_equilibrium_analytic(m_matrix, return_diagnostics=False):
+    """
+    Solve for the equilibrium population densities in closed form
+
+    This is the closed form counterpart of linear.solve_equilibrium for
+    systems with up to MAX_ANALYTIC_LEVELS levels. Stacks of M matrices are
+    solved at once and the M matrices are not modified.
+
+    :param ndarray m_matrix: the M matrix as an array of shape (n, n) or a
+     stack of M matrices of shape (..., n, n) with n <= 3.
+    :param bool return_diagnostics: If True, the SolverDiagnostics of the
+     solution are returned too (only for a single M matrix).
+    :return: ndarray: the population densities as a column vector for a
+     single M matrix or as an array of shape (..., n) for a stack. If
+     return_diagnostics is True a tuple of the population densities and of
+     the SolverDiagnostics is returned.
+    """
+    m_matrix = numpy.asarray(m_matrix, 'f8')
+    n_levels = m_matrix.shape[-1]
+
+    if n_levels == 1:
+        x = numpy.ones(m_matrix.shape[:-1], 'f8')
+    elif n_levels == 2:
+        x = steady_state_two_level(m_matrix)
+    elif n_levels == 3:
+        x = steady_state_three_level(m_matrix)
+    else:
+        raise ValueError('the closed form solutions are implemented for up '
+                         'to {} levels, the system has {} levels'.format(
+                             MAX_ANALYTIC_LEVELS, n_levels))
+
+    if m_matrix.ndim > 2:
+        if return_diagnostics is True:
+            raise ValueError('the diagnostics are computed for a single M '
+                             'matrix only')
+        return x
+
+    x = x.reshape(-1, 1)
+
+    if return_diagnostics is True:
+        return x, closed_form_diagnostics(m_matrix, x, 'analytic')
+    else:
+        return x
@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+
+#    diagnostics.py is part of Frigus.
+
+#    Frigus: software to compure the energy exchange in a multi-level system
+#    Copyright (C) 2016-2018 Mher V. Kazandjian and Carla Maria Coppola
+
+#    Frigus is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, version 3 of the License.
+#
+#    Frigus is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+
+#    You should have received a copy of the GNU General Public License
+#    along with Frigus.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+module that implements containers for the quality diagnostics of the
+solutions of the steady state linear systems
+"""
+import numpy
+
+
+class SolverDiagnostics(object):
+    """
+    Container for the diagnostics of a single steady state solution
+    """
+    def __init__(self,
+                 condition_number=numpy.nan,
+                 residual_norm=numpy.nan,
+                 population_sum_error=numpy.nan,
+                 n_negative=0,
+                 backend=None):
+        """
+        Constructor
+        """
+        self.condition_number = condition_number
+        """estimate of the 1-norm condition number of the conditioned linear
+        system (computed from the LU factors)"""
+
+        self.residual_norm = residual_norm
+        """the 2-norm of the residual A.x - b of the conditioned system"""
+
+        self.population_sum_error = population_sum_error
+        """the absolute deviation of the sum of the populations from 1"""
+
+        self.n_negative = n_negative
+        """the number of negative entries in the solution"""
+
+        self.backend = backend
+        """the name of the method used to compute the solution"""
+
+    def is_reliable(self,
+                    max_condition_number=1e15,
+                    max_residual_norm=1e-8,
+                    max_population_sum_error=1e-6):
+        """
+        Check whether the solution can be trusted
+
+        :param float max_condition_number: the largest acceptable condition
+         number.
+        :param float max_residual_norm: the largest acceptable residual norm.
+        :param float max_population_sum_error: the largest acceptable
+         deviation of the sum of the populations from 1.
+        :return: bool: True if all the criteria are satisfied.
+        """
+        return bool(
+            self.condition_number <= max_condition_number and
+            self.residual_norm <= max_residual_norm and
+            self.population_sum_error <= max_population_sum_error and
+            self.n_negative == 0
+        )
+
+    def __repr__(self):
+        return (
+            'SolverDiagnostics(condition_number={:e}, residual_norm={:e}, '
+            'population_sum_error={:e}, n_negative={}, backend={})'
+        ).format(
+            self.condition_number,
+            self.residual_norm,
+            self.population_sum_error,
+            self.n_negative,
+            self.backend
+        )
+
+
+def closed_form_diagnostics(m_matrix, x, backend):
+    """
+    Compute the diagnostics of a steady state computed without a linear
+    solve (e.g. a closed form solution or a limit of the rate equations)
+
+    The residual is the one of the rate equations (all the rows of M except
+    the first that is replaced by the conservation equation) with the rows
+    scaled by the diagonal, as in frigus.solvers.linear.solve_equilibrium.
+    Since no linear system is solved the condition number is set to 1.
+
+    :param ndarray m_matrix: the M matrix
+    :param ndarray x: the population densities as a column vector
+    :param str backend: the name of the method used to compute x
+    :return: SolverDiagnostics
+    """
+    scaled = m_matrix[1:] / numpy.diag(m_matrix)[1:, numpy.newaxis]
+
+    return SolverDiagnostics(
+        condition_number=1.0,
+        residual_norm=numpy.linalg.norm(numpy.dot(scaled, x)),
+        population_sum_error=numpy.fabs(1.0 - x.sum()),
+        n_negative=int((x < 0.0).sum()),
+        backend=backend
+    )
+
+
+class SolverDiagnosticsGrid(object):
+    """
+    Aggregate of the diagnostics of the solutions over a grid of points
+
+    The arrays of the diagnostics can be arrays of a grid store (e.g. memory
+    mapped arrays or views of HDF5 datasets, see from_arrays) that are read
+    only when the diagnostics are summarized. The backend names are kept as
+    fixed width bytes and are decoded only by summary.
+    """
+    def __init__(self, shape):
+        """
+        Constructor
+
+        :param tuple shape: the shape of the grid
+        """
+        self.shape = shape
+        """the shape of the grid"""
+
+        self.condition_number = numpy.full(shape, numpy.nan, 'f8')
+        """the condition number estimates"""
+
+        self.residual_norm = numpy.full(shape, numpy.nan, 'f8')
+        """the norms of the residuals"""
+
+        self.population_sum_error = numpy.full(shape, numpy.nan, 'f8')
+        """the deviations of the sums of the populations from 1"""
+
+        self.n_negative = numpy.zeros(shape, 'i4')
+        """the number of negative population densities"""
+
+        self.backend = numpy.full(shape, b'', 'S16')
+        """the name of the method used to compute each solution (as bytes)"""
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """
+        Construct the diagnostics of a grid from stored arrays
+
+        The arrays are wrapped without copying them.
+
+        :param dict arrays: the arrays of the diagnostics keyed by the names
+         of the attributes (e.g. the arrays of a grid store). The backend
+         names are stored as bytes.
+        :return: SolverDiagnosticsGrid
+        """
+        diagnostics = cls.__new__(cls)
+        diagnostics.shape = tuple(arrays['condition_number'].shape)
+        for name in ['condition_number',
+                     'residual_norm',
+                     'population_sum_error',
+                     'n_negative',
+                     'backend']:
+            setattr(diagnostics, name, arrays[name])
+
+        return diagnostics
+
+    def set(self, index, diagnostics):
+        """
+        Store the diagnostics of a single solution
+
+        :param int|tuple index: the flat or the multi-dimensional index of the
+         grid point.
+        :param SolverDiagnostics diagnostics: the diagnostics of the point
+        """
+        if numpy.isscalar(index):
+            index = numpy.unravel_index(index, self.shape)
+
+        self.condition_number[index] = diagnostics.condition_number
+        self.residual_norm[index] = diagnostics.residual_norm
+        self.population_sum_error[index] = diagnostics.population_sum_error
+        self.n_negative[index] = diagnostics.n_negative
+        self.backend[index] = diagnostics.backend
+
+    def unreliable(self,
+                   max_condition_number=1e15,
+                   max_residual_norm=1e-8,
+                   max_population_sum_error=1e-6):
+        """
+        Flag the grid points whose solution can not be trusted
+
+        The criteria are the same as SolverDiagnostics.is_reliable.
+
+        :return: ndarray: A boolean mask of the shape of the grid that is True
+         for the unreliable points.
+        """
+        with numpy.errstate(invalid='ignore'):
+            return (
+                ~(numpy.asarray(self.condition_number) <=
+                  max_condition_number) |
+                ~(numpy.asarray(self.residual_norm) <= max_residual_norm) |
+                ~(numpy.asarray(self.population_sum_error) <=
+                  max_population_sum_error) |
+                (numpy.asarray(self.n_negative) > 0)
+            )
+
+    def summary(self, **kwargs):
+        """
+        Summarize the diagnostics of the grid
+
+        :param kwargs: passed to self.unreliable
+        :return: dict: The number of points, the number of unreliable points,
+         the number of points with negative populations, the worst condition
+         number and residual and the count of the solutions per backend.
+        """
+        backends, counts = numpy.unique(
+            numpy.asarray(self.backend), return_counts=True
+        )
+        backends = numpy.char.decode(numpy.asarray(backends, 'S'), 'ascii')
+        return {
+            'n_points': int(numpy.prod(self.shape)),
+            'n_unreliable': int(self.unreliable(**kwargs).sum()),
+            'n_negative_points': int(
+                (numpy.asarray(self.n_negative) > 0).sum()),
+            'max_condition_number': numpy.nanmax(self.condition_number),
+            'max_residual_norm': numpy.nanmax(self.residual_norm),
+            'max_population_sum_error': numpy.nanmax(
+                self.population_sum_error),
+            'backends': dict(zip(backends.tolist(), counts.tolist()))
+        }
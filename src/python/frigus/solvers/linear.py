@@ -19,13 +19,38 @@
 
 
 """module that implements helper functions for solving linear systems"""
+import warnings
+
 import numpy
 from numpy.linalg import solve, cond
 import scipy
+from scipy.linalg import lu_factor, lu_solve, LinAlgWarning
+from scipy.linalg.lapack import dgecon
+
+from frigus.logs import get_logger, WarningAggregator
+from frigus.solvers.diagnostics import SolverDiagnostics
+
+logger = get_logger(__name__)
+
+solver_warnings = WarningAggregator(logger)
+"""the rate limited warnings issued while solving the steady state systems"""
+
+MPMATH_DPS = 50
+"""the number of decimal digits used by the mpmath solvers"""
+
+
+def _mpmath():
+    """
+    Import mpmath on demand
+
+    mpmath is used only by the fallback solvers for ill-conditioned systems,
+    so it is not imported with this module.
 
-import mpmath
-from mpmath import svd_r
-mpmath.mp.dps = 50
+    :return: module: the mpmath module with the precision set to MPMATH_DPS
+    """
+    import mpmath
+    mpmath.mp.dps = MPMATH_DPS
+    return mpmath
 
 
 def solve_linear_system_two_step(A, b, n_sub=1):
@@ -58,7 +83,43 @@ def solve_linear_system_two_step(A, b, n_sub=1):
     return x
 
 
-def solve_equilibrium(m_matrix):
+class EquilibriumFactors(object):
+    """
+    The factorization of a conditioned steady state linear system
+
+    The factors are returned by solve_equilibrium and can be reused to solve
+    the adjoint (transposed) system, e.g. to compute sensitivities of
+    quantities that depend on the populations (see solve_adjoint).
+    """
+    def __init__(self, lu, piv, scale, a_matrix, backend):
+        """
+        Constructor
+
+        :param ndarray lu: the LU factors of the conditioned matrix
+        :param ndarray piv: the pivots of the LU factorization
+        :param ndarray scale: the factors by which the rows of the matrix
+         (with the conservation equation) were divided
+        :param ndarray a_matrix: the conditioned matrix
+        :param str backend: the backend used to solve the system
+        """
+        self.lu = lu
+        """the LU factors of the conditioned matrix"""
+
+        self.piv = piv
+        """the pivots of the LU factorization"""
+
+        self.scale = scale
+        """the factors by which the rows of the matrix were divided"""
+
+        self.a_matrix = a_matrix
+        """the conditioned matrix"""
+
+        self.backend = backend
+        """the backend used to solve the system"""
+
+
+def solve_equilibrium(m_matrix, return_diagnostics=False,
+                      return_factors=False):
     """
     Solve for the equilibrium population densities given the right hand side of
     the linear system of the rate equations dx/dt as a matrix dx/dt = A.x
@@ -67,7 +128,14 @@ def solve_equilibrium(m_matrix):
 
     :param matrix_like m_matrix: The right hand side matrix of the rate
     equation as/home/carla an n x n matrix.
-    :return: The population densities as a column vector.
+    :param bool return_diagnostics: If True, the quality diagnostics of the
+     solution are returned along with the solution.
+    :param bool return_factors: If True, the factorization of the linear
+     system (EquilibriumFactors) is returned along with the solution.
+    :return: The population densities as a column vector. If
+     return_diagnostics or return_factors are True a tuple of the population
+     densities followed by the SolverDiagnostics and/or EquilibriumFactors
+     objects is returned.
     """
 
     sz = m_matrix.shape[0]
@@ -91,37 +159,150 @@ def solve_equilibrium(m_matrix):
     # ============ condition the linear system ========================
     #
     # scale the rows by normalizing w.r.t the diagonal element
+    scale = numpy.diag(A).copy()
     for i in numpy.arange(sz):
         A[i, :] = A[i, :] / A[i, i]
-
-    #
-    # DEBUG: examine the condition number of A
-    #
-    # cond = numpy.linalg.cond(A)
     # ============ done conditioning the linear system ===============
 
-    try:
+    # the LU factors are computed explicitly (instead of calling solve) in
+    # order to estimate the condition number from them when requested
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', LinAlgWarning)
+        lu, piv = lu_factor(A, check_finite=False)
+
+    if (numpy.diag(lu) != 0.0).all():
         # x = solve_lu_mp(A, b)
         # x = solve_linear_system_two_step(A, b, n_sub=1)
-        x = solve(A, b)
-    except scipy.linalg.LinAlgError as exc:
-        print('solving the linear system with conditioning failed')
-        print('due an singular matrix exception')
-        print(exc)
-        print('try to solve the system using extended precision')
-        print('caution: this might take very long')
+        x = lu_solve((lu, piv), b, check_finite=False)
+        backend = 'lapack'
+    else:
+        solver_warnings.warn(
+            'singular linear systems',
+            'solving the linear system with conditioning failed due to a '
+            'singular matrix. Solving the system using extended precision '
+            '(caution: this might take very long)'
+        )
         x = solve_lu_mp(A, b)
+        backend = 'mpmath'
+
+    if (x < 0.0).any():
+        solver_warnings.warn(
+            'negative population densities',
+            'found %d negative population densities, accurary of the '
+            'solution is not guaranteed. Check the linear system, rates, '
+            'condition number..etc..', (x < 0.0).sum()
+        )
+
+    retval = (x,)
+    if return_diagnostics is True:
+        retval += (compute_diagnostics(A, b, x, lu, backend),)
+    if return_factors is True:
+        retval += (EquilibriumFactors(lu, piv, scale, A, backend),)
+
+    if len(retval) == 1:
+        return x
+    else:
+        return retval
+
+
+def solve_equilibrium_batch(m_matrices):
+    """
+    Solve a stack of steady state linear systems at once
+
+    This is the batched counterpart of solve_equilibrium, e.g. to solve the
+    realizations of a Monte Carlo propagation of the uncertainties of the
+    rates (see frigus.uncertainty). The first row of each matrix is replaced
+    by the conservation equation and the rows are scaled by the diagonal
+    elements as in solve_equilibrium. The stack is solved in a single call to
+    numpy.linalg.solve, i.e. without a python loop over the systems. The
+    systems are assumed to be non-singular (there is no extended precision
+    fallback).
+
+    :param ndarray m_matrices: the M matrices as an array of shape
+     (..., n, n). The array is not modified.
+    :return: ndarray: the population densities as an array of shape (..., n)
+    """
+    a_matrices = numpy.array(m_matrices, 'f8')
+    b = numpy.zeros(a_matrices.shape[:-1], 'f8')
+
+    a_matrices[..., 0, :], b[..., 0] = 1.0, 1.0
+
+    scale = numpy.diagonal(a_matrices, axis1=-2, axis2=-1).copy()
+    a_matrices /= scale[..., numpy.newaxis]
+    b /= scale
+
+    x = solve(a_matrices, b[..., numpy.newaxis])[..., 0]
 
     if (x < 0.0).any():
-        print(
-            'WARNING: found negative population densities\n'
-            'accurary of the solution is not guaranteed.\n'
-            'Check the linear system, rates, condition number..etc..\n'
+        solver_warnings.warn(
+            'negative population densities',
+            'found %d negative population densities in a batch of steady '
+            'state solutions, accurary of the solution is not guaranteed.',
+            (x < 0.0).sum()
         )
 
     return x
 
 
+def solve_adjoint(factors, rhs):
+    """
+    Solve the adjoint of a steady state linear system
+
+    Given the factors of the system M'.x = e_0 (where M' is the rate matrix
+    with the first row replaced by the conservation equation) solve
+    M'^T.y = rhs. The LU factors of the conditioned matrix S^-1.M' are reused,
+    i.e. only a back-substitution is done: (S^-1.M')^T.z = rhs and y = S^-1.z.
+
+    The sensitivity of a quantity q = rhs.x w.r.t a parameter p of M is then
+    dq/dp = - y^T.(dM'/dp).x
+
+    :param EquilibriumFactors factors: the factors returned by
+     solve_equilibrium
+    :param ndarray rhs: the right hand side vector
+    :return: ndarray: the solution of the adjoint system as a 1D array
+    """
+    rhs = numpy.asarray(rhs, 'f8').reshape(-1, 1)
+
+    if factors.backend == 'lapack':
+        z = lu_solve((factors.lu, factors.piv), rhs, trans=1,
+                     check_finite=False)
+    else:
+        z = solve_lu_mp(factors.a_matrix.T, rhs)
+
+    return z[:, 0] / factors.scale
+
+
+def compute_diagnostics(A, b, x, lu, backend):
+    """
+    Compute the quality diagnostics of the solution of a steady state system
+
+    The condition number is estimated from the LU factors using the LAPACK
+    routine xGECON, i.e. without inverting A.
+
+    :param ndarray A: the conditioned linear system
+    :param ndarray b: the right hand side
+    :param ndarray x: the solution of A.x = b
+    :param ndarray lu: the LU factors of A as returned by lu_factor
+    :param str backend: the name of the method used to compute x
+    :return: SolverDiagnostics
+    """
+    a_norm = numpy.abs(A).sum(axis=0).max()
+
+    if backend == 'lapack':
+        rcond, info = dgecon(lu, a_norm, norm='1')
+        condition_number = 1.0 / rcond if rcond > 0.0 else numpy.inf
+    else:
+        condition_number = numpy.inf
+
+    return SolverDiagnostics(
+        condition_number=condition_number,
+        residual_norm=numpy.linalg.norm(numpy.dot(A, x) - b),
+        population_sum_error=numpy.fabs(1.0 - x.sum()),
+        n_negative=int((x < 0.0).sum()),
+        backend=backend
+    )
+
+
 def solve_lu_mp(A, b):
     """
     Solve a linear system using mpmath
@@ -130,6 +311,8 @@ def solve_lu_mp(A, b):
     :param ndarray b: The right hand side
     :return: ndarray
     """
+    mpmath = _mpmath()
+
     A_mp = mpmath.matrix([list(row) for row in A])
     b_mp = mpmath.matrix([list(row) for row in b])
     x_mp = mpmath.lu_solve(A_mp, b_mp)
@@ -163,10 +346,12 @@ def solve_svd_mp(A, b):
     :param ndarray b: The right hand side
     :return: ndarray
     """
+    mpmath = _mpmath()
+
     A_mp = mpmath.matrix([list(row) for row in A])
     b_mp = mpmath.matrix([list(row) for row in b])
 
-    u, s, v = svd_r(A_mp)
+    u, s, v = mpmath.svd_r(A_mp)
 
     # x = V*((U'.b)./ diag(S))
     # x = V*(  c   ./ diag(S))
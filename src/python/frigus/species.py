@@ -20,11 +20,226 @@
 """
 Module that implements species related classes e.g. energy levels
 """
+import copy
+
 import numpy
+from astropy import units as u
 from astropy.table import QTable
 from frigus import utils
 
 
+class LevelsTable(object):
+    """
+    A compact container of the columns of the energy levels data
+
+    The columns are stored in a numpy structured array (one record per level)
+    and the units of the columns that are quantities (e.g. the energies 'E')
+    are kept separately. Accessing a column returns a view of the array (as a
+    Quantity for the columns with units) without the overhead of the column
+    machinery of astropy tables. The energies in SI units are cached since
+    they are used in the computation of all the rate matrices.
+
+    .. code-block:: python
+
+        levels = LevelsTable([('j', 'i4'), ('g', 'i4'), ('E', 'f8')],
+                             n_levels=2, units={'E': u.eV})
+        levels['E'] = [0.2, 0.7] * u.eV
+        print(levels.energies_si)
+        print(levels.as_qtable())
+
+    The columns with units are returned as read-only views, i.e. they should
+    be modified by assigning the whole column, which updates the cached SI
+    values.
+    """
+    __slots__ = ('_array', '_columns', '_units', '_quantities',
+                 '_energies_si')
+
+    def __init__(self, columns, n_levels, units=None):
+        """
+        Constructor
+
+        :param list columns: the names and dtypes of the columns as a list of
+         tuples e.g. [('v', 'i4'), ('j', 'i4'), ('E', 'f8')]
+        :param int n_levels: the number of levels
+        :param dict units: the units of the columns that are quantities keyed
+         by the names of the columns.
+        """
+        self._array = numpy.zeros(n_levels, dtype=columns)
+        self._columns = {name: self._array[name]
+                         for name in self._array.dtype.names}
+        self._units = dict(units or {})
+        self._quantities = {}
+        self._energies_si = None
+
+    def __len__(self):
+        """the number of levels"""
+        return self._array.size
+
+    def __contains__(self, name):
+        """check whether a column is defined"""
+        return name in self._columns
+
+    @property
+    def colnames(self):
+        """the names of the columns"""
+        return list(self._array.dtype.names)
+
+    @property
+    def units(self):
+        """the units of the columns that are quantities"""
+        return dict(self._units)
+
+    def __getitem__(self, name):
+        """
+        Return a column
+
+        :param str name: the name of the column
+        :return: ndarray|Quantity: a view of the column
+        """
+        if name in self._units:
+            if name not in self._quantities:
+                column = self._columns[name].view()
+                column.flags.writeable = False
+                self._quantities[name] = u.Quantity(
+                    column, self._units[name], copy=False)
+            return self._quantities[name]
+        else:
+            return self._columns[name]
+
+    def __setitem__(self, name, value):
+        """
+        Set the values of a column
+
+        :param str name: the name of the column
+        :param array_like|Quantity value: the values of the column. If a
+         Quantity is assigned to a column with units, the unit of the column
+         is set to the unit of the value. Values without units are assumed to
+         be in the unit of the column.
+        """
+        if name not in self._columns:
+            raise KeyError('no column named {} in the levels, the available '
+                           'columns are {}'.format(name, self.colnames))
+
+        if isinstance(value, u.Quantity):
+            if name not in self._units:
+                raise ValueError('the column {} has no units'.format(name))
+            self._units[name] = value.unit
+            value = value.value
+
+        self._array[name] = value
+        self._quantities.pop(name, None)
+
+        if name == 'E':
+            self._energies_si = None
+
+    @property
+    def energies_si(self):
+        """
+        The energies of the levels in J as a contiguous float array
+
+        The array is computed once (from the column 'E') and cached.
+        """
+        if self._energies_si is None:
+            energies = self['E'].to(
+                u.J,
+                equivalencies=u.spectral() + u.temperature_energy()
+            ).value
+            energies = numpy.ascontiguousarray(energies, 'f8')
+            energies.flags.writeable = False
+            self._energies_si = energies
+        return self._energies_si
+
+    def take(self, indices):
+        """
+        Return a new table with a subset of the levels
+
+        :param array_like indices: the indices of the levels to be kept (in
+         the order of the new table)
+        :return: LevelsTable: a copy of the selected levels
+        """
+        retval = LevelsTable(self._array.dtype, 0, units=self._units)
+        retval._array = self._array[numpy.asarray(indices)]
+        retval._columns = {name: retval._array[name]
+                           for name in retval._array.dtype.names}
+        return retval
+
+    def as_qtable(self):
+        """
+        Return the levels data as an astropy QTable (a copy) for e.g.
+        interactive use
+
+        :return: QTable
+        """
+        return QTable([self[name] for name in self.colnames],
+                      names=self.colnames,
+                      copy=True)
+
+
+def _dense_index(keys, name):
+    """
+    Build a dense lookup table of the positions of keys
+
+    :param ndarray keys: a (n_dims, n) integer array of the non-negative
+     keys, i.e. the column i is the key of the element i.
+    :param str name: the name of the keys (used in the error messages)
+    :return: ndarray: an array of n_dims dimensions where the element at a
+     key is the position of the key (-1 for the missing keys).
+    """
+    if keys.size > 0 and keys.min() < 0:
+        raise ValueError('the {} of the levels should be non '
+                         'negative'.format(name))
+
+    if keys.size > 0:
+        shape = tuple(keys.max(axis=1) + 1)
+    else:
+        shape = (0,) * keys.shape[0]
+    index = numpy.full(shape, -1, 'i8')
+    index[tuple(keys)] = numpy.arange(keys.shape[1])
+
+    if (index >= 0).sum() != keys.shape[1]:
+        raise ValueError('the {} of the levels are not unique'.format(name))
+
+    return index
+
+
+def _lookup(index, *keys):
+    """
+    Look up keys in a table built by _dense_index
+
+    :param ndarray index: the lookup table
+    :param array_like keys: the components of the keys (one array per
+     dimension of index).
+    :return: ndarray: the positions of the keys (-1 for the missing keys).
+    """
+    keys = numpy.broadcast_arrays(*[numpy.asarray(key, 'i8') for key in keys])
+
+    valid = numpy.ones(keys[0].shape, bool)
+    for key, size in zip(keys, index.shape):
+        valid &= (key >= 0) & (key < size)
+
+    retval = numpy.full(keys[0].shape, -1, 'i8')
+    retval[valid] = index[tuple(key[valid] for key in keys)]
+
+    return retval
+
+
+def _group_indices(keys, n_resolved):
+    """
+    Compute consecutive group indices of levels
+
+    :param ndarray keys: the key that identifies the group of each level
+    :param int n_resolved: the number of the first levels that are a group
+     on their own
+    :return: ndarray: the group indices of the levels
+    """
+    n_resolved = min(n_resolved, keys.size)
+    groups = numpy.arange(keys.size)
+    if keys.size > n_resolved:
+        _, inverse = numpy.unique(keys[n_resolved:], return_inverse=True)
+        groups[n_resolved:] = n_resolved + inverse
+    return groups
+
+
 class EnergyLevelsSpeciesBase(object):
     """
     Container class that holds energy levels data.
@@ -36,15 +251,89 @@ class EnergyLevelsSpeciesBase(object):
         """
         self.data = None
         """
-        the astropy table that holds the levels data
+        the LevelsTable that holds the levels data
         """
 
+        self.label_index = None
+        """dense lookup table of the row indices of the levels in self.data
+        indexed by the labels of the levels (-1 for labels that are not
+        levels). It is built by set_labels."""
+
     def set_labels(self):
         """
         Set the field self.data['label']. This method modifies
-        self.data['label'].
+        self.data['label'] and builds the lookup table self.label_index.
+        """
+        self.set_label_index()
+
+    def subset(self, indices):
+        """
+        Return the energy levels object of a subset of the levels
+
+        The labels of the levels are kept and the lookup tables of the new
+        object are rebuilt.
+
+        :param array_like indices: the indices of the levels to be kept
+        :return: EnergyLevelsSpeciesBase: a new object of the same class
+        """
+        retval = copy.copy(self)
+        retval.data = self.data.take(indices)
+        for attr in ['label_index', 'vj_index']:
+            if hasattr(retval, attr):
+                setattr(retval, attr, None)
+        return retval
+
+    def excitation_energies(self):
+        """
+        The excitation energies of the levels w.r.t the first level in J
+
+        :return: ndarray: |E - E[0]| in J
+        """
+        energies = self.data.energies_si
+        return numpy.fabs(energies - energies[0])
+
+    def group_by_energy(self, bins, n_resolved=0):
+        """
+        Group the levels in bins of excitation energy (e.g. to lump them into
+        superlevels, see frigus.reduction.LumpedDataSet)
+
+        :param Quantity bins: the edges of the bins of the excitation energy
+         (in energy or temperature units). The levels above the last edge
+         are put in the last bin and the ones below the first edge in the
+         first bin.
+        :param int n_resolved: the number of the lowest levels that are not
+         grouped, i.e. each of these is a group on its own.
+        :return: ndarray: the index of the group of each level. The groups
+         are numbered consecutively starting from the resolved levels.
+        """
+        edges = bins.to(u.J, equivalencies=u.temperature_energy()).value
+        bin_indices = numpy.clip(
+            numpy.searchsorted(edges, self.excitation_energies(),
+                               side='right') - 1,
+            0, max(edges.size - 2, 0)
+        )
+        return _group_indices(bin_indices, n_resolved)
+
+    def set_label_index(self):
         """
-        pass
+        Build the lookup table self.label_index from self.data['label']
+        """
+        labels = numpy.asarray(self.data['label'], 'i8')
+        self.label_index = _dense_index(labels[numpy.newaxis, :], 'labels')
+
+    def find_labels(self, labels):
+        """
+        Find the row indices of levels from their labels
+
+        The lookup is O(1) per label through self.label_index.
+
+        :param array_like labels: the labels of the levels
+        :return: ndarray: the indices of the levels in self.data. The labels
+         that are not found are mapped to -1.
+        """
+        if self.label_index is None:
+            self.set_label_index()
+        return _lookup(self.label_index, labels)
 
 
 class EnergyLevelsOnDegreeOfFreedom(EnergyLevelsSpeciesBase):
@@ -61,14 +350,23 @@ class EnergyLevelsOnDegreeOfFreedom(EnergyLevelsSpeciesBase):
         """
         super(EnergyLevelsOnDegreeOfFreedom, self).__init__(*args, **kwargs)
 
-        table_type = {
-            level_name: numpy.zeros(n_levels, 'i4'),
-            'g': numpy.zeros(n_levels, 'i4'),
-            'label': numpy.zeros(n_levels, 'i4'),
-            'E': numpy.zeros(n_levels, 'f8') * energy_unit
-        }
-        self.data = QTable(dict(**table_type))
-        """the astropy table that holds the levels data"""
+        self.data = LevelsTable(
+            [(level_name, 'i4'), ('g', 'i4'), ('label', 'i4'), ('E', 'f8')],
+            n_levels,
+            units={'E': energy_unit}
+        )
+        """the LevelsTable that holds the levels data"""
+
+        self.level_name = level_name
+        """the name of the quantum number of the levels"""
+
+    def set_labels(self):
+        """
+        set the field self.data['label'] to the quantum number of the levels
+        and build the lookup table self.label_index
+        """
+        self.data['label'] = self.data[self.level_name]
+        self.set_label_index()
 
 
 class EnergyLevelsMolecule(EnergyLevelsSpeciesBase):
@@ -84,15 +382,13 @@ class EnergyLevelsMolecule(EnergyLevelsSpeciesBase):
         """
         super(EnergyLevelsMolecule, self).__init__(n_levels, *args, **kwargs)
 
-        table_type = {
-            'v': numpy.zeros(n_levels, 'i4'),
-            'j': numpy.zeros(n_levels, 'i4'),
-            'g': numpy.zeros(n_levels, 'i4'),
-            'label': numpy.zeros(n_levels, 'i4'),
-            'E': numpy.zeros(n_levels, 'f8') * energy_unit
-        }
-        self.data = QTable(dict(**table_type))
-        """the astropy table that holds the levels data"""
+        self.data = LevelsTable(
+            [('v', 'i4'), ('j', 'i4'), ('g', 'i4'), ('label', 'i4'),
+             ('E', 'f8')],
+            n_levels,
+            units={'E': energy_unit}
+        )
+        """the LevelsTable that holds the levels data"""
 
         self.v_max_allowed = None
         """The maximum value of v that is allowed. This could be higher or
@@ -102,10 +398,16 @@ class EnergyLevelsMolecule(EnergyLevelsSpeciesBase):
         """The maximum value of j that is allowed. This could be higher or
         lower than the values in self.data['j']"""
 
+        self.vj_index = None
+        """dense lookup table of the row indices of the levels in self.data
+        indexed by [v, j] (-1 for (v, j) pairs that are not levels). It is
+        built by set_labels."""
+
     def set_labels(self, v_max=None):
         """
         set the field self.data['label']. This method modifies
-        self.data['label'] and self.v_max_allowed
+        self.data['label'] and self.v_max_allowed and builds the lookup tables
+        self.label_index and self.vj_index.
 
         :param v_max: The maximum value of v to be used in computing and
          setting the labels.
@@ -115,3 +417,47 @@ class EnergyLevelsMolecule(EnergyLevelsSpeciesBase):
         self.data['label'] = utils.linear_2d_index(self.data['v'],
                                                    self.data['j'],
                                                    n_i=v_max)
+        self.set_label_index()
+        self.set_vj_index()
+
+    def set_vj_index(self):
+        """
+        Build the lookup table self.vj_index from self.data['v'] and
+        self.data['j']
+        """
+        self.vj_index = _dense_index(
+            numpy.vstack((self.data['v'], self.data['j'])).astype('i8'),
+            '(v, j) pairs'
+        )
+
+    def group_by_v(self, n_resolved=0):
+        """
+        Group the levels by vibrational band (e.g. to lump the highly excited
+        levels into superlevels, see frigus.reduction.LumpedDataSet)
+
+        :param int n_resolved: the number of the lowest levels that are not
+         grouped, i.e. each of these is a group on its own.
+        :return: ndarray: the index of the group of each level. The groups
+         are numbered consecutively starting from the resolved levels.
+        """
+        return _group_indices(numpy.asarray(self.data['v']), n_resolved)
+
+    def find(self, v, j):
+        """
+        Find the row indices of levels from their quantum numbers
+
+        The lookup is O(1) per level through self.vj_index.
+
+        .. code-block:: python
+
+            # the indices of the levels (0, 1) and (1, 3) in levels.data
+            inds = levels.find([0, 1], [1, 3])
+
+        :param array_like v: the vibrational quantum numbers
+        :param array_like j: the rotational quantum numbers (same shape as v)
+        :return: ndarray: the indices of the levels in self.data. The (v, j)
+         pairs that are not found are mapped to -1.
+        """
+        if self.vj_index is None:
+            self.set_vj_index()
+        return _lookup(self.vj_index, v, j)
@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+
+#    uncertainty.py is part of Frigus.
+
+#    Frigus: software to compure the energy exchange in a multi-level system
+#    Copyright (C) 2016-2018 Mher V. Kazandjian and Carla Maria Coppola
+
+#    Frigus is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, version 3 of the License.
+#
+#    Frigus is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+
+#    You should have received a copy of the GNU General Public License
+#    along with Frigus.  If not, see <http://www.gnu.org/licenses/>.
+"""
+module that implements the Monte Carlo propagation of the uncertainties of
+the rate coefficients (K_dex and A) through the steady state populations and
+the cooling function.
+
+Each realization is a copy of the data set whose rate coefficients are
+multiplied by log-normally distributed factors. The factors are drawn once
+(see RateFactors) and they are used at all the points of a grid, i.e. the
+uncertainties of the data are treated as systematic. At each point the
+M matrices of all the realizations are built as a single stack and solved
+with one call to frigus.solvers.linear.solve_equilibrium_batch.
+"""
+import numpy
+from numpy import fabs
+
+from astropy import units as u
+
+from frigus.population import (compute_degeneracy_matrix,
+                               compute_boltzmann_factors,
+                               photon_occupation_number,
+                               _collider_densities)
+from frigus.solvers.linear import solve_equilibrium_batch
+
+
+def _random_state(random_state):
+    """
+    :param None|int|RandomState random_state: a random state or a seed
+    :return: RandomState
+    """
+    if isinstance(random_state, numpy.random.RandomState):
+        return random_state
+    else:
+        return numpy.random.RandomState(random_state)
+
+
+class RateFactors(object):
+    """
+    The log-normal factors by which the rate coefficients of the
+    realizations of a data set are multiplied
+
+    The uncertainties are specified as multiplicative error factors, i.e. an
+    error factor f means that the logarithm of the rate coefficient has a
+    standard deviation of ln(f). The median of the perturbed rate
+    coefficients is the nominal value. The factors of the de-excitation rates
+    are applied to K_dex and the excitation rates follow from the detailed
+    balance.
+
+    .. code-block:: python
+
+        factors = RateFactors.draw(data_set, 1000, k_dex_error=2.0,
+                                   a_error=1.1, random_state=0)
+    """
+    def __init__(self, a_factors, k_dex_factors):
+        """
+        Constructor
+
+        :param ndarray a_factors: the factors of the A matrix of shape
+         (n_samples, n, n)
+        :param dict k_dex_factors: the factors of the K_dex matrices of shape
+         (n_samples, n, n) keyed by the name of the collider
+        """
+        self.a_factors = a_factors
+        """the factors of the Einstein coefficients"""
+
+        self.k_dex_factors = k_dex_factors
+        """the factors of the K_dex matrices keyed by the collider"""
+
+    @property
+    def n_samples(self):
+        """the number of realizations"""
+        return self.a_factors.shape[0]
+
+    @classmethod
+    def draw(cls,
+             data_set,
+             n_samples,
+             k_dex_error=2.0,
+             a_error=1.0,
+             random_state=None):
+        """
+        Draw the factors of the realizations of a data set
+
+        :param DataSetBase data_set: the data set
+        :param int n_samples: the number of realizations
+        :param float|array_like|dict k_dex_error: the error factor of the
+         K_dex coefficients, a scalar, an (n, n) array of the error factors
+         of the individual transitions or a dict of those keyed by the name
+         of the collider (the colliders not in the dict are not perturbed).
+        :param float|array_like a_error: the error factor of the Einstein
+         coefficients, a scalar or an (n, n) array.
+        :param None|int|RandomState random_state: the random state or a seed
+        :return: RateFactors
+        """
+        random_state = _random_state(random_state)
+        n_levels = data_set.a_matrix.shape[0]
+        shape = (n_samples, n_levels, n_levels)
+
+        def draw_factors(error):
+            sigma = numpy.log(numpy.asarray(error, 'f8'))
+            if (sigma < 0.0).any():
+                raise ValueError('the error factors should be >= 1')
+            return numpy.exp(sigma * random_state.standard_normal(shape))
+
+        colliders = sorted(data_set.k_dex_matrix_interpolators)
+        if not isinstance(k_dex_error, dict):
+            k_dex_error = {collider: k_dex_error for collider in colliders}
+
+        unknown = set(k_dex_error) - set(colliders)
+        if len(unknown) > 0:
+            raise ValueError('no collisional data for the collider(s) '
+                             '{}'.format(sorted(unknown)))
+
+        return cls(
+            draw_factors(a_error),
+            {
+                collider: draw_factors(k_dex_error.get(collider, 1.0))
+                for collider in colliders
+            }
+        )
+
+
+class CoolingRateSamples(object):
+    """
+    The cooling rates and the populations of the realizations of a data set
+    at a single point (kinetic temperature, radiation temperature, density)
+    """
+    def __init__(self, cooling_rates, populations):
+        """
+        Constructor
+
+        :param Quantity cooling_rates: the cooling rates of the realizations
+        :param ndarray populations: the fractional population densities of
+         the realizations of shape (n_samples, n_levels)
+        """
+        self.cooling_rates = cooling_rates
+        """the cooling rates of the realizations"""
+
+        self.populations = populations
+        """the population densities of the realizations"""
+
+    def cooling_rate_percentiles(self, q=(16.0, 50.0, 84.0)):
+        """
+        :param array_like q: the percentiles in [0, 100]
+        :return: Quantity: the percentiles of the cooling rate
+        """
+        return numpy.percentile(self.cooling_rates.value, q) * \
+            self.cooling_rates.unit
+
+    def population_percentiles(self, q=(16.0, 50.0, 84.0)):
+        """
+        :param array_like q: the percentiles in [0, 100]
+        :return: ndarray: the percentiles of the population densities of
+         the levels of shape (len(q), n_levels)
+        """
+        return numpy.percentile(self.populations, q, axis=0)
+
+
+def cooling_rate_samples(data_set,
+                         t_kin,
+                         t_rad,
+                         collider_density,
+                         factors):
+    """
+    Compute the steady state cooling rates of the realizations of a data set
+
+    The M matrices of the realizations are built as one array of shape
+    (n_samples, n, n) from the nominal rate matrices (the same way as
+    population.compute_transition_rate_matrix) and solved as a batch.
+
+    :param DataSetBase data_set: the data set
+    :param Quantity t_kin: the kinetic temperature
+    :param Quantity t_rad: the radiation temperature
+    :param Quantity|dict collider_density: the density of the collider or a
+     dict of the densities of several colliders (see
+     population.compute_transition_rate_matrix).
+    :param RateFactors factors: the factors of the realizations
+    :return: CoolingRateSamples
+    """
+    energy_levels = data_set.energy_levels
+    a_matrix = data_set.a_matrix.si.value
+    upper, lower = numpy.nonzero(a_matrix)
+
+    energies = energy_levels.data.energies_si
+    delta_e = fabs(energies[:, numpy.newaxis] - energies[numpy.newaxis, :])
+
+    r_matrix = compute_degeneracy_matrix(energy_levels)
+    boltzmann_factors = compute_boltzmann_factors(energy_levels, t_kin)
+
+    occupation = numpy.zeros_like(a_matrix)
+    occupation[upper, lower] = photon_occupation_number(
+        delta_e[upper, lower], t_rad.to(u.K).value)
+
+    # the spontaneous and the stimulated rates
+    a_samples = a_matrix * factors.a_factors
+    a_f = a_samples * occupation
+    rates = a_samples + a_f + numpy.swapaxes(a_f, -1, -2) * r_matrix
+
+    # the collisional rates, the excitation rates are derived from the
+    # perturbed de-excitation rates through the detailed balance
+    n_k_dex = 0.0
+    k_dex_matrix_interpolators = data_set.k_dex_matrix_interpolators
+    for collider, density in sorted(
+            _collider_densities(data_set, collider_density).items()):
+        n_k_dex = n_k_dex + (
+            density.si.value *
+            k_dex_matrix_interpolators[collider](t_kin).si.value *
+            factors.k_dex_factors[collider]
+        )
+    rates += n_k_dex + numpy.swapaxes(n_k_dex, -1, -2) * r_matrix * \
+        boltzmann_factors
+
+    o_matrices = numpy.swapaxes(rates, -1, -2)
+    m_matrices = o_matrices - numpy.eye(a_matrix.shape[0]) * \
+        o_matrices.sum(axis=-2)[..., numpy.newaxis, :]
+
+    populations = solve_equilibrium_batch(m_matrices)
+
+    emitted_power = (a_samples * delta_e).sum(axis=-1)
+    cooling_rates = ((populations * emitted_power).sum(axis=-1) *
+                     u.J / u.s).to(u.erg / u.s)
+
+    return CoolingRateSamples(cooling_rates, populations)
+
+
+def cooling_rate_uncertainty(data_set,
+                             t_kin,
+                             t_rad,
+                             collider_density,
+                             n_samples=1000,
+                             k_dex_error=2.0,
+                             a_error=1.0,
+                             random_state=None):
+    """
+    Propagate the uncertainties of the rate coefficients to the cooling rate
+
+    .. code-block:: python
+
+        samples = cooling_rate_uncertainty(
+            DataLoader().load('H2_lique'), 1000.0 * u.K, 0.0 * u.K,
+            1e8 * u.m**-3, k_dex_error=2.0)
+        print(samples.cooling_rate_percentiles([16, 50, 84]))
+
+    :param DataSetBase data_set: the data set
+    :param Quantity t_kin: the kinetic temperature
+    :param Quantity t_rad: the radiation temperature
+    :param Quantity|dict collider_density: the density of the collider(s)
+    :param int n_samples: the number of realizations
+    :param float|array_like|dict k_dex_error: the error factor of the K_dex
+     coefficients (see RateFactors.draw)
+    :param float|array_like a_error: the error factor of the Einstein
+     coefficients (see RateFactors.draw)
+    :param None|int|RandomState random_state: the random state or a seed
+    :return: CoolingRateSamples
+    """
+    factors = RateFactors.draw(data_set, n_samples, k_dex_error=k_dex_error,
+                               a_error=a_error, random_state=random_state)
+
+    return cooling_rate_samples(data_set, t_kin, t_rad, collider_density,
+                                factors)
+
+
+def cooling_function_uncertainty(data_set,
+                                 t_kin,
+                                 collider_density,
+                                 t_rad=0.0 * u.K,
+                                 q=(16.0, 50.0, 84.0),
+                                 n_samples=1000,
+                                 k_dex_error=2.0,
+                                 a_error=1.0,
+                                 random_state=None):
+    """
+    Compute the percentiles of the cooling function on a grid
+
+    The same realizations of the data set are used at all the points of the
+    grid, i.e. the percentiles at each point are those of the cooling
+    functions of the realizations.
+
+    :param DataSetBase data_set: the data set
+    :param Quantity t_kin: the kinetic temperatures of the grid (1D)
+    :param Quantity collider_density: the collider densities of the grid (1D)
+    :param Quantity t_rad: the radiation temperature
+    :param array_like q: the percentiles in [0, 100]
+    :param int n_samples: the number of realizations
+    :param float|array_like|dict k_dex_error: the error factor of the K_dex
+     coefficients (see RateFactors.draw)
+    :param float|array_like a_error: the error factor of the Einstein
+     coefficients (see RateFactors.draw)
+    :param None|int|RandomState random_state: the random state or a seed
+    :return: Quantity: the percentiles of the cooling function in erg / s as
+     an array of shape (len(q), t_kin.size, collider_density.size)
+    """
+    t_kin = numpy.atleast_1d(t_kin.to(u.K))
+    collider_density = numpy.atleast_1d(collider_density.to(u.m**-3))
+
+    factors = RateFactors.draw(data_set, n_samples, k_dex_error=k_dex_error,
+                               a_error=a_error, random_state=random_state)
+
+    retval = numpy.zeros((len(q), t_kin.size, collider_density.size), 'f8')
+    for i, t_kin_i in enumerate(t_kin):
+        for j, density in enumerate(collider_density):
+            samples = cooling_rate_samples(data_set, t_kin_i, t_rad, density,
+                                           factors)
+            retval[:, i, j] = samples.cooling_rate_percentiles(q).value
+
+    return retval * u.erg / u.s
@@ -20,7 +20,6 @@
 import os
 from os.path import join, dirname, isdir
 import numpy
-from matplotlib import pyplot
 import frigus
 
 
@@ -76,7 +75,7 @@ def linear_2d_index(i, j, n_i=None):
 
 def find_matching_indices(v1, v2, check=True):
     """find indices in v1 of intersecting elements of v2 in v1. It is assumed
-     that all the entries is v2 are a subset of v1. The elements of v2 must
+     that all the entries is v2 are a subset of v1. The elements of v1 must
      be unique. The returned indices array
      (r) is the same size as v2, is such that :
 
@@ -93,7 +92,11 @@ def find_matching_indices(v1, v2, check=True):
     :param array v1: reference array
     :param array v2: array that will be looked up in v1
     :param bool check: checks whether the unique elements of v2 are a subset
-     of v1.
+     of v1 (a ValueError is raised if not). Otherwise the elements of v2
+     that are not in v1 are mapped to -1.
+
+    This is a shortcut to IndexMatcher(v1).find(v2), the matcher should be
+    used directly when several arrays are looked up in the same v1.
 
     .. see-also:: tests/test_find_matching_indices.py
 
@@ -149,31 +152,130 @@ def find_matching_indices(v1, v2, check=True):
         # changes other than replacing 7 with -9 would be transferred to v2
     """
 
-    # get the unique values in v1 along with the indices array that constructs
-    # v1u from v1, i.e v1u = v1[inds_rec_v1]
-    v1u, inds_rec_v1 = numpy.unique(v1, return_index=True)
-    assert v1u.size == v1.size
+    return IndexMatcher(v1).find(v2, check=check)
+
+
+class IndexMatcher(object):
+    """
+    Find the indices of values in a reference array of unique values
+
+    The reference array is sorted once when the matcher is constructed, then
+    any number of query arrays are resolved with numpy.searchsorted, i.e. in
+    O(log n) per query value without sorting the queries. This is useful
+    when many arrays are looked up in the same reference (e.g. the initial
+    and final levels of transitions).
+
+    .. code-block:: python
+
+        matcher = IndexMatcher([5, 1, 3, 7, 6, 8, -2])
 
-    # getting the unique elements of v2 and the array of indices to recover it
-    # from the unique values
-    v2u, inds_rec_v2_from_v2u = numpy.unique(v2, return_inverse=True)
+        print(matcher.match([7, -2, 3, 4]))
+        >>> [ 3  6  2 -1]
 
-    # indices of v1u that have matches in v1
-    inds_v1u_of_v2u_in_v1u = numpy.where(numpy.in1d(v1u, v2u))[0]
+        print(matcher.unmatched([7, -2, 3, 4, 9, 4]))
+        >>> [4 9]
+    """
+    def __init__(self, reference):
+        """
+        Constructor
+
+        :param array_like reference: the reference array. The elements should
+         be unique.
+        """
+        reference = numpy.asarray(reference)
+
+        self.sorter = numpy.argsort(reference, kind='mergesort')
+        """the indices that sort the reference array"""
+
+        self.sorted_reference = reference[self.sorter]
+        """the sorted reference array"""
+
+        if (self.sorted_reference[1:] == self.sorted_reference[:-1]).any():
+            raise ValueError('the elements of the reference array are not '
+                             'unique')
+
+    @property
+    def size(self):
+        """the number of elements in the reference array"""
+        return self.sorted_reference.size
+
+    def _positions(self, values):
+        """
+        :param ndarray values: the values to be looked up
+        :return: tuple: the positions of the values in the sorted reference
+         (clipped to the valid range) and a boolean array that is True where
+         the values are found.
+        """
+        positions = numpy.searchsorted(self.sorted_reference, values)
+        numpy.clip(positions, 0, max(self.size - 1, 0), out=positions)
+
+        if self.size == 0:
+            return positions, numpy.zeros(values.shape, bool)
+
+        found = self.sorted_reference[positions] == values
+        return positions, found
+
+    def match(self, values):
+        """
+        Find the indices of values in the reference array
+
+        :param array_like values: the values to be looked up (not necessarily
+         unique).
+        :return: ndarray: an array r of the same shape as values such that
+         reference[r] == values where the values are found and r == -1 where
+         they are not.
+        """
+        values = numpy.asarray(values)
+        positions, found = self._positions(values)
+
+        retval = numpy.full(values.shape, -1, 'i8')
+        retval[found] = self.sorter[positions[found]]
+        return retval
+
+    def unmatched(self, values):
+        """
+        Find the values that are not in the reference array
+
+        :param array_like values: the values to be looked up
+        :return: ndarray: the sorted unique values that are not found
+        """
+        values = numpy.asarray(values)
+        _, found = self._positions(values)
+        return numpy.unique(values[~found])
+
+    def find(self, values, check=True):
+        """
+        Find the indices of values that should all be in the reference array
+
+        :param array_like values: the values to be looked up
+        :param bool check: If True, raise a ValueError if some values are not
+         in the reference array. Otherwise these are mapped to -1.
+        :return: ndarray: the indices (see match)
+        """
+        retval = self.match(values)
+
+        if check is True and (retval < 0).any():
+            missing = self.unmatched(values)
+            raise ValueError(
+                '{} unique value(s) are not in the reference array, e.g. '
+                '{}'.format(missing.size, missing[:10].tolist())
+            )
+
+        return retval
 
-    # indices in v1 unique (that is also sorted) of elements in v2 with matches
-    # in v1
-    inds_v1_of_v2u_in_v1 = inds_v1u_of_v2u_in_v1u[inds_rec_v2_from_v2u]
-    # assert v1u[inds_v1_of_v2u_in_v1] == v2   # DEBUG
 
-    if check is True:
-        if inds_v1_of_v2u_in_v1.size != v2.size:
-            raise ValueError("not all unique entries in v2 are in v1")
+def import_pyplot():
+    """
+    Import matplotlib.pyplot on demand
 
-    # indices in v1 of elements in v2 with matches in v1 v1[r] = v2
-    inds_v1_of_v2_in_v1 = inds_rec_v1[inds_v1_of_v2u_in_v1]
+    matplotlib is needed only for plotting, so it is not imported by the
+    modules of frigus at load time (this keeps the import of frigus fast and
+    possible on nodes without a display).
 
-    return inds_v1_of_v2_in_v1
+    :return: module: matplotlib.pyplot
+    """
+    from matplotlib import pyplot
+    return pyplot
 
 
 def display_matrix(mat, levels, log=True):
@@ -192,6 +294,8 @@ def display_matrix(mat, levels, log=True):
     n, m = x.shape
     assert n == m
 
+    pyplot = import_pyplot()
+
     ii, jj = numpy.meshgrid(numpy.arange(0, n), numpy.arange(0, n))
     pyplot.pcolor(ii, jj, x)
     pyplot.gca().invert_yaxis()
@@ -6,8 +6,10 @@ from numpy.testing import assert_allclose
 from astropy import units as u
 
 from frigus.readers.dataset import DataLoader
-from frigus.population import population_density_at_steady_state
+from frigus.population import (population_density_at_steady_state,
+                               cooling_rate_at_steady_state)
 from frigus.solvers import analytic
+from frigus.solvers.linear import solve_equilibrium
 
 
 
@@ -127,3 +129,113 @@ def test_that_three_level_analytic_pop_dens_ratios_are_computed_correctly():
 
     assert relative_error.max() < 5.0e-15
     assert relative_error.std() < 6.0e-16
+
+
+def test_that_the_closed_forms_match_the_linear_solver_on_random_batches():
+
+    random_state = numpy.random.RandomState(0)
+    n_batch = 2000
+
+    for n_levels in [2, 3]:
+        # rates spanning several orders of magnitude
+        rates = 10.0 ** random_state.uniform(
+            -6.0, 6.0, (n_batch, n_levels, n_levels))
+        rates[:, numpy.arange(n_levels), numpy.arange(n_levels)] = 0.0
+
+        o_matrix = numpy.swapaxes(rates, -1, -2)
+        m_matrix = o_matrix - numpy.eye(n_levels) * \
+            o_matrix.sum(axis=-2)[..., numpy.newaxis, :]
+
+        x_analytic = analytic.solve_equilibrium_analytic(m_matrix)
+        assert x_analytic.shape == (n_batch, n_levels)
+
+        x_linear = numpy.array(
+            [solve_equilibrium(m.copy())[:, 0] for m in m_matrix])
+
+        # the linear solver loses a few digits for the rates that span many
+        # orders of magnitude while the closed forms satisfy the rate
+        # equations to round off
+        assert_allclose(x_analytic, x_linear, rtol=1e-5)
+
+        residual = numpy.einsum('...ij,...j->...i', m_matrix, x_analytic)
+        scale = numpy.einsum('...ij,...j->...i', numpy.fabs(m_matrix),
+                             x_analytic)
+        assert (numpy.fabs(residual) <= 1e-13 * scale).all()
+
+        # the M matrices are not modified by the closed forms
+        assert (m_matrix[:, 0, 0] < 0.0).all()
+
+    with pytest.raises(ValueError):
+        analytic.solve_equilibrium_analytic(numpy.eye(4))
+
+
+def test_that_the_analytic_solutions_are_dispatched_and_broadcast():
+
+    t_rad, n_c = 1000.0 * u.K, 1e6 * u.m ** -3
+
+    for name in ['two_level_1', 'three_level_1']:
+        species_data = DataLoader().load(name)
+
+        x_linear, diagnostics_linear = population_density_at_steady_state(
+            species_data, 3000.0 * u.K, t_rad, n_c, return_diagnostics=True)
+        x_auto, diagnostics = population_density_at_steady_state(
+            species_data, 3000.0 * u.K, t_rad, n_c, return_diagnostics=True,
+            method='auto')
+
+        assert diagnostics_linear.backend == 'lapack'
+        assert diagnostics.backend == 'analytic'
+        assert diagnostics.is_reliable()
+        assert x_auto.shape == x_linear.shape
+        assert_allclose(x_auto, x_linear, rtol=1e-12)
+
+        assert_allclose(
+            cooling_rate_at_steady_state(
+                species_data, 3000.0 * u.K, t_rad, n_c,
+                method='analytic').si.value,
+            cooling_rate_at_steady_state(
+                species_data, 3000.0 * u.K, t_rad, n_c).si.value,
+            rtol=1e-12)
+
+        # a sweep in the radiation temperature is solved at once
+        t_rad_array = [0.0, 100.0, 1000.0] * u.K
+        x_sweep = population_density_at_steady_state(
+            species_data, 3000.0 * u.K, t_rad_array, n_c, method='analytic')
+        for x, t in zip(x_sweep, t_rad_array):
+            assert_allclose(
+                x,
+                population_density_at_steady_state(
+                    species_data, 3000.0 * u.K, t, n_c)[:, 0],
+                rtol=1e-12)
+
+    with pytest.raises(ValueError):
+        population_density_at_steady_state(
+            DataLoader().load('HD_lipovka'), 300.0 * u.K, t_rad, n_c,
+            method='analytic')
+
+    # the ratios of the two level system broadcast over the temperatures and
+    # the densities
+    species_data = DataLoader().load('two_level_1')
+    t_kin = numpy.logspace(1.0, 4.0, 4)[:, numpy.newaxis] * u.K
+    n_c = numpy.logspace(4.0, 10.0, 3) * u.m ** -3
+
+    ratios = analytic.population_density_ratio_two_level(
+        species_data.energy_levels.data['g'],
+        species_data.energy_levels.data['E'],
+        species_data.k_dex_matrix_interpolator(t_kin)[1, 0],
+        species_data.a_matrix[1, 0],
+        n_c,
+        t_kin,
+        0.0 * u.K
+    )
+    assert ratios.shape == (4, 3)
+
+    x_0, x_1 = analytic.population_denisty_ratio_two_level_no_radiation(
+        species_data, t_kin, n_c)
+    assert_allclose((x_1 / x_0).si.value, ratios.si.value, rtol=1e-12)
+
+    for i, t in enumerate(t_kin[:, 0]):
+        for j, n in enumerate(n_c):
+            x = population_density_at_steady_state(
+                species_data, t, 0.0 * u.K, n)
+            assert_allclose(x[1, 0] / x[0, 0], ratios[i, j].si.value,
+                            rtol=1e-10)
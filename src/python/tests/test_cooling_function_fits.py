@@ -1,10 +1,12 @@
 from __future__ import print_function
+import pytest
 import numpy
 from numpy.testing import assert_allclose
 from astropy import units as u
 from frigus.cooling_function.fits import (fit_lipovka,
                                           fit_glover,
-                                          fit_lipovka_low_density)
+                                          fit_lipovka_low_density,
+                                          fit_coppola)
 
 
 def test_that_glover_cooling_function_fit_is_computed_correctly():
@@ -25,6 +27,53 @@ def test_that_glover_cooling_function_fit_is_computed_correctly():
         atol=0.0
     )
 
+
+def test_that_glover_cooling_function_fit_is_vectorized():
+
+    # the edges of the segments are included
+    t_kin = numpy.sort(
+        numpy.hstack((numpy.linspace(100.0, 6000.0, 999), 1000.0)))
+
+    computed_values = fit_glover(t_kin)
+
+    # the explicit expansion of the piecewise polynomials of the fit
+    lt_kin = numpy.log10(t_kin / 1000.0)
+    expected_values = numpy.where(
+        t_kin <= 1000.0,
+        10.0**(-24.311209
+               + 3.5692468 * lt_kin
+               - 11.332860 * lt_kin**2
+               - 27.850082 * lt_kin**3
+               - 21.328264 * lt_kin**4
+               - 4.2519023 * lt_kin**5),
+        10.0**(-24.311209
+               + 4.6450521 * lt_kin
+               - 3.7209846 * lt_kin**2
+               + 5.9369081 * lt_kin**3
+               - 5.5108047 * lt_kin**4
+               + 1.5538288 * lt_kin**5)
+    )
+
+    assert computed_values.shape == t_kin.shape
+    assert_allclose(
+        computed_values.cgs.value,
+        expected_values,
+        rtol=1e-13,
+        atol=0.0
+    )
+
+    # quantities and 2D arrays are accepted too
+    assert_allclose(
+        fit_glover(t_kin.reshape(10, 100) * u.K).cgs.value.flatten(),
+        computed_values.cgs.value,
+        rtol=1e-14,
+        atol=0.0
+    )
+
+    with pytest.raises(ValueError):
+        fit_glover(numpy.array([500.0, 7000.0]))
+
+
 def test_that_lipovka_cooling_function_fit_is_computed_correctly():
 
     t_kin = numpy.linspace(100.0, 2000.0, 3) * u.K
@@ -56,3 +105,54 @@ def test_that_lipovka_cooling_low_density_function_fit_is_computed_correctly():
         rtol=1e-6,
         atol=0.0
     )
+
+
+def test_that_coppola_cooling_function_fit_broadcasts_over_grids():
+
+    t_kin = numpy.linspace(100.0, 5000.0, 7) * u.K
+    n_h = numpy.logspace(6.0, 14.0, 5) * u.m**-3
+
+    computed_values = fit_coppola(t_kin[:, numpy.newaxis],
+                                  n_h[numpy.newaxis, :])
+
+    # the explicit expansion of the polynomial for a single point
+    lt_kin = numpy.log10(t_kin[3].value)
+    ln_h = numpy.log10(n_h[2].cgs.value)
+    coefficients = numpy.array(
+        [
+            [-2.82483125e2, -1.34604375e2, 1.07432776e2, -2.04446787e1,
+             1.17030794e0],
+            [3.92355880e2, 2.15639291e2, -1.68827762e2, 3.18279345e1,
+             -1.80956442e0],
+            [-2.26543263e2, -1.26554822e2, 9.80765328e1, -1.83570655e1,
+             1.03763936e0],
+            [5.80077743e1, 3.25577420e1, -2.50129961e1, 4.65210999e0,
+             -2.61574544e-1],
+            [-5.50713938e0, -3.10446347e0, 2.36722261e0, -4.37732460e-1,
+             2.44900752e-2],
+        ]
+    )
+    expected_value = 10.0**sum(
+        coefficients[i, j] * lt_kin**i * ln_h**j
+        for i in range(5) for j in range(5)
+    )
+
+    assert computed_values.shape == (7, 5)
+    assert_allclose(
+        computed_values[3, 2].cgs.value, expected_value, rtol=1e-10, atol=0.0
+    )
+
+
+def test_that_out_of_range_fit_inputs_raise_value_error():
+
+    with pytest.raises(ValueError):
+        fit_lipovka(
+            numpy.array([100.0, 3000.0]) * u.K,
+            numpy.array([1e6, 1e6]) * u.m**-3
+        )
+
+    with pytest.raises(ValueError):
+        fit_coppola(1000.0 * u.K, 1e15 * u.m**-3)
+
+    with pytest.raises(TypeError):
+        fit_coppola(1000.0, 1e10 * u.m**-3)
@@ -0,0 +1,379 @@
+from __future__ import print_function
+import numpy
+import pytest
+from numpy.testing import assert_allclose
+
+from astropy import units as u
+
+from frigus.readers.dataset import DataLoader
+from frigus.population import cooling_rate_at_steady_state
+from frigus.cooling_function.grid import CoolingFunctionGrid
+from frigus.cooling_function.adaptive import AdaptiveCoolingFunctionGrid
+from frigus.cooling_function.fits import LIPOVKA_FIT
+from frigus.cooling_function.fitting import fit_cooling_function_grid
+from frigus.cooling_function.storage import (GridStore,
+                                             GridArrayView,
+                                             open_grid_store)
+
+
+def test_that_the_grid_diagnostics_are_aggregated_for_all_points():
+
+    grid = CoolingFunctionGrid()
+    grid.set_species(DataLoader().load('two_level_1'))
+    grid.set_density(numpy.logspace(2.0, 10.0, 5) * u.m ** -3)
+    grid.set_t_kin(numpy.logspace(1.0, 4.0, 4) * u.K)
+    grid.set_t_rad(0.0 * u.K)
+
+    cooling_function = grid.compute()
+
+    assert grid.diagnostics.shape == cooling_function.shape
+    assert numpy.isfinite(grid.diagnostics.condition_number).all()
+    assert not grid.diagnostics.unreliable().any()
+
+    summary = grid.diagnostics.summary()
+    assert summary['n_points'] == cooling_function.size
+    assert summary['n_unreliable'] == 0
+    assert summary['backends'] == {'lapack': cooling_function.size}
+
+
+def test_that_a_polynomial_fit_is_recovered_from_a_grid():
+
+    grid = CoolingFunctionGrid()
+    grid.set_density(numpy.logspace(6.0, 14.0, 9) * u.m ** -3)
+    grid.set_t_kin(numpy.logspace(2.0, 3.3, 8) * u.K)
+    grid.set_t_rad(0.0 * u.K)
+
+    # the cooling function is set to the Lipovka fit instead of computing it
+    grid._compute_mesh()
+    grid.cooling_function = LIPOVKA_FIT(grid.t_kin_grid, grid.n_grid).value
+
+    fit = fit_cooling_function_grid(grid, degree=4)
+
+    assert_allclose(fit.coefficients, LIPOVKA_FIT.coefficients,
+                    rtol=1e-6, atol=1e-8)
+    assert fit.max_error < 1e-10
+    assert fit.rms_error <= fit.max_error
+
+    assert_allclose(
+        fit(grid.t_kin_grid, grid.n_grid).value,
+        grid.cooling_function,
+        rtol=1e-9
+    )
+
+
+def test_that_a_computed_grid_is_fit_with_a_polynomial():
+
+    grid = CoolingFunctionGrid()
+    grid.set_species(DataLoader().load('HD_lipovka'))
+    grid.set_density(numpy.logspace(6.0, 14.0, 5) * u.m ** -3)
+    grid.set_t_kin(numpy.logspace(2.0, 3.3, 6) * u.K)
+    grid.set_t_rad(0.0 * u.K)
+    grid.compute()
+
+    fit = fit_cooling_function_grid(grid, degree=(4, 3))
+
+    assert fit.coefficients.shape == (5, 4)
+    assert fit.max_error < 0.2
+    assert fit.rms_error < fit.max_error
+
+    relative_error = numpy.fabs(
+        numpy.log10(fit(grid.t_kin_grid, grid.n_grid).value) -
+        numpy.log10(grid.cooling_function)
+    )
+    assert_allclose(relative_error.max(), fit.max_error, rtol=1e-6)
+
+
+def test_that_the_mesh_follows_the_axes_between_computations():
+
+    grid = CoolingFunctionGrid()
+    grid.set_species(DataLoader().load('HD_lipovka'))
+    grid.set_density(numpy.logspace(6.0, 14.0, 3) * u.m ** -3)
+    grid.set_t_kin(numpy.logspace(2.0, 3.3, 4) * u.K)
+    grid.set_t_rad(0.0 * u.K)
+    grid.compute()
+    fit_cooling_function_grid(grid, degree=(2, 2))
+
+    grid.set_density(numpy.logspace(6.0, 14.0, 5) * u.m ** -3)
+    grid.compute()
+
+    assert grid.cooling_function.shape == (4, 5)
+
+    # the mesh is not built by compute, the fit rebuilds it
+    fit = fit_cooling_function_grid(grid, degree=(2, 2))
+    assert grid.n_grid.shape == (4, 5)
+    assert_allclose(grid.n_grid[0].value, grid.n.value)
+    assert_allclose(
+        fit(grid.t_kin_grid, grid.n_grid).value.shape, (4, 5))
+
+    # the fit recomputes a grid whose axes changed after it was computed
+    grid.set_t_kin(numpy.logspace(2.0, 3.3, 6) * u.K)
+    fit_cooling_function_grid(grid, degree=(2, 2))
+    assert grid.cooling_function.shape == (6, 5)
+
+    # the axis changes but keeps its length
+    grid.set_t_kin(numpy.logspace(2.5, 3.3, 6) * u.K)
+    fit_cooling_function_grid(grid, degree=(2, 2))
+    assert_allclose(
+        grid.cooling_function[0, 0],
+        cooling_rate_at_steady_state(
+            grid.species, 10.0**2.5 * u.K, 0.0 * u.K,
+            grid.n[0]).cgs.value,
+        rtol=1e-12)
+
+    matplotlib = pytest.importorskip('matplotlib')
+    matplotlib.use('Agg')
+    grid.plot_2d(show=False)
+    matplotlib.pyplot.close('all')
+
+
+def test_that_the_adaptive_grid_rejects_non_positive_cooling_rates():
+
+    # the populations of the excited level underflow at a few K, i.e. the
+    # cooling rate is zero and its log10 can not be interpolated
+    grid = AdaptiveCoolingFunctionGrid()
+    grid.set_species(DataLoader().load('two_level_1'))
+    grid.set_density_range([1e2, 1e14] * u.m ** -3)
+    grid.set_t_kin_range([1.0, 1e3] * u.K)
+    grid.set_t_rad(0.0 * u.K)
+    grid.initial_shape = (2, 2)
+    grid.max_level = 2
+
+    with pytest.raises(ValueError):
+        grid.compute()
+
+    # a non finite deviation refines the cell instead of being skipped by
+    # the comparison with the tolerance
+    grid.set_t_kin_range([1e3, 1e5] * u.K)
+    grid.points = {(1, 0): numpy.nan}
+    assert grid._cell_error(0, 0, 2) == numpy.inf
+
+
+def test_that_the_adaptive_grid_refines_within_tolerance(tmpdir):
+
+    species_data = DataLoader().load('two_level_1')
+
+    grid = AdaptiveCoolingFunctionGrid()
+    grid.set_species(species_data)
+    grid.set_density_range([1e2, 1e14] * u.m ** -3)
+    grid.set_t_kin_range([1e3, 1e5] * u.K)
+    grid.set_t_rad(0.0 * u.K)
+    grid.set_tolerance(0.05)
+    grid.initial_shape = (2, 2)
+    grid.max_level = 3
+    grid.compute()
+
+    # fewer solves than a uniform grid at the finest resolution
+    assert grid.n_solves < numpy.prod(grid.lattice_shape)
+
+    random_state = numpy.random.RandomState(0)
+    n = 10.0**random_state.uniform(2.0, 14.0, 20) * u.m ** -3
+    t_kin = 10.0**random_state.uniform(3.0, 5.0, 20) * u.K
+
+    interpolated = grid.evaluate(n, t_kin)
+    expected = u.Quantity(
+        [
+            cooling_rate_at_steady_state(species_data, t, 0.0 * u.K, n_c)
+            for n_c, t in zip(n, t_kin)
+        ]
+    )
+
+    assert numpy.fabs(
+        numpy.log10(interpolated.cgs.value / expected.cgs.value)
+    ).max() < 2.0 * grid.tolerance
+
+    # the values at the lattice points are reproduced exactly
+    assert_allclose(
+        grid.evaluate(1e2 * u.m ** -3, 1e5 * u.K).cgs.value,
+        cooling_rate_at_steady_state(
+            species_data, 1e5 * u.K, 0.0 * u.K, 1e2 * u.m ** -3).cgs.value,
+        rtol=1e-12
+    )
+
+    # the hierarchical table can be written and read back
+    fname = str(tmpdir.join('table.npz'))
+    grid.write(fname)
+    grid_read = AdaptiveCoolingFunctionGrid.read(fname)
+
+    assert_allclose(grid_read.evaluate(n, t_kin).value, interpolated.value,
+                    rtol=1e-14)
+
+
+def test_that_a_3d_grid_is_computed_in_chunks_and_streamed_to_disk(tmpdir):
+
+    species_data = DataLoader().load('two_level_1')
+
+    grid = CoolingFunctionGrid()
+    grid.set_species(species_data)
+    grid.set_density(numpy.logspace(2.0, 10.0, 3) * u.m ** -3)
+    grid.set_t_kin(numpy.logspace(2.0, 4.0, 4) * u.K)
+    grid.set_t_rad(numpy.array([0.0, 10.0]) * u.K)
+
+    assert grid.shape == (4, 3, 2)
+
+    cooling_function = grid.compute()
+
+    assert cooling_function.shape == (4, 3, 2)
+    assert grid.diagnostics.shape == (4, 3, 2)
+
+    # the ordering of the axes is the same as that of the mesh
+    grid._compute_mesh()
+    i_t_kin, i_n, i_t_rad = 3, 1, 1
+    assert_allclose(
+        cooling_function[i_t_kin, i_n, i_t_rad],
+        cooling_rate_at_steady_state(
+            species_data,
+            grid.t_kin_grid[i_t_kin, i_n, i_t_rad],
+            grid.t_rad_grid[i_t_kin, i_n, i_t_rad],
+            grid.n_grid[i_t_kin, i_n, i_t_rad]).cgs.value,
+        rtol=1e-12
+    )
+
+    path = str(tmpdir.join('grid'))
+    cooling_function_chunked = grid.compute(chunk_size=5, output=path)
+
+    assert_allclose(cooling_function_chunked, cooling_function, rtol=1e-14)
+
+    store = GridStore.open(path)
+    assert store.shape == (4, 3, 2)
+    assert_allclose(store.array('cooling_function')[5:10],
+                    cooling_function.flatten()[5:10], rtol=1e-14)
+
+
+def test_that_an_interrupted_grid_computation_is_resumed(tmpdir):
+
+    grid = CoolingFunctionGrid()
+    grid.set_species(DataLoader().load('two_level_1'))
+    grid.set_density(numpy.logspace(2.0, 10.0, 4) * u.m ** -3)
+    grid.set_t_kin(numpy.logspace(2.0, 4.0, 5) * u.K)
+    grid.set_t_rad(0.0 * u.K)
+
+    path = str(tmpdir.join('grid'))
+    expected = numpy.array(grid.compute(chunk_size=6, output=path))
+
+    # simulate an interruption after the first two chunks
+    store = GridStore.open(path, mode='r+')
+    store.write('completed', 12, 20, 0)
+    store.write('cooling_function', 12, 20, numpy.nan)
+    # mark the completed points to check that they are not recomputed
+    store.write('condition_number', 0, 12, -1.0)
+    store.close()
+
+    cooling_function = grid.compute(chunk_size=6, output=path, resume=True)
+
+    assert_allclose(cooling_function, expected, rtol=1e-14)
+    condition_number = grid.diagnostics.condition_number.flatten()
+    assert (condition_number[:12] == -1.0).all()
+    assert (condition_number[12:] > 0.0).all()
+    assert GridStore.open(path).array('completed').all()
+
+    # the checkpoint can not be resumed with a different grid
+    grid.set_t_kin(numpy.logspace(2.0, 4.5, 5) * u.K)
+    with pytest.raises(ValueError):
+        grid.compute(chunk_size=6, output=path, resume=True)
+
+
+def test_that_populations_and_diagnostics_are_stored_with_the_grid(tmpdir):
+
+    grid = CoolingFunctionGrid()
+    grid.set_species(DataLoader().load('three_level_1'))
+    grid.set_density(numpy.logspace(2.0, 10.0, 3) * u.m ** -3)
+    grid.set_t_kin(numpy.logspace(2.0, 4.0, 4) * u.K)
+    grid.set_t_rad(0.0 * u.K)
+
+    cooling_function = numpy.array(
+        grid.compute(populations=True, populations_dtype='f8'))
+    populations = grid.populations
+
+    assert populations.shape == (4, 3, 3)
+    assert_allclose(populations.sum(axis=-1), 1.0, rtol=1e-12)
+
+    path = str(tmpdir.join('grid'))
+    grid.compute(chunk_size=5, output=path, populations=True,
+                 populations_dtype='f8')
+
+    store = GridStore.open(path)
+    assert_allclose(store.read('populations', 5, 7),
+                    populations.reshape(-1, 3)[5:7], rtol=1e-14)
+    assert_allclose(store.grid_array('cooling_function'), cooling_function,
+                    rtol=1e-14)
+    assert (store.read('backend') == b'lapack').all()
+    assert grid.diagnostics.summary()['backends'] == {'lapack': 12}
+
+
+def test_that_a_grid_is_streamed_to_an_hdf5_file(tmpdir):
+
+    pytest.importorskip('h5py')
+
+    grid = CoolingFunctionGrid()
+    grid.set_species(DataLoader().load('two_level_1'))
+    grid.set_density(numpy.logspace(2.0, 10.0, 3) * u.m ** -3)
+    grid.set_t_kin(numpy.logspace(2.0, 4.0, 4) * u.K)
+    grid.set_t_rad(0.0 * u.K)
+
+    expected = numpy.array(grid.compute(populations=True))
+    populations = grid.populations
+
+    path = str(tmpdir.join('grid.h5'))
+    grid.compute(chunk_size=5, output=path, populations=True, resume=True)
+
+    # the results are views of the datasets that are read when sliced
+    assert isinstance(grid.cooling_function, GridArrayView)
+    assert isinstance(grid.diagnostics.condition_number, GridArrayView)
+    assert grid.populations.shape == (4, 3, 2)
+    assert_allclose(grid.populations[1:3, 2], populations[1:3, 2],
+                    rtol=1e-14)
+    assert_allclose(grid.cooling_function[..., 1], expected[..., 1],
+                    rtol=1e-14)
+    assert grid.diagnostics.backend.dtype.kind == 'S'
+    assert grid.diagnostics.summary()['backends'] == {'lapack': 12}
+    assert not grid.diagnostics.unreliable().any()
+    grid.store.close()
+
+    store = open_grid_store(path)
+    assert store.shape == (4, 3)
+    assert_allclose(store.grid_array('cooling_function'), expected,
+                    rtol=1e-14)
+    assert_allclose(store.array('populations')[2:4],
+                    populations.reshape(-1, 2)[2:4], rtol=1e-14)
+    assert store.read('completed').all()
+    store.close()
+
+
+def test_that_compact_populations_and_top_transitions_are_stored(tmpdir):
+
+    species_data = DataLoader().load('three_level_1')
+
+    grid = CoolingFunctionGrid()
+    grid.set_species(species_data)
+    grid.set_density(numpy.logspace(2.0, 10.0, 3) * u.m ** -3)
+    grid.set_t_kin(numpy.logspace(2.0, 4.0, 4) * u.K)
+    grid.set_t_rad(0.0 * u.K)
+
+    n_transitions = numpy.count_nonzero(species_data.a_matrix.value)
+
+    cooling_function = numpy.array(grid.compute(
+        populations=True,
+        top_transitions=n_transitions + 1))
+
+    assert grid.populations.dtype == numpy.float32
+    assert_allclose(grid.populations.sum(axis=-1), 1.0, rtol=1e-6)
+
+    # all the transitions are kept, the unused entry is flagged with -1
+    power = grid.transitions['power']
+    upper = grid.transitions['upper']
+    assert power.dtype == numpy.float32
+    assert (grid.transitions['upper'][..., -1] == -1).all()
+    assert (numpy.diff(power[..., :-1], axis=-1) <= 0.0).all()
+    assert_allclose(power.sum(axis=-1), cooling_function, rtol=1e-6)
+
+    # only the top transition
+    path = str(tmpdir.join('grid'))
+    grid.compute(output=path, top_transitions=1)
+
+    store = GridStore.open(path)
+    assert store.array('transitions_power').shape == (12, 1)
+    assert_allclose(store.grid_array('transitions_power')[..., 0],
+                    power[..., 0], rtol=1e-7)
+    assert_allclose(store.grid_array('transitions_upper')[..., 0],
+                    upper[..., 0])
+    assert 'populations' not in store.names
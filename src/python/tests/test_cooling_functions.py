@@ -1,8 +1,21 @@
 from __future__ import print_function
+import warnings
+
+import numpy
+import pytest
 from numpy.testing import assert_allclose
 from astropy import units as u
+from astropy.constants import c, h, k_B
 
-from frigus.population import cooling_rate_at_steady_state
+from frigus.population import (cooling_rate_at_steady_state,
+                               cooling_rate,
+                               cooling_rate_derivatives_at_steady_state,
+                               compute_delta_energy_matrix,
+                               compute_transition_rate_matrix,
+                               compute_b_j_nu_matrix_from_a_matrix,
+                               critical_densities,
+                               population_density_at_steady_state,
+                               population_density_lte)
 from frigus.readers.dataset import DataLoader
 
 
@@ -76,3 +89,242 @@ def test_that_the_lique_cooling_function_is_computed_correctly():
         cooling_rate_expected.cgs.value,
         rtol=2e-6, atol=0.0
     )
+
+
+def test_that_the_cooling_rate_is_computed_from_the_emitted_power_vector():
+
+    species_data = DataLoader().load('H2_lique')
+    n_levels = species_data.a_matrix.shape[0]
+
+    delta_e = numpy.fabs(
+        compute_delta_energy_matrix(species_data.energy_levels))
+
+    random_state = numpy.random.RandomState(0)
+    populations = random_state.uniform(0.0, 1.0, (5, n_levels))
+
+    # the emitted power vector is cached by the dataset
+    assert species_data.emitted_power is species_data.emitted_power
+
+    rates = cooling_rate(populations,
+                         species_data.energy_levels,
+                         species_data.a_matrix)
+    assert rates.shape == (5,)
+
+    for x, rate in zip(populations, rates):
+        expected = (species_data.a_matrix * delta_e * x.reshape(-1, 1)).sum()
+        assert_allclose(rate.to(u.erg / u.s).value,
+                        expected.to(u.erg / u.s).value, rtol=1e-12)
+
+        rate_column = cooling_rate(
+            x.reshape(-1, 1),
+            species_data.energy_levels,
+            species_data.a_matrix,
+            emitted_power=species_data.emitted_power)
+        assert_allclose(rate_column.value, rate.value, rtol=1e-14)
+
+
+def test_that_the_cooling_rate_derivatives_match_finite_differences():
+
+    t_rad = 0.0 * u.K
+
+    for name, t_kin, nc_h in [('HD_lipovka', 530.0 * u.K, 1e8 * u.m ** -3),
+                              ('three_level_1', 3000.0 * u.K,
+                               1e6 * u.m ** -3)]:
+
+        species_data = DataLoader().load(name)
+
+        rate, drate_dt, drate_dn = cooling_rate_derivatives_at_steady_state(
+            species_data, t_kin, t_rad, nc_h)
+
+        assert_allclose(
+            rate.si.value,
+            cooling_rate_at_steady_state(
+                species_data, t_kin, t_rad, nc_h).si.value,
+            rtol=1e-12)
+
+        h = 1e-4
+        drate_dt_expected = (
+            cooling_rate_at_steady_state(
+                species_data, t_kin * (1 + h), t_rad, nc_h) -
+            cooling_rate_at_steady_state(
+                species_data, t_kin * (1 - h), t_rad, nc_h)
+        ) / (2.0 * h * t_kin)
+
+        drate_dn_expected = (
+            cooling_rate_at_steady_state(
+                species_data, t_kin, t_rad, nc_h * (1 + h)) -
+            cooling_rate_at_steady_state(
+                species_data, t_kin, t_rad, nc_h * (1 - h))
+        ) / (2.0 * h * nc_h)
+
+        assert_allclose(drate_dt.si.value, drate_dt_expected.si.value,
+                        rtol=1e-5)
+        assert_allclose(drate_dn.si.value, drate_dn_expected.si.value,
+                        rtol=1e-5)
+
+
+def test_that_the_rates_of_several_colliders_are_combined_in_a_single_m():
+
+    species_data = DataLoader().load('HD_lipovka_He')
+    assert sorted(species_data.k_dex_matrix_interpolators) == ['H', 'He']
+
+    t_kin, t_rad = 530.0 * u.K, 0.0 * u.K
+    n_h, n_he = 1e8 * u.m ** -3, 3e7 * u.m ** -3
+
+    def m_matrix(collider_density):
+        return compute_transition_rate_matrix(
+            species_data, t_kin, t_rad, collider_density).si.value
+
+    m_h = m_matrix(n_h)
+    assert_allclose(m_matrix({'H': n_h}), m_h, rtol=1e-14)
+
+    # the rates are linear in the densities of the colliders
+    m_h_he = m_matrix({'H': n_h, 'He': n_he})
+    m_he = m_matrix({'He': n_he}) - m_matrix({'He': 0.0 * u.m ** -3})
+    assert_allclose(m_h_he, m_h + m_he,
+                    rtol=1e-12, atol=1e-12 * abs(m_h).max())
+
+    # the derivatives w.r.t the density of each collider
+    densities = {'H': n_h, 'He': n_he}
+    rate, _, drate_dn = cooling_rate_derivatives_at_steady_state(
+        species_data, t_kin, t_rad, densities)
+
+    h = 1e-4
+    for collider in densities:
+        plus, minus = dict(densities), dict(densities)
+        plus[collider] = densities[collider] * (1 + h)
+        minus[collider] = densities[collider] * (1 - h)
+        expected = (
+            cooling_rate_at_steady_state(species_data, t_kin, t_rad, plus) -
+            cooling_rate_at_steady_state(species_data, t_kin, t_rad, minus)
+        ) / (2.0 * h * densities[collider])
+
+        assert_allclose(drate_dn[collider].si.value, expected.si.value,
+                        rtol=1e-5)
+
+    with pytest.raises(ValueError):
+        m_matrix({'e': n_h})
+
+
+def test_that_the_stimulated_rates_match_the_planck_function():
+
+    species_data = DataLoader().load('H2_lique')
+    energy_levels = species_data.energy_levels
+    a_matrix = species_data.a_matrix
+
+    delta_e = numpy.fabs(compute_delta_energy_matrix(energy_levels))
+    nu = (delta_e / h).to(u.Hz)
+    upper, lower = numpy.nonzero(a_matrix.value)
+
+    t_rad = [0.0, 50.0, 300.0, 3000.0] * u.K
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        b_j_nu = compute_b_j_nu_matrix_from_a_matrix(
+            energy_levels, a_matrix, t_rad)
+
+    assert b_j_nu.shape == (4,) + a_matrix.shape
+    assert (b_j_nu[0].value == 0.0).all()
+
+    for b_j_nu_t, t in zip(b_j_nu[1:], t_rad[1:]):
+        # B_ij * u_nu with the energy density of the black body radiation
+        # u_nu = (8 pi h nu^3 / c^3) / (exp(h nu / kb T) - 1)
+        b_e = a_matrix[upper, lower] / (8.0 * numpy.pi * h *
+                                        nu[upper, lower]**3 / c**3)
+        u_nu = (8.0 * numpy.pi * h * nu[upper, lower]**3 / c**3 /
+                numpy.expm1((h * nu[upper, lower] / (k_B * t)).si.value))
+
+        # B_lu = (g_u / g_l) * B_ul
+        r = (energy_levels.data['g'][upper] /
+             energy_levels.data['g'][lower])
+
+        assert_allclose(b_j_nu_t[upper, lower].si.value,
+                        (b_e * u_nu).si.value, rtol=1e-10)
+        assert_allclose(b_j_nu_t[lower, upper].si.value,
+                        (b_e * u_nu).si.value * r, rtol=1e-10)
+
+        assert_allclose(
+            b_j_nu_t.si.value,
+            compute_b_j_nu_matrix_from_a_matrix(
+                energy_levels, a_matrix, t).si.value,
+            rtol=1e-14)
+
+    # the M matrices of a sweep in the radiation temperature
+    m_matrices = compute_transition_rate_matrix(
+        species_data, 1000.0 * u.K, t_rad, 1e8 * u.m ** -3)
+
+    for m_matrix, t in zip(m_matrices, t_rad):
+        assert_allclose(
+            m_matrix.si.value,
+            compute_transition_rate_matrix(
+                species_data, 1000.0 * u.K, t, 1e8 * u.m ** -3).si.value,
+            rtol=1e-14)
+
+
+def test_that_the_lte_and_low_density_limits_are_used_deep_in_the_limits():
+
+    species_data = DataLoader().load('HD_lipovka')
+    t_kin, t_rad = 1000.0 * u.K, 0.0 * u.K
+
+    n_crit = critical_densities(species_data, t_kin, t_rad)
+    assert n_crit[0] == 0.0
+    assert (n_crit[1:] > 1e8 * u.m ** -3).all()
+    assert (n_crit[1:] < 1e12 * u.m ** -3).all()
+
+    def solve(collider_density, method):
+        x, diagnostics = population_density_at_steady_state(
+            species_data, t_kin, t_rad, collider_density,
+            return_diagnostics=True, method=method)
+        return x, diagnostics.backend
+
+    for collider_density, backend in [(1e-2 * u.m ** -3, 'low_density'),
+                                      (1e10 * u.m ** -3, 'lapack'),
+                                      (1e20 * u.m ** -3, 'lte')]:
+        x_auto, backend_auto = solve(collider_density, 'auto')
+        x_linear, backend_linear = solve(collider_density, 'linear')
+
+        assert backend_auto == backend
+        assert backend_linear == 'lapack'
+        assert_allclose(x_auto, x_linear, rtol=1e-6)
+        assert_allclose(
+            cooling_rate_at_steady_state(
+                species_data, t_kin, t_rad, collider_density,
+                method='auto').si.value,
+            cooling_rate_at_steady_state(
+                species_data, t_kin, t_rad, collider_density).si.value,
+            rtol=1e-6)
+
+    assert_allclose(
+        population_density_at_steady_state(
+            species_data, t_kin, t_rad, 1e20 * u.m ** -3, method='auto'),
+        population_density_lte(species_data.energy_levels, t_kin),
+        rtol=1e-15)
+
+    # the cooling rate is linear in the density in the low density limit
+    rate = cooling_rate_at_steady_state(
+        species_data, t_kin, t_rad, 1e-2 * u.m ** -3, method='auto')
+    assert_allclose(
+        cooling_rate_at_steady_state(
+            species_data, t_kin, t_rad, 2e-2 * u.m ** -3,
+            method='auto').si.value,
+        2.0 * rate.si.value,
+        rtol=1e-9)
+
+    # the low density limit does not apply with a radiation field
+    _, backend = population_density_at_steady_state(
+        species_data, t_kin, 100.0 * u.K, 1e-2 * u.m ** -3,
+        return_diagnostics=True, method='auto')
+    assert backend.backend == 'lapack'
+
+    # the ortho-para transitions of H2 are not radiative
+    _, backend = population_density_at_steady_state(
+        DataLoader().load('H2_lique'), t_kin, t_rad, 1e-2 * u.m ** -3,
+        return_diagnostics=True, method='auto')
+    assert backend.backend == 'lapack'
+
+    # an array of radiation temperatures is solved only in closed form
+    for method in ['auto', 'linear']:
+        with pytest.raises(ValueError, match='closed forms'):
+            population_density_at_steady_state(
+                species_data, t_kin, [0.0, 10.0] * u.K, 1e10 * u.m ** -3,
+                method=method)
@@ -1,6 +1,15 @@
 from __future__ import print_function
+import numpy
+from numpy.testing import assert_allclose
+
 import pytest
 
+from frigus import population
+from frigus.readers import dataset
+from frigus.readers.dataset import (DataLoader,
+                                    DataSetHDLipovka,
+                                    register_dataset)
+
 
 def test_that_reduce_einstein_coefficients_slow_works_correctly():
     pytest.skip('not implemented')
@@ -10,3 +19,65 @@ def test_that_reduce_einstein_coefficients_works_correctly():
     pytest.skip('not implemented')
 
 
+def test_that_reduce_collisional_coefficients_matches_the_slow_version():
+
+    for name, kwargs in [
+        ('H2_lique', {}),
+        ('HD_lipovka', DataSetHDLipovka.collisions_reduce_kwargs)
+    ]:
+        species_data = DataLoader().load(name)
+
+        expected = population.reduce_collisional_coefficients_slow(
+            species_data.raw_data.collision_rates_info_nnz,
+            species_data.energy_levels,
+            **kwargs
+        )
+
+        k_dex_matrix = population.reduce_collisional_coefficients(
+            species_data.raw_data.collision_rates_info_nnz,
+            species_data.energy_levels,
+            **kwargs
+        )
+
+        assert k_dex_matrix.unit == expected.unit
+        assert_allclose(k_dex_matrix.value, expected.value, rtol=0.0)
+
+
+def test_that_datasets_are_registered_and_discovered_by_entry_points(
+        monkeypatch):
+
+    class FakeEntryPoint(object):
+        name = 'HD_plugin'
+
+        @staticmethod
+        def load():
+            return DataSetHDLipovka
+
+    monkeypatch.setattr(dataset, '_registry', dict(dataset._registry))
+    monkeypatch.setattr(dataset, '_entry_points_loaded', False)
+    monkeypatch.setattr(dataset, '_iter_entry_points',
+                        lambda group: [FakeEntryPoint()])
+
+    @register_dataset('HD_spec')
+    class DataSetHDSpec(DataSetHDLipovka):
+        """the Lipovka data set declared through the spec"""
+
+    loader = DataLoader()
+    assert 'HD_plugin' in loader.availabe_datasets
+    assert 'H2_lique' in loader.availabe_datasets
+
+    species_data = loader.load('HD_spec')
+    assert isinstance(species_data, DataSetHDSpec)
+
+    assert_allclose(loader.load('HD_plugin').a_matrix.value,
+                    species_data.a_matrix.value)
+
+    with pytest.raises(ValueError):
+        loader.load('not_a_data_set')
+
+    # the H2 data of the low energy levels is reduced by the generic pipeline
+    species_data = loader.load('H2_low_energy_levels')
+    n_levels = len(species_data.energy_levels.data)
+    assert species_data.a_matrix.shape == (n_levels, n_levels)
+    assert numpy.isfinite(
+        species_data.k_dex_matrix_interpolator(1000.0).value).all()
@@ -0,0 +1,47 @@
+import os
+import sys
+import json
+import subprocess
+
+import frigus
+
+MODULES = [
+    'frigus.population',
+    'frigus.readers.dataset',
+    'frigus.solvers.linear',
+    'frigus.cooling_function.grid',
+    'frigus.cooling_function.adaptive',
+    'frigus.lines',
+]
+
+HEAVY_MODULES = ['matplotlib', 'mpmath', 'astropy.modeling']
+
+SCRIPT = '''
+import sys
+import json
+
+for module in {modules}:
+    __import__(module)
+
+print(json.dumps({{
+    'imported': [name for name in {heavy} if name in sys.modules]
+}}))
+'''
+
+
+def test_that_the_heavy_optional_modules_are_not_imported_eagerly():
+
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [os.path.dirname(os.path.dirname(frigus.__file__))] +
+        [path for path in [env.get('PYTHONPATH')] if path]
+    )
+
+    output = subprocess.check_output(
+        [sys.executable, '-c',
+         SCRIPT.format(modules=MODULES, heavy=HEAVY_MODULES)],
+        env=env
+    )
+    result = json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+    assert result['imported'] == []
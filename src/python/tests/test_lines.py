@@ -0,0 +1,74 @@
+from __future__ import print_function
+import numpy
+from numpy.testing import assert_allclose
+
+import pytest
+from astropy import units as u
+
+from frigus.population import (population_density_at_steady_state,
+                               cooling_rate)
+from frigus.readers.dataset import DataLoader
+from frigus.lines import LineList
+
+
+def test_that_the_line_emissivities_sum_to_the_cooling_rate():
+
+    species_data = DataLoader().load('HD_lipovka')
+    lines = LineList.from_dataset(species_data)
+
+    assert lines.n_lines == numpy.count_nonzero(species_data.a_matrix.value)
+    assert (numpy.diff(lines.frequency.value) >= 0.0).all()
+
+    populations = numpy.array([
+        population_density_at_steady_state(
+            species_data, t_kin, 0.0 * u.K, 1e8 * u.m ** -3).flatten()
+        for t_kin in [100.0, 500.0, 1000.0] * u.K
+    ])
+
+    emissivity = lines.emissivity(populations)
+    assert emissivity.shape == (3, lines.n_lines)
+
+    for x, line_emissivity in zip(populations, emissivity):
+        expected = cooling_rate(x.reshape(-1, 1),
+                                species_data.energy_levels,
+                                species_data.a_matrix)
+        assert_allclose(line_emissivity.sum().value,
+                        expected.to(u.erg / u.s).value, rtol=1e-12)
+
+    # the column vector of a single solution is accepted too
+    assert_allclose(lines.emissivity(populations[0].reshape(-1, 1)).value,
+                    emissivity[0].value, rtol=1e-14)
+
+    with pytest.raises(ValueError):
+        lines.emissivity(populations[:, 1:])
+
+
+def test_that_the_binned_spectrum_conserves_the_emitted_power():
+
+    species_data = DataLoader().load('HD_lipovka')
+    lines = LineList.from_dataset(species_data)
+
+    random_state = numpy.random.RandomState(0)
+    populations = random_state.uniform(0.0, 1.0, (4, 5, lines.n_levels))
+
+    emissivity = lines.emissivity(populations)
+
+    frequency_bins = numpy.logspace(
+        numpy.log10(lines.frequency.value.min()) - 0.1,
+        numpy.log10(lines.frequency.value.max()) + 0.1,
+        7) * u.Hz
+
+    spectrum = lines.spectrum(populations, frequency_bins)
+
+    assert spectrum.shape == (4, 5, 6)
+    assert_allclose(spectrum.sum(axis=-1).value,
+                    emissivity.sum(axis=-1).value, rtol=1e-12)
+
+    # the bins can be specified in wavelength and the lines outside the
+    # bins are ignored
+    wavelength_bins = u.Quantity(
+        [lines.wavelength.max().value * 1.1, lines.wavelength.max().value *
+         0.9], u.micron)
+    spectrum = lines.spectrum(populations, wavelength_bins)
+    assert_allclose(spectrum[..., 0].value, emissivity[..., 0].value,
+                    rtol=1e-12)
@@ -0,0 +1,38 @@
+from __future__ import print_function
+import logging
+
+from frigus.logs import get_logger, set_log_level, WarningAggregator
+
+
+def test_that_repeated_warnings_are_rate_limited_and_summarized(caplog):
+
+    aggregator = WarningAggregator(get_logger('frigus.test'), max_repeats=2)
+
+    with caplog.at_level(logging.WARNING, logger='frigus'):
+        for i in range(1000):
+            aggregator.warn('negative population densities', 'point %d', i)
+
+        # two warnings and one message announcing the suppression
+        assert len(caplog.records) == 3
+
+        counts = aggregator.log_summary()
+
+    assert counts == {'negative population densities': 1000}
+    assert caplog.records[-1].getMessage() == (
+        '1000 points had negative population densities'
+    )
+    assert aggregator.counts == {}
+
+
+def test_that_the_log_level_of_the_package_is_configurable(caplog):
+
+    aggregator = WarningAggregator(get_logger('frigus.test'))
+
+    set_log_level('ERROR')
+    try:
+        aggregator.warn('negative population densities', 'not shown')
+    finally:
+        set_log_level(logging.NOTSET)
+
+    assert len(caplog.records) == 0
+    assert aggregator.counts == {'negative population densities': 1}
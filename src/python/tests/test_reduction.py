@@ -0,0 +1,106 @@
+from __future__ import print_function
+import numpy
+from numpy.testing import assert_allclose
+from astropy import units as u
+
+import pytest
+
+from frigus.population import (cooling_rate_at_steady_state,
+                               population_density_at_steady_state)
+from frigus.readers.dataset import DataLoader
+from frigus.reduction import (TruncatedDataSet,
+                              LumpedDataSet,
+                              lump_levels,
+                              truncate_levels,
+                              truncation_errors)
+
+
+def test_that_the_levels_are_truncated_within_the_tolerance():
+
+    species_data = DataLoader().load('H2_lique')
+    n_levels_full = species_data.a_matrix.shape[0]
+
+    t_kin = numpy.logspace(2.0, 2.7, 3) * u.K
+    collider_density = numpy.logspace(6.0, 12.0, 3) * u.m ** -3
+    tolerance = 1e-3
+
+    reduced = truncate_levels(species_data,
+                              t_kin,
+                              collider_density,
+                              tolerance=tolerance)
+
+    assert reduced.n_levels < n_levels_full
+    assert reduced.a_matrix.shape == (reduced.n_levels, reduced.n_levels)
+    assert reduced.max_error <= tolerance
+
+    errors = truncation_errors(species_data, reduced.n_levels,
+                               t_kin, collider_density)
+    assert_allclose(errors.max(), reduced.max_error, rtol=1e-12)
+
+    # the number of levels is the smallest within the tolerance
+    errors = truncation_errors(species_data, reduced.n_levels - 1,
+                               t_kin, collider_density)
+    assert errors.max() > tolerance
+
+    # keeping all the levels reproduces the full data set
+    full = TruncatedDataSet(species_data, n_levels_full)
+    assert_allclose(
+        cooling_rate_at_steady_state(
+            full, 300.0 * u.K, 0.0 * u.K, 1e8 * u.m ** -3).si.value,
+        cooling_rate_at_steady_state(
+            species_data, 300.0 * u.K, 0.0 * u.K, 1e8 * u.m ** -3).si.value,
+        rtol=1e-12)
+
+    with pytest.raises(ValueError):
+        TruncatedDataSet(species_data, n_levels_full + 1)
+
+
+def test_that_the_levels_are_lumped_into_thermalized_superlevels():
+
+    species_data = DataLoader().load('H2_lique')
+    energy_levels = species_data.energy_levels
+    n_levels_full = species_data.a_matrix.shape[0]
+
+    groups = energy_levels.group_by_v(n_resolved=20)
+    assert (groups[:20] == numpy.arange(20)).all()
+    assert numpy.unique(groups[20:]).size == numpy.unique(
+        energy_levels.data['v'][20:]).size
+
+    # all the levels above the first 20 in a single bin
+    groups_e = energy_levels.group_by_energy([0.0, 1e6] * u.K, n_resolved=20)
+    assert (groups_e[20:] == 20).all()
+
+    t_lump = 1000.0 * u.K
+    reduced = LumpedDataSet(species_data, groups, t_lump)
+    n_levels = reduced.n_levels
+    assert n_levels < n_levels_full
+    assert reduced.a_matrix.shape == (n_levels, n_levels)
+    excitation_energies = reduced.energy_levels.excitation_energies()
+    assert (numpy.diff(excitation_energies) >= 0.0).all()
+
+    # the superlevels are exact in LTE at the lumping temperature
+    n_lte = 1e16 * u.m ** -3
+    assert_allclose(
+        cooling_rate_at_steady_state(
+            reduced, t_lump, 0.0 * u.K, n_lte).si.value,
+        cooling_rate_at_steady_state(
+            species_data, t_lump, 0.0 * u.K, n_lte).si.value,
+        rtol=1e-6)
+
+    x_full = population_density_at_steady_state(
+        species_data, t_lump, 0.0 * u.K, n_lte)
+    x_lumped = population_density_at_steady_state(
+        reduced, t_lump, 0.0 * u.K, n_lte)
+    assert_allclose(reduced.expand_populations(x_lumped), x_full[:, 0],
+                    rtol=1e-5, atol=1e-12)
+
+    # the error w.r.t the full solution is reported
+    reduced = lump_levels(species_data,
+                          groups,
+                          t_kin=[500.0, 1000.0, 2000.0] * u.K,
+                          collider_density=numpy.logspace(6, 16, 3) * u.m**-3)
+    assert reduced.t_lump == t_lump
+    assert 0.0 < reduced.max_error < 0.1
+
+    with pytest.raises(ValueError):
+        LumpedDataSet(species_data, groups[1:], t_lump)
@@ -34,4 +34,26 @@ def test_equilibrium_solver_snaity_3x3():
     assert_allclose(x, expected_x_values, rtol=1e-14, atol=0.0)
 
 
+def test_equilibrium_solver_returns_diagnostics():
 
+    m_matrix = numpy.array(
+        [
+            [0.2, 0.2, 0.2],
+            [1.0, -1.0, 1.0],
+            [3.0, -2.0, -9.0]
+        ]
+    )
+    x, diagnostics = solve_equilibrium(m_matrix, return_diagnostics=True)
+
+    expected_x_values = numpy.array([[11.0/24.0], [1.0/2.0], [1.0/24.0]])
+    assert_allclose(x, expected_x_values, rtol=1e-14, atol=0.0)
+
+    # the solver conditions m_matrix in place, the condition number estimate
+    # should be within a factor of 3 from the exact one of that system
+    assert diagnostics.condition_number >= numpy.linalg.cond(m_matrix, 1) / 3
+    assert diagnostics.condition_number <= numpy.linalg.cond(m_matrix, 1)
+    assert diagnostics.residual_norm < 1e-14
+    assert diagnostics.population_sum_error < 1e-14
+    assert diagnostics.n_negative == 0
+    assert diagnostics.backend == 'lapack'
+    assert diagnostics.is_reliable()
@@ -0,0 +1,100 @@
+from __future__ import print_function
+import numpy
+from numpy.testing import assert_allclose
+from astropy import units as u
+from astropy.table import QTable
+from astropy.constants import k_B
+
+import pytest
+
+from frigus.species import LevelsTable, EnergyLevelsMolecule
+from frigus.population import (compute_delta_energy_matrix,
+                               compute_degeneracy_matrix,
+                               compute_boltzmann_factors)
+
+
+def test_that_the_levels_table_caches_the_energies_in_si_units():
+
+    levels = LevelsTable([('j', 'i4'), ('g', 'i4'), ('E', 'f8')],
+                         n_levels=3,
+                         units={'E': u.eV})
+
+    assert len(levels) == 3
+    assert levels.colnames == ['j', 'g', 'E']
+
+    levels['j'] = [0, 1, 2]
+    levels['g'] = 2 * levels['j'] + 1
+    levels['E'] = [0.0, 10.0, 30.0] * u.K
+
+    # the unit of the assigned quantity is kept
+    assert levels['E'].unit == u.K
+    assert_allclose(levels.energies_si,
+                    ([0.0, 10.0, 30.0] * u.K).to(
+                        u.J, equivalencies=u.temperature_energy()).value)
+    assert levels.energies_si is levels.energies_si
+
+    # the columns with units can be changed only by assignment
+    with pytest.raises(ValueError):
+        levels['E'][0] = 1.0 * u.K
+
+    levels['E'] = [0.0, 1.0, 2.0] * u.eV
+    assert_allclose(levels.energies_si,
+                    ([0.0, 1.0, 2.0] * u.eV).to(u.J).value)
+
+    with pytest.raises(KeyError):
+        levels['v'] = [0, 0, 0]
+
+    table = levels.as_qtable()
+    assert isinstance(table, QTable)
+    assert_allclose(table['E'].to(u.eV).value, [0.0, 1.0, 2.0])
+    assert (table['g'] == [1, 3, 5]).all()
+
+
+def test_that_the_level_matrices_are_computed_from_the_levels_table():
+
+    levels = EnergyLevelsMolecule(4, energy_unit=u.eV)
+    levels.data['v'] = [0, 0, 0, 1]
+    levels.data['j'] = [0, 1, 2, 0]
+    levels.data['g'] = 2 * levels.data['j'] + 1
+    levels.data['E'] = [0.0, 0.01, 0.03, 0.5] * u.eV
+
+    energies = levels.data['E'].value
+    g = levels.data['g'].astype('f8')
+    t_kin = 300.0 * u.K
+
+    delta_e = compute_delta_energy_matrix(levels)
+    r_matrix = compute_degeneracy_matrix(levels)
+    boltzmann_factors = compute_boltzmann_factors(levels, t_kin)
+
+    for i in range(4):
+        for j in range(4):
+            assert_allclose(delta_e[i, j].to(u.eV).value,
+                            energies[i] - energies[j])
+            assert r_matrix[i, j] == (g[j] / g[i] if j > i else 0.0)
+            assert_allclose(
+                boltzmann_factors[i, j],
+                numpy.exp(-(numpy.fabs(energies[i] - energies[j]) * u.eV /
+                            (t_kin * k_B)).decompose().value),
+                rtol=1e-12)
+
+
+def test_that_the_levels_are_found_through_the_lookup_tables():
+
+    levels = EnergyLevelsMolecule(4, energy_unit=u.eV)
+    levels.data['v'] = [0, 0, 1, 0]
+    levels.data['j'] = [0, 3, 1, 1]
+    levels.data['E'] = [0.0, 0.1, 0.5, 0.01] * u.eV
+    levels.set_labels(v_max=3)
+
+    assert (levels.find([0, 1, 0, 0], [1, 1, 3, 0]) == [3, 2, 1, 0]).all()
+
+    # pairs that are not levels (including out of range values)
+    assert (levels.find([1, 2, 5, -1], [0, 1, 0, 0]) == -1).all()
+
+    labels = levels.data['label']
+    assert (levels.find_labels(labels[::-1]) == [3, 2, 1, 0]).all()
+    assert (levels.find_labels([2, 1000, -1]) == -1).all()
+
+    levels.data['j'] = [0, 3, 1, 3]
+    with pytest.raises(ValueError):
+        levels.set_labels(v_max=3)
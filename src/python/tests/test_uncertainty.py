@@ -0,0 +1,84 @@
+from __future__ import print_function
+import numpy
+from numpy.testing import assert_allclose
+from astropy import units as u
+
+import pytest
+
+from frigus.population import (cooling_rate_at_steady_state,
+                               population_density_at_steady_state)
+from frigus.readers.dataset import DataLoader
+from frigus.solvers.linear import solve_equilibrium, solve_equilibrium_batch
+from frigus.uncertainty import (RateFactors,
+                                cooling_rate_samples,
+                                cooling_rate_uncertainty,
+                                cooling_function_uncertainty)
+
+
+def test_that_a_batch_of_steady_states_is_solved_at_once():
+
+    random_state = numpy.random.RandomState(0)
+    rates = random_state.uniform(0.1, 1.0, (50, 4, 4))
+    o_matrix = numpy.swapaxes(rates, -1, -2)
+    m_matrices = o_matrix - numpy.eye(4) * \
+        o_matrix.sum(axis=-2)[..., numpy.newaxis, :]
+
+    x = solve_equilibrium_batch(m_matrices)
+    assert x.shape == (50, 4)
+
+    for m_matrix, x_i in zip(m_matrices, x):
+        assert_allclose(x_i, solve_equilibrium(m_matrix.copy())[:, 0],
+                        rtol=1e-12)
+
+
+def test_that_the_rate_uncertainties_are_propagated_to_the_cooling_rate():
+
+    species_data = DataLoader().load('HD_lipovka')
+    t_kin, t_rad, n_c = 1000.0 * u.K, 100.0 * u.K, 1e8 * u.m ** -3
+
+    # without perturbations all the realizations are the nominal solution
+    factors = RateFactors.draw(species_data, 5, k_dex_error=1.0,
+                               a_error=1.0)
+    samples = cooling_rate_samples(species_data, t_kin, t_rad, n_c, factors)
+
+    assert_allclose(
+        samples.cooling_rates.value,
+        cooling_rate_at_steady_state(
+            species_data, t_kin, t_rad, n_c).to(u.erg / u.s).value,
+        rtol=1e-10)
+    assert_allclose(
+        samples.populations,
+        numpy.tile(population_density_at_steady_state(
+            species_data, t_kin, t_rad, n_c)[:, 0], (5, 1)),
+        rtol=1e-10, atol=1e-20)
+
+    # a factor of 2 in the collisional rates (that dominate at this density)
+    samples = cooling_rate_uncertainty(species_data, t_kin, t_rad, n_c,
+                                       n_samples=500, k_dex_error=2.0,
+                                       random_state=0)
+    assert samples.populations.shape == (500, species_data.a_matrix.shape[0])
+
+    low, median, high = samples.cooling_rate_percentiles([16, 50, 84])
+    nominal = cooling_rate_at_steady_state(species_data, t_kin, t_rad, n_c)
+    assert low < nominal < high
+    assert 1.1 < (high / low).value < 4.0
+
+    population_percentiles = samples.population_percentiles([16, 50, 84])
+    assert (numpy.diff(population_percentiles, axis=0) >= 0.0).all()
+
+    # the percentiles on a grid computed with the same realizations
+    percentiles = cooling_function_uncertainty(
+        species_data,
+        [500.0, 1000.0] * u.K,
+        [1e6, 1e8] * u.m ** -3,
+        t_rad=t_rad,
+        n_samples=500,
+        random_state=0)
+    assert percentiles.shape == (3, 2, 2)
+    assert_allclose(percentiles[:, 1, 1].value,
+                    [low.value, median.value, high.value], rtol=1e-12)
+
+    with pytest.raises(ValueError):
+        RateFactors.draw(species_data, 5, k_dex_error=0.5)
+    with pytest.raises(ValueError):
+        RateFactors.draw(species_data, 5, k_dex_error={'e': 2.0})
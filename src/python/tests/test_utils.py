@@ -1,7 +1,10 @@
 from __future__ import print_function
 import numpy
+import pytest
 import frigus
-from frigus.utils import linear_2d_index
+from frigus.utils import (linear_2d_index,
+                          find_matching_indices,
+                          IndexMatcher)
 
 def test_that_linear_2d_index_has_no_clashes():
     n = 1000000
@@ -14,3 +17,31 @@ def test_that_linear_2d_index_has_no_clashes():
 
     linear_inds = linear_2d_index(i, j)
     assert linear_inds.size == numpy.unique(linear_inds).size
+
+
+def test_that_the_indices_of_the_matching_elements_are_found():
+
+    v1 = numpy.array([5, 1, 3, 7, 6, 8, -2])
+    v2 = numpy.array([7, -2, 3, 5, 5, 5, 1, 1, 7, -2, 6, 7, 8])
+
+    r = find_matching_indices(v1, v2)
+    assert (r == [3, 6, 2, 0, 0, 0, 1, 1, 3, 6, 4, 3, 5]).all()
+    assert (v1[r] == v2).all()
+
+    matcher = IndexMatcher(v1)
+    assert (matcher.match(v2) == r).all()
+
+    # the same matcher resolves several query arrays
+    v3 = numpy.array([[8, 4], [-9, 5]])
+    assert (matcher.match(v3) == [[5, -1], [-1, 0]]).all()
+    assert (matcher.unmatched(numpy.append(v3, 4)) == [-9, 4]).all()
+
+    with pytest.raises(ValueError):
+        find_matching_indices(v1, v3)
+    assert (find_matching_indices(v1, v3, check=False) ==
+            [[5, -1], [-1, 0]]).all()
+
+    with pytest.raises(ValueError):
+        IndexMatcher([1, 2, 1])
+
+    assert (IndexMatcher([]).match([1, 2]) == -1).all()